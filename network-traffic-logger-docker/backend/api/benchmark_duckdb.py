@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+NetSentry - DuckDB transfer format benchmark
+Compares transfer size and decode time of the JSON, CSV and Parquet result paths
+used by opnsense_ssh_query, using a synthetic Unbound `query` table.
+
+Usage (inside the backend container):
+    python benchmark_duckdb.py --rows 2000000 --clients 5000
+"""
+
+import os
+import io
+import json
+import time
+import argparse
+import tempfile
+
+import duckdb
+
+from main import decode_duckdb_csv, decode_duckdb_json, decode_duckdb_parquet
+
+# Same shape as the queries issued by get_dns_client_stats / get_dns_time_series
+QUERIES = {
+    "client-stats": """
+        SELECT
+            client,
+            COUNT(*) as total_queries,
+            SUM(CASE WHEN action = 'blocked' THEN 1 ELSE 0 END) as blocked_queries,
+            SUM(CASE WHEN action != 'blocked' THEN 1 ELSE 0 END) as allowed_queries
+        FROM query
+        GROUP BY client
+        ORDER BY total_queries DESC
+    """,
+    "time-series": """
+        SELECT
+            DATE_TRUNC('minute', time) as time_bucket,
+            COUNT(*) as total_queries,
+            SUM(CASE WHEN action = 'blocked' THEN 1 ELSE 0 END) as blocked_queries,
+            SUM(CASE WHEN action != 'blocked' THEN 1 ELSE 0 END) as allowed_queries
+        FROM query
+        GROUP BY time_bucket
+        ORDER BY time_bucket DESC
+    """,
+    "top-domains": """
+        SELECT
+            domain,
+            COUNT(*) as query_count
+        FROM query
+        GROUP BY domain
+        ORDER BY query_count DESC
+    """,
+}
+
+
+def build_dataset(con, rows: int, clients: int, domains: int):
+    """Create a synthetic Unbound query log"""
+    con.execute("SELECT setseed(0.42)")
+    con.execute(f"""
+        CREATE TABLE query AS
+        SELECT
+            NOW() - (random() * INTERVAL '7 days') AS time,
+            '10.10.' || ((i % {clients}) // 250) || '.' || ((i % {clients}) % 250) AS client,
+            'host' || (hash(i) % {domains}) || '.example.com' AS domain,
+            CASE WHEN random() < 0.12 THEN 'blocked' WHEN random() < 0.3 THEN 'cached' ELSE 'resolved' END AS action,
+            ['A', 'AAAA', 'PTR', 'HTTPS', 'TXT'][1 + (i % 5)] AS type
+        FROM range({rows}) t(i)
+    """)
+
+
+def export(con, query: str, fmt: str, path: str) -> bytes:
+    """Export a query result exactly as the remote CLI would stream it"""
+    query = ' '.join(query.split())
+    if fmt == 'json':
+        con.execute(f"COPY ({query}) TO '{path}' (FORMAT JSON, ARRAY true)")
+    elif fmt == 'csv':
+        con.execute(f"COPY ({query}) TO '{path}' (FORMAT CSV, HEADER true)")
+    else:
+        con.execute(f"COPY ({query}) TO '{path}' (FORMAT PARQUET, COMPRESSION ZSTD)")
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def decode_legacy_json(payload: bytes):
+    """Previous path: json.loads into a list of dicts"""
+    return json.loads(payload.decode('utf-8'))
+
+
+DECODERS = {
+    'json (legacy rows)': ('json', decode_legacy_json),
+    'json (columnar)': ('json', lambda p: decode_duckdb_json(p.decode('utf-8'))),
+    'csv (streamed)': ('csv', lambda p: decode_duckdb_csv(io.TextIOWrapper(io.BytesIO(p), encoding='utf-8'))),
+    'parquet': ('parquet', decode_duckdb_parquet),
+}
+
+
+def time_call(fn, payload: bytes, repeat: int) -> float:
+    """Best-of-N wall time in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(payload)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark DuckDB result transfer formats")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Rows in the synthetic query log")
+    parser.add_argument('--clients', type=int, default=2000, help="Distinct DNS clients")
+    parser.add_argument('--domains', type=int, default=50000, help="Distinct domains")
+    parser.add_argument('--repeat', type=int, default=5, help="Decode repetitions (best-of)")
+    args = parser.parse_args()
+
+    con = duckdb.connect()
+    print(f"Building synthetic dataset: {args.rows} rows, {args.clients} clients, {args.domains} domains")
+    build_dataset(con, args.rows, args.clients, args.domains)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name, query in QUERIES.items():
+            payloads = {
+                fmt: export(con, query, fmt, os.path.join(tmpdir, f"{name}.{fmt}"))
+                for fmt in ('json', 'csv', 'parquet')
+            }
+            result_rows = len(decode_duckdb_csv(io.TextIOWrapper(io.BytesIO(payloads['csv']), encoding='utf-8')))
+
+            print(f"\n{name} ({result_rows} result rows)")
+            print(f"  {'path':<20} {'transfer':>12} {'decode':>12}")
+            for label, (fmt, decoder) in DECODERS.items():
+                size_kb = len(payloads[fmt]) / 1024
+                elapsed = time_call(decoder, payloads[fmt], args.repeat)
+                print(f"  {label:<20} {size_kb:>9.1f} KB {elapsed:>9.2f} ms")
+
+    con.close()
+
+
+if __name__ == "__main__":
+    main()
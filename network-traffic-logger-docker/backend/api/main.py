@@ -5,6 +5,7 @@ FastAPI application for network traffic monitoring with OPNsense, AdGuard, and T
 """
 
 import os
+import re
 import json
 import asyncio
 import aiohttp
@@ -12,13 +13,23 @@ import ssl
 import base64
 import paramiko
 import io
-from datetime import datetime, timedelta
+import csv
+import mmap
+import struct
+import time
+import hashlib
+import uuid
+import shutil
+import glob
+import ipaddress
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from typing import List, Dict, Any, Optional
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Query, Body
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Query, Body, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.responses import Response, StreamingResponse, FileResponse
 from pydantic import BaseModel, Field
 import redis.asyncio as redis
 from influxdb_client.client.influxdb_client_async import InfluxDBClientAsync
@@ -73,6 +84,123 @@ INFLUXDB_ORG = os.getenv('INFLUXDB_ORG', 'network-monitoring')
 INFLUXDB_BUCKET = os.getenv('INFLUXDB_BUCKET', 'traffic')
 REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379')
 
+# OPNsense DuckDB over SSH
+OPNSENSE_SSH_HOST = os.getenv('OPNSENSE_SSH_HOST', '10.10.1.1')
+OPNSENSE_SSH_USER = os.getenv('OPNSENSE_SSH_USER', 'netsentry')
+OPNSENSE_SSH_KEY = "/root/.ssh/id_rsa"  # SSH key path in backend container
+DUCKDB_PATH = "/var/unbound/data/unbound.duckdb"
+# Transfer format for query results: csv (streamed), parquet (binary, typed) or json (legacy)
+DUCKDB_TRANSFER_FORMAT = os.getenv('DUCKDB_TRANSFER_FORMAT', 'csv').lower()
+
+# Integration response cache
+CACHE_DEFAULT_TTL = float(os.getenv('CACHE_DEFAULT_TTL', 10))
+CACHE_STALE_TTL = float(os.getenv('CACHE_STALE_TTL', 60))
+CACHE_REDIS_ENABLED = os.getenv('CACHE_REDIS_ENABLED', 'true').lower() == 'true'
+# In-memory entries per worker (least recently used are evicted first)
+CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 1000))
+
+# Per-endpoint TTLs in seconds (longest matching prefix wins)
+CACHE_TTLS = {
+    'opnsense:/diagnostics/interface/getArp': 30,
+    'opnsense:/firewall/filter/searchRule': 60,
+    'opnsense:/diagnostics/firewall/stats': 10,
+    'opnsense:/dhcpv4/leases/searchLease': 60,
+    'opnsense:/kea/leases4/search': 60,
+    'adguard:/control/stats': 30,
+    'adguard:/control/querylog': 5,
+    'truenas:/pool': 60,
+    'truenas:/service': 30,
+    'truenas:/system/info': 30,
+    'duckdb:': 60,
+    'influx:opnsense_traffic': 30,
+}
+
+# Upstream HTTP connection pools (one long-lived aiohttp session per integration)
+UPSTREAM_POOL_LIMIT = int(os.getenv('UPSTREAM_POOL_LIMIT', 20))
+UPSTREAM_POOL_LIMIT_PER_HOST = int(os.getenv('UPSTREAM_POOL_LIMIT_PER_HOST', 6))
+UPSTREAM_KEEPALIVE = float(os.getenv('UPSTREAM_KEEPALIVE', 30))
+UPSTREAM_DNS_TTL = int(os.getenv('UPSTREAM_DNS_TTL', 300))
+CAMERA_POOL_LIMIT_PER_HOST = int(os.getenv('CAMERA_POOL_LIMIT_PER_HOST', 2))
+
+# Camera snapshots: at most one upstream fetch per camera per interval, shared by all viewers
+CAMERA_SNAPSHOT_INTERVAL = float(os.getenv('CAMERA_SNAPSHOT_INTERVAL', 1.0))
+# Serve the last frame this long when the camera fails to answer
+CAMERA_SNAPSHOT_MAX_AGE = float(os.getenv('CAMERA_SNAPSHOT_MAX_AGE', 10))
+# Frames fetched per second for a camera with MJPEG viewers
+CAMERA_MJPEG_FPS = float(os.getenv('CAMERA_MJPEG_FPS', 2))
+
+# RTSP -> HLS restreaming (one ffmpeg per camera stream, started on first viewer)
+FFMPEG_PATH = os.getenv('FFMPEG_PATH', 'ffmpeg')
+HLS_ROOT = os.getenv('HLS_ROOT', '/tmp/netsentry-hls')
+HLS_SEGMENT_SECONDS = int(os.getenv('HLS_SEGMENT_SECONDS', 2))
+HLS_LIST_SIZE = int(os.getenv('HLS_LIST_SIZE', 6))
+HLS_IDLE_TIMEOUT = float(os.getenv('HLS_IDLE_TIMEOUT', 60))
+HLS_START_TIMEOUT = float(os.getenv('HLS_START_TIMEOUT', 15))
+
+# Settings cache safety TTL (changes are normally propagated via Redis pub/sub)
+SETTINGS_CACHE_TTL = float(os.getenv('SETTINGS_CACHE_TTL', 300))
+
+# WebSocket fan-out
+WS_MAX_PENDING = int(os.getenv('WS_MAX_PENDING', 16))
+WS_SEND_TIMEOUT = float(os.getenv('WS_SEND_TIMEOUT', 10))
+
+# Live traffic frames published by the collector
+LIVE_CHANNEL = 'realtime_traffic'
+# Fall back to polling Redis counters when no live frame arrived for this long
+LIVE_FALLBACK_AFTER = float(os.getenv('LIVE_FALLBACK_AFTER', 5))
+
+# Shared-memory ring of per-second counters written by the collector (single-host mode)
+REALTIME_RING_PATH = os.getenv('REALTIME_RING_PATH', '')
+
+# Device indexes kept by the collector; devices seen within DEVICE_ACTIVE_WINDOW seconds count as active
+DEVICE_ACTIVE_KEY = 'devices:active'
+DEVICE_EXTERNAL_KEY = 'devices:external'
+DEVICE_RETENTION_KEY = 'devices:retention'
+DEVICE_MEMORY_SAMPLE = 50
+# DNS clients merged into the device index (top N by query count, last 24h)
+DEVICE_INDEX_DNS_CLIENTS = int(os.getenv('DEVICE_INDEX_DNS_CLIENTS', 5000))
+DEVICE_ACTIVE_WINDOW = int(os.getenv('DEVICE_ACTIVE_WINDOW', 300))
+
+# Traffic history: point budget, rollup buckets and cache of completed windows
+HISTORY_MAX_POINTS = int(os.getenv('HISTORY_MAX_POINTS', 500))
+HISTORY_CHUNK_POINTS = 120
+HISTORY_SETTLE_SECONDS = 120
+HISTORY_CACHE_TTL = int(os.getenv('HISTORY_CACHE_TTL', 7 * 86400))
+# Bump when the cached row shape changes, so old chunks are never served
+HISTORY_CACHE_VERSION = 2
+HISTORY_INTERVALS = [10, 30, 60, 300, 900, 3600, 3 * 3600, 6 * 3600, 86400, 7 * 86400]
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+INFLUXDB_ROLLUPS_ENABLED = os.getenv('INFLUXDB_ROLLUPS_ENABLED', 'true').lower() == 'true'
+ROLLUP_BUCKETS = {
+    60: f"{INFLUXDB_BUCKET}_1m",
+    300: f"{INFLUXDB_BUCKET}_5m",
+    3600: f"{INFLUXDB_BUCKET}_1h",
+    86400: f"{INFLUXDB_BUCKET}_1d",
+}
+# Retention per rollup in seconds (0 = infinite)
+ROLLUP_RETENTION = {60: 30 * 86400, 300: 90 * 86400, 3600: 400 * 86400, 86400: 0}
+
+# Flow archive written by the collector (hourly Parquet partitions, read-only here)
+FLOW_ARCHIVE_PATH = os.getenv('FLOW_ARCHIVE_PATH', '/archive/flows')
+# Per-query limits so ad-hoc archive queries cannot starve the API
+FLOW_QUERY_TIMEOUT = float(os.getenv('FLOW_QUERY_TIMEOUT', 20))
+FLOW_QUERY_MAX_ROWS = int(os.getenv('FLOW_QUERY_MAX_ROWS', 10000))
+FLOW_QUERY_MAX_DAYS = int(os.getenv('FLOW_QUERY_MAX_DAYS', 31))
+FLOW_QUERY_MAX_CONCURRENCY = int(os.getenv('FLOW_QUERY_MAX_CONCURRENCY', 2))
+FLOW_QUERY_THREADS = int(os.getenv('FLOW_QUERY_THREADS', 2))
+FLOW_QUERY_MEMORY_LIMIT = os.getenv('FLOW_QUERY_MEMORY_LIMIT', '512MB')
+FLOW_QUERY_GROUP_COLUMNS = ['source', 'src_addr', 'dst_addr', 'src_hostname', 'dst_hostname', 'src_port', 'dst_port', 'protocol', 'direction']
+FLOW_QUERY_COLUMNS = FLOW_QUERY_GROUP_COLUMNS + ['bytes', 'packets']
+FLOW_QUERY_TIME_COLUMNS = ('time', 'first_seen', 'last_seen')
+
+# Integration snapshot poller intervals in seconds
+SNAPSHOT_POLL_INTERVAL = float(os.getenv('SNAPSHOT_POLL_INTERVAL', 15))
+SNAPSHOT_POLL_INTERVALS = {
+    'opnsense': float(os.getenv('POLL_INTERVAL_OPNSENSE', SNAPSHOT_POLL_INTERVAL)),
+    'adguard': float(os.getenv('POLL_INTERVAL_ADGUARD', SNAPSHOT_POLL_INTERVAL)),
+    'truenas': float(os.getenv('POLL_INTERVAL_TRUENAS', SNAPSHOT_POLL_INTERVAL * 2)),
+}
+
 # MongoDB client
 mongo_client = AsyncIOMotorClient(MONGO_URL)
 db = mongo_client['netsentry']
@@ -137,38 +265,774 @@ class TrafficStats(BaseModel):
     devices_active: int
 
 # WebSocket Manager
+class ClientConnection:
+    """A WebSocket client with its topic subscriptions and bounded send queue
+
+    Pending messages are keyed by stream (message type): a newer update for the
+    same stream replaces the one still waiting, so slow clients get the latest
+    state instead of an ever-growing backlog. When more than `max_pending`
+    streams are waiting, the oldest pending message is dropped.
+    """
+
+    def __init__(self, websocket: WebSocket, topics: set, max_pending: int = WS_MAX_PENDING):
+        self.websocket = websocket
+        self.topics = set(topics)
+        self.max_pending = max_pending
+        self.pending: Dict[str, str] = {}
+        self.wakeup = asyncio.Event()
+        self.dropped = 0
+        self.conflated = 0
+        self.sender_task: Optional[asyncio.Task] = None
+
+    def enqueue(self, key: str, text: str):
+        if key in self.pending:
+            # Conflate: drop the stale update of the same stream
+            del self.pending[key]
+            self.conflated += 1
+        elif len(self.pending) >= self.max_pending:
+            self.pending.pop(next(iter(self.pending)))
+            self.dropped += 1
+        self.pending[key] = text
+        self.wakeup.set()
+
+    async def send_loop(self, on_error):
+        try:
+            while True:
+                await self.wakeup.wait()
+                self.wakeup.clear()
+                while self.pending:
+                    key = next(iter(self.pending))
+                    text = self.pending.pop(key)
+                    await asyncio.wait_for(self.websocket.send_text(text), timeout=WS_SEND_TIMEOUT)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            on_error(self)
+            # Close the socket so the browser notices and reconnects
+            try:
+                await asyncio.wait_for(self.websocket.close(code=1011), timeout=WS_SEND_TIMEOUT)
+            except Exception:
+                pass
+
 class ConnectionManager:
+    """Broadcast hub: serializes each message once and fans it out concurrently
+
+    Every client has its own sender task, so one slow browser can't delay the
+    others. Clients subscribe to topics (traffic, switch, dns) by sending
+    {"action": "subscribe", "topics": [...]}; new clients receive all topics.
+    """
+
+    TOPICS = {'traffic', 'switch', 'dns'}
+
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
 
-    async def connect(self, websocket: WebSocket):
+    async def connect(self, websocket: WebSocket, topics: set = None):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        client = ClientConnection(websocket, topics or self.TOPICS)
+        client.sender_task = asyncio.create_task(client.send_loop(lambda c: self.disconnect(c.websocket)))
+        self.clients[websocket] = client
 
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        client = self.clients.pop(websocket, None)
+        if client and client.sender_task and client.sender_task is not asyncio.current_task():
+            client.sender_task.cancel()
+
+    def subscribe(self, websocket: WebSocket, topics: List[str], replace: bool = True):
+        client = self.clients.get(websocket)
+        if client:
+            topics = set(topics) & self.TOPICS
+            client.topics = topics if replace else client.topics | topics
+
+    def unsubscribe(self, websocket: WebSocket, topics: List[str]):
+        client = self.clients.get(websocket)
+        if client:
+            client.topics -= set(topics)
+
+    async def handle_message(self, websocket: WebSocket, text: str):
+        """Handle a control message sent by a client"""
+        try:
+            message = json.loads(text)
+        except ValueError:
+            return
+        if not isinstance(message, dict):
+            return
+        action = message.get('action')
+        topics = message.get('topics') or []
+        if isinstance(topics, str):
+            topics = [topics]
+        if action == 'subscribe':
+            self.subscribe(websocket, topics, replace=message.get('replace', True))
+        elif action == 'unsubscribe':
+            self.unsubscribe(websocket, topics)
+
+    async def broadcast(self, message: dict, topic: str = 'traffic'):
+        """Queue a message for every client subscribed to topic (never blocks on a client)"""
+        subscribers = [client for client in self.clients.values() if topic in client.topics]
+        if not subscribers:
+            return
+        text = json.dumps(message, default=str)
+        key = message.get('type', topic)
+        for client in subscribers:
+            client.enqueue(key, text)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self.clients),
+            "subscriptions": {topic: sum(1 for c in self.clients.values() if topic in c.topics) for topic in self.TOPICS},
+            "pending": sum(len(c.pending) for c in self.clients.values()),
+            "dropped": sum(c.dropped for c in self.clients.values()),
+            "conflated": sum(c.conflated for c in self.clients.values())
+        }
+
+manager = ConnectionManager()
+
+# Integration Response Cache
+def cache_ttl(key: str) -> float:
+    """Get the TTL for a cache key from CACHE_TTLS (longest matching prefix)"""
+    matches = [prefix for prefix in CACHE_TTLS if key.startswith(prefix)]
+    return CACHE_TTLS[max(matches, key=len)] if matches else CACHE_DEFAULT_TTL
+
+class ResponseCache:
+    """TTL cache for upstream integration calls
+
+    - fresh entries (age < ttl) are served directly
+    - stale entries (age < ttl + stale_ttl) are served while one background refresh runs
+    - concurrent misses for the same key share a single upstream request
+    - entries are shared across API workers through Redis when available;
+      the in-memory copy is bounded to max_entries (LRU)
+    """
+
+    REDIS_PREFIX = "netsentry:cache:"
+
+    def __init__(self, stale_ttl: float = CACHE_STALE_TTL, max_entries: int = CACHE_MAX_ENTRIES):
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.redis = None
+        self.entries: OrderedDict = OrderedDict()
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_fetch(self, key: str, fetch, ttl: float = None, encode=None, decode=None):
+        """Return the cached value for key, calling fetch() at most once per key at a time"""
+        ttl = cache_ttl(key) if ttl is None else ttl
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        if entry is None or time.time() - entry[1] >= ttl:
+            # Another worker may have refreshed the key meanwhile - prefer the newer copy
+            shared = await self._redis_get(key, decode)
+            if shared is not None and (entry is None or shared[1] > entry[1]):
+                entry = shared
+
+        if entry is not None:
+            value, fetched_at = entry
+            age = time.time() - fetched_at
+            if age < ttl:
+                self.hits += 1
+                return value
+            if age < ttl + self.stale_ttl:
+                self.stale_hits += 1
+                if key not in self.inflight:
+                    self._start_fetch(key, fetch, ttl, encode)
+                return value
+
+        if key in self.inflight:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            self._start_fetch(key, fetch, ttl, encode)
+        return await asyncio.shield(self.inflight[key])
+
+    def _start_fetch(self, key: str, fetch, ttl: float, encode):
+        task = asyncio.create_task(self._fetch(key, fetch, ttl, encode))
+        self.inflight[key] = task
+        task.add_done_callback(lambda _: self.inflight.pop(key, None))
+
+    async def _fetch(self, key: str, fetch, ttl: float, encode):
+        value = await fetch()
+        # Failed upstream calls return None/empty - don't cache them so the next request retries
+        if value is None:
+            return value
+        fetched_at = time.time()
+        self._store(key, (value, fetched_at))
+        await self._redis_set(key, value, fetched_at, ttl, encode)
+        return value
+
+    def _store(self, key: str, entry: tuple):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def _redis_get(self, key: str, decode):
+        if self.redis is None:
+            return None
+        try:
+            raw = await self.redis.get(self.REDIS_PREFIX + key)
+            if not raw:
+                return None
+            cached = json.loads(raw)
+            value = decode(cached['v']) if decode else cached['v']
+            entry = (value, cached['t'])
+            current = self.entries.get(key)
+            if current is None or entry[1] > current[1]:
+                self._store(key, entry)
+            return entry
+        except Exception as e:
+            print(f"[Cache] Redis read error for {key}: {e}")
+            return None
+
+    async def _redis_set(self, key: str, value: Any, fetched_at: float, ttl: float, encode):
+        if self.redis is None:
+            return
+        try:
+            payload = json.dumps({'t': fetched_at, 'v': encode(value) if encode else value}, default=str)
+            await self.redis.set(self.REDIS_PREFIX + key, payload, ex=max(int(ttl + self.stale_ttl), 1))
+        except Exception as e:
+            print(f"[Cache] Redis write error for {key}: {e}")
+
+    async def clear(self):
+        """Drop all cached entries (e.g. after integration settings changed)"""
+        self.entries.clear()
+        if self.redis is None:
+            return
+        try:
+            keys = [key async for key in self.redis.scan_iter(match=self.REDIS_PREFIX + '*')]
+            if keys:
+                await self.redis.delete(*keys)
+        except Exception as e:
+            print(f"[Cache] Redis clear error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.entries),
+            "inflight": len(self.inflight),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "redis": self.redis is not None
+        }
 
-    async def broadcast(self, message: dict):
-        for connection in self.active_connections[:]:
+response_cache = ResponseCache()
+
+# Upstream Connection Pools
+def camera_ssl_context() -> ssl.SSLContext:
+    """SSL context that accepts all certificates and protocols (for older Reolink cameras)"""
+    ssl_context = ssl.create_default_context()
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = ssl.CERT_NONE
+    # Allow older SSL/TLS versions for compatibility with older Reolink cameras
+    ssl_context.minimum_version = ssl.TLSVersion.MINIMUM_SUPPORTED
+    ssl_context.set_ciphers('DEFAULT@SECLEVEL=1')
+    return ssl_context
+
+class UpstreamPools:
+    """Long-lived aiohttp sessions, one per upstream integration
+
+    Each upstream gets its own connector so a slow appliance can only exhaust
+    its own pool. Connections are kept alive between dashboard refreshes and
+    DNS lookups are cached, so requests stop paying TCP+TLS setup every time.
+    """
+
+    def __init__(self):
+        self.sessions: Dict[str, aiohttp.ClientSession] = {}
+        self.requests: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.in_flight: Dict[str, int] = {}
+        self.peak_in_flight: Dict[str, int] = {}
+
+    def connector_options(self, name: str) -> Dict[str, Any]:
+        """TCPConnector settings per upstream"""
+        options = {
+            'limit': UPSTREAM_POOL_LIMIT,
+            'limit_per_host': UPSTREAM_POOL_LIMIT_PER_HOST,
+            'keepalive_timeout': UPSTREAM_KEEPALIVE,
+            'ttl_dns_cache': UPSTREAM_DNS_TTL,
+            'use_dns_cache': True,
+        }
+        if name in ('opnsense', 'truenas'):
+            # Self-signed appliance certificates
+            options['ssl'] = False
+        elif name == 'camera':
+            # Camera CPUs are weak - keep very few parallel connections per camera
+            options['ssl'] = camera_ssl_context()
+            options['limit_per_host'] = CAMERA_POOL_LIMIT_PER_HOST
+        return options
+
+    def session(self, name: str) -> aiohttp.ClientSession:
+        """Get (or lazily create) the session for an upstream"""
+        session = self.sessions.get(name)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(**self.connector_options(name)),
+                timeout=aiohttp.ClientTimeout(total=10)
+            )
+            self.sessions[name] = session
+        return session
+
+    def start(self, names: List[str]):
+        for name in names:
+            self.session(name)
+
+    @asynccontextmanager
+    async def request(self, name: str, method: str, url: str, **kwargs):
+        """Issue a request on the upstream's pooled session"""
+        session = self.session(name)
+        self.requests[name] = self.requests.get(name, 0) + 1
+        self.in_flight[name] = self.in_flight.get(name, 0) + 1
+        self.peak_in_flight[name] = max(self.peak_in_flight.get(name, 0), self.in_flight[name])
+        try:
+            async with session.request(method, url, **kwargs) as resp:
+                yield resp
+        except Exception:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            raise
+        finally:
+            self.in_flight[name] -= 1
+
+    async def close(self):
+        for session in self.sessions.values():
+            await session.close()
+        self.sessions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool utilization per upstream"""
+        stats = {}
+        for name, session in self.sessions.items():
+            connector = session.connector
+            # aiohttp does not expose pool usage publicly; read it defensively
+            acquired = len(getattr(connector, '_acquired', ()) or ())
+            idle = sum(len(conns) for conns in (getattr(connector, '_conns', {}) or {}).values())
+            stats[name] = {
+                "limit": connector.limit if connector else 0,
+                "limit_per_host": connector.limit_per_host if connector else 0,
+                "connections_in_use": acquired,
+                "connections_idle": idle,
+                "utilization": round(acquired / connector.limit, 3) if connector and connector.limit else 0,
+                "requests": self.requests.get(name, 0),
+                "errors": self.errors.get(name, 0),
+                "in_flight": self.in_flight.get(name, 0),
+                "peak_in_flight": self.peak_in_flight.get(name, 0),
+            }
+        return stats
+
+upstream_pools = UpstreamPools()
+
+# Camera Snapshots
+class CameraSnapshots:
+    """Latest JPEG per camera, fetched from the camera at a bounded rate
+
+    A frame younger than CAMERA_SNAPSHOT_INTERVAL is served from memory and
+    concurrent requests share one in-flight upstream fetch, so camera load no
+    longer grows with the number of viewers. Frames carry an ETag and
+    Last-Modified for conditional requests. MJPEG viewers subscribe to the same
+    frames; one pull loop per camera runs while at least one viewer is connected
+    and fetches a new frame every 1/CAMERA_MJPEG_FPS seconds.
+    """
+
+    def __init__(self):
+        self.frames: Dict[str, Dict[str, Any]] = {}
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.last_attempt: Dict[str, float] = {}
+        self.last_error: Dict[str, Exception] = {}
+        # Bumped by forget() so fetches started before it don't store stale frames
+        self.generation: Dict[str, int] = {}
+        self.viewers: Dict[str, set] = {}
+        self.pullers: Dict[str, asyncio.Task] = {}
+        self.upstream_fetches = 0
+        self.upstream_errors = 0
+        self.hits = 0
+        self.coalesced = 0
+
+    async def _fetch(self, camera_id: str) -> Dict[str, Any]:
+        generation = self.generation.get(camera_id, 0)
+        try:
+            frame = await self._fetch_frame(camera_id)
+        except Exception as e:
+            if self.generation.get(camera_id, 0) == generation:
+                self.last_error[camera_id] = e
+            raise
+        if self.generation.get(camera_id, 0) != generation:
+            return frame
+        self.last_error.pop(camera_id, None)
+        self.frames[camera_id] = frame
+
+        for queue in self.viewers.get(camera_id, ()):
+            # Slow viewers skip frames instead of queueing them
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(frame)
+        return frame
+
+    async def _fetch_frame(self, camera_id: str) -> Dict[str, Any]:
+        camera = await db.cameras.find_one({"_id": ObjectId(camera_id)})
+        if not camera:
+            raise HTTPException(status_code=404, detail="Camera not found")
+
+        # Reolink uses HTTPS and redirects from HTTP
+        # Use HTTPS directly and disable SSL verification (self-signed cert)
+        snapshot_url = f"https://{camera['host']}/cgi-bin/api.cgi?cmd=Snap&channel=0&rs=snapshot&user={camera['username']}&password={camera['password']}"
+
+        self.upstream_fetches += 1
+        # Pooled camera session with permissive SSL context (see UpstreamPools)
+        async with upstream_pools.request('camera', 'GET', snapshot_url) as response:
+            if response.status != 200:
+                self.upstream_errors += 1
+                error_body = await response.text()
+                print(f"[Camera] Snapshot failed for {camera.get('name', camera_id)}: {response.status} - {error_body[:200]}")
+                raise HTTPException(status_code=502, detail=f"Camera returned {response.status}: {error_body[:100]}")
+            image_data = await response.read()
+
+        fetched_at = time.time()
+        return {
+            'data': image_data,
+            'etag': f'"{hashlib.sha1(image_data).hexdigest()[:16]}"',
+            'fetched_at': fetched_at,
+            'last_modified': datetime.fromtimestamp(fetched_at, timezone.utc).strftime('%a, %d %b %Y %H:%M:%S GMT'),
+        }
+
+    def _usable(self, frame: Optional[Dict[str, Any]], max_age: float) -> bool:
+        return frame is not None and time.time() - frame['fetched_at'] < max_age
+
+    async def get(self, camera_id: str, refresh: bool = False) -> Dict[str, Any]:
+        """Latest frame, refreshing it at most once per CAMERA_SNAPSHOT_INTERVAL
+
+        refresh=True (the MJPEG pull loop, which paces itself) always fetches
+        unless a fetch is already in flight.
+        """
+        frame = self.frames.get(camera_id)
+        if not refresh and self._usable(frame, CAMERA_SNAPSHOT_INTERVAL):
+            self.hits += 1
+            return frame
+
+        task = self.inflight.get(camera_id)
+        if task is None:
+            # Bound the upstream rate even while the camera keeps failing (or never answered)
+            if not refresh and time.time() - self.last_attempt.get(camera_id, 0) < CAMERA_SNAPSHOT_INTERVAL:
+                if self._usable(frame, CAMERA_SNAPSHOT_MAX_AGE):
+                    self.hits += 1
+                    return frame
+                if camera_id in self.last_error:
+                    raise self.last_error[camera_id]
+            self.last_attempt[camera_id] = time.time()
+            task = asyncio.create_task(self._fetch(camera_id))
+            self.inflight[camera_id] = task
+            task.add_done_callback(lambda _: self.inflight.pop(camera_id, None))
+        else:
+            self.coalesced += 1
+
+        try:
+            return await asyncio.shield(task)
+        except Exception:
+            if self._usable(frame, CAMERA_SNAPSHOT_MAX_AGE):
+                return frame
+            raise
+
+    async def _pull(self, camera_id: str):
+        """Keep fetching frames while MJPEG viewers are connected"""
+        interval = 1 / CAMERA_MJPEG_FPS
+        while True:
+            started = time.monotonic()
+            delay = interval
             try:
-                await connection.send_json(message)
-            except:
-                await self.disconnect(connection)
+                # Fetch every tick: a frame cached by the last tick is never fresh enough to push
+                await self.get(camera_id, refresh=True)
+            except Exception as e:
+                print(f"[Camera] MJPEG pull error for {camera_id}: {e}")
+                # Don't retry a failing camera faster than the snapshot rate
+                delay = max(interval, CAMERA_SNAPSHOT_INTERVAL)
+            await asyncio.sleep(max(delay - (time.monotonic() - started), 0.05))
+
+    async def stream(self, camera_id: str):
+        """Yield frames for one MJPEG viewer"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self.viewers.setdefault(camera_id, set()).add(queue)
+        if camera_id not in self.pullers:
+            self.pullers[camera_id] = asyncio.create_task(self._pull(camera_id))
+        try:
+            frame = self.frames.get(camera_id)
+            if frame:
+                yield frame
+            while True:
+                yield await queue.get()
+        finally:
+            viewers = self.viewers.get(camera_id, set())
+            viewers.discard(queue)
+            if not viewers:
+                self.viewers.pop(camera_id, None)
+                puller = self.pullers.pop(camera_id, None)
+                if puller:
+                    puller.cancel()
+
+    def forget(self, camera_id: str):
+        """Drop the cached frame (camera changed or deleted)"""
+        self.frames.pop(camera_id, None)
+        self.last_attempt.pop(camera_id, None)
+        self.last_error.pop(camera_id, None)
+        self.generation[camera_id] = self.generation.get(camera_id, 0) + 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cameras": len(self.frames),
+            "viewers": {camera_id: len(queues) for camera_id, queues in self.viewers.items()},
+            "upstream_fetches": self.upstream_fetches,
+            "upstream_errors": self.upstream_errors,
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+        }
 
-manager = ConnectionManager()
+camera_snapshots = CameraSnapshots()
+
+# Camera Restreaming
+class HlsRestreamer:
+    """Pulls each camera stream once with ffmpeg and serves it to any number of viewers as HLS
+
+    A stream (camera, quality) is started on the first playlist request and
+    stopped once no playlist or segment was requested for HLS_IDLE_TIMEOUT.
+    ffmpeg only remuxes (-c copy), so a stream costs little CPU; segments live
+    in HLS_ROOT and are rotated by ffmpeg itself.
+    """
+
+    def __init__(self):
+        self.streams: Dict[tuple, Dict[str, Any]] = {}
+        self.locks: Dict[tuple, asyncio.Lock] = {}
+        self.restarts: Dict[tuple, int] = {}
+
+    def directory(self, key: tuple) -> str:
+        return os.path.join(HLS_ROOT, f"{key[0]}_{key[1]}")
+
+    async def _start(self, key: tuple, rtsp_url: str) -> Dict[str, Any]:
+        directory = self.directory(key)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory, exist_ok=True)
+
+        process = await asyncio.create_subprocess_exec(
+            FFMPEG_PATH, '-nostdin', '-loglevel', 'error',
+            '-rtsp_transport', 'tcp', '-i', rtsp_url,
+            '-c', 'copy',
+            '-f', 'hls',
+            '-hls_time', str(HLS_SEGMENT_SECONDS),
+            '-hls_list_size', str(HLS_LIST_SIZE),
+            '-hls_flags', 'delete_segments+omit_endlist',
+            '-hls_segment_filename', os.path.join(directory, 'seg_%05d.ts'),
+            os.path.join(directory, 'index.m3u8'),
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+        now = time.time()
+        stream = {
+            'process': process,
+            'started_at': now,
+            'last_access': now,
+            'segments_served': 0,
+            'bytes_served': 0,
+        }
+        self.streams[key] = stream
+        print(f"[Restream] Started ffmpeg (pid {process.pid}) for camera {key[0]} ({key[1]})")
+        return stream
+
+    async def _stop(self, key: tuple):
+        stream = self.streams.pop(key, None)
+        if stream is None:
+            return
+        process = stream['process']
+        if process.returncode is None:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+        shutil.rmtree(self.directory(key), ignore_errors=True)
+        print(f"[Restream] Stopped camera {key[0]} ({key[1]})")
+
+    async def ensure(self, camera: Dict[str, Any], quality: str) -> str:
+        """Start the stream if needed and wait for its playlist; returns the stream directory"""
+        key = (str(camera['_id']), quality)
+        async with self.locks.setdefault(key, asyncio.Lock()):
+            stream = self.streams.get(key)
+            if stream is not None and stream['process'].returncode is not None:
+                # ffmpeg exited (camera rebooted, network blip) - start over
+                self.restarts[key] = self.restarts.get(key, 0) + 1
+                await self._stop(key)
+                stream = None
+            if stream is None:
+                path = camera.get('rtsp_path', '/h264Preview_01_main') if quality == "main" else camera.get('sub_stream_path', '/h264Preview_01_sub')
+                rtsp_url = f"rtsp://{camera['username']}:{camera['password']}@{camera['host']}:{camera.get('port', 554)}{path}"
+                stream = await self._start(key, rtsp_url)
+
+            playlist = os.path.join(self.directory(key), 'index.m3u8')
+            deadline = time.monotonic() + HLS_START_TIMEOUT
+            while not os.path.exists(playlist):
+                if stream['process'].returncode is not None or time.monotonic() > deadline:
+                    await self._stop(key)
+                    raise HTTPException(status_code=502, detail="Camera stream could not be started")
+                await asyncio.sleep(0.25)
+
+            stream['last_access'] = time.time()
+            return self.directory(key)
+
+    def segment_path(self, camera_id: str, quality: str, segment: str) -> Optional[str]:
+        """Resolve a segment of a running stream and count it as viewer activity"""
+        key = (camera_id, quality)
+        stream = self.streams.get(key)
+        if stream is None:
+            return None
+        path = os.path.join(self.directory(key), segment)
+        if not os.path.exists(path):
+            return None
+        stream['last_access'] = time.time()
+        stream['segments_served'] += 1
+        stream['bytes_served'] += os.path.getsize(path)
+        return path
+
+    async def stop_camera(self, camera_id: str):
+        """Stop all streams of a camera (camera changed or deleted)"""
+        for key in [key for key in self.streams if key[0] == camera_id]:
+            await self._stop(key)
+
+    async def reap_idle(self):
+        """Background task: stop streams nobody watched for HLS_IDLE_TIMEOUT"""
+        while True:
+            await asyncio.sleep(10)
+            now = time.time()
+            for key, stream in list(self.streams.items()):
+                if now - stream['last_access'] > HLS_IDLE_TIMEOUT:
+                    await self._stop(key)
+
+    async def stop_all(self):
+        for key in list(self.streams):
+            await self._stop(key)
+
+    @staticmethod
+    def process_usage(pid: int) -> Dict[str, Any]:
+        """CPU seconds and resident memory of a process from /proc (Linux only)"""
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            ticks = os.sysconf('SC_CLK_TCK')
+            with open(f"/proc/{pid}/statm") as f:
+                rss_pages = int(f.read().split()[1])
+            return {
+                "cpu_seconds": round((int(fields[11]) + int(fields[12])) / ticks, 2),
+                "rss_bytes": rss_pages * os.sysconf('SC_PAGE_SIZE'),
+            }
+        except (OSError, IndexError, ValueError):
+            return {}
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        streams = {}
+        for key, stream in self.streams.items():
+            process = stream['process']
+            streams[f"{key[0]}/{key[1]}"] = {
+                "pid": process.pid,
+                "running": process.returncode is None,
+                "uptime": round(now - stream['started_at'], 1),
+                "idle": round(now - stream['last_access'], 1),
+                "segments_served": stream['segments_served'],
+                "bytes_served": stream['bytes_served'],
+                "restarts": self.restarts.get(key, 0),
+                **self.process_usage(process.pid),
+            }
+        return {"streams": streams, "idle_timeout": HLS_IDLE_TIMEOUT}
+
+hls_restreamer = HlsRestreamer()
 
 # Helper Functions
-async def get_settings() -> Settings:
-    """Get settings from database"""
+async def load_settings() -> Settings:
+    """Load settings from database"""
     settings_doc = await db.settings.find_one()
     if not settings_doc:
         return Settings()
     settings_doc.pop('_id', None)
     return Settings(**settings_doc)
 
-async def opnsense_api_call(endpoint: str, method: str = 'GET', data: dict = None):
-    """Make API call to OPNsense"""
+class SettingsCache:
+    """In-process settings cache
+
+    Settings are loaded from MongoDB once and kept until they are saved again.
+    Saves are announced on a Redis channel so every API worker drops its copy;
+    SETTINGS_CACHE_TTL is only a safety net in case a notification is missed.
+    """
+
+    CHANNEL = "netsentry:settings_changed"
+
+    def __init__(self, ttl: float = SETTINGS_CACHE_TTL):
+        self.ttl = ttl
+        self.settings: Optional[Settings] = None
+        self.loaded_at = 0.0
+        self.lock = asyncio.Lock()
+        self.instance_id = uuid.uuid4().hex
+
+    async def get(self) -> Settings:
+        if self.settings is not None and time.monotonic() - self.loaded_at < self.ttl:
+            return self.settings
+        async with self.lock:
+            if self.settings is None or time.monotonic() - self.loaded_at >= self.ttl:
+                self.set(await load_settings())
+        return self.settings
+
+    def set(self, settings: Settings):
+        self.settings = settings
+        self.loaded_at = time.monotonic()
+
+    def invalidate(self):
+        self.settings = None
+
+    async def notify_changed(self, redis_client):
+        """Tell the other API workers to drop their cached settings"""
+        try:
+            await redis_client.publish(self.CHANNEL, self.instance_id)
+        except Exception as e:
+            print(f"[Settings] Change notification failed: {e}")
+
+    async def listen(self, redis_client):
+        """Background task: invalidate on change notifications from other workers"""
+        while True:
+            pubsub = redis_client.pubsub()
+            try:
+                await pubsub.subscribe(self.CHANNEL)
+                async for message in pubsub.listen():
+                    if message['type'] != 'message' or message['data'] == self.instance_id:
+                        continue
+                    print(f"[Settings] Settings changed by another worker, reloading")
+                    self.invalidate()
+                    # Shared Redis entries were already cleared by the saving worker
+                    response_cache.entries.clear()
+                    await snapshot_store.clear()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[Settings] Change listener error: {e}")
+                self.invalidate()
+                await asyncio.sleep(5)
+            finally:
+                await pubsub.close()
+
+settings_cache = SettingsCache()
+
+async def get_settings() -> Settings:
+    """Get settings (served from the in-process cache)"""
+    return await settings_cache.get()
+
+async def opnsense_api_call(endpoint: str, method: str = 'GET', data: dict = None, cached: bool = True):
+    """Make API call to OPNsense (GET requests are served through the response cache)"""
+    if cached and method == 'GET' and data is None:
+        return await response_cache.get_or_fetch(f"opnsense:{endpoint}", lambda: _opnsense_api_request(endpoint))
+    return await _opnsense_api_request(endpoint, method, data)
+
+async def _opnsense_api_request(endpoint: str, method: str = 'GET', data: dict = None):
+    """Make uncached API call to OPNsense"""
     settings = await get_settings()
 
     print(f"[OPNsense] Checking settings - enabled: {settings.opnsense.enabled}, url: {settings.opnsense.url}")
@@ -195,27 +1059,32 @@ async def opnsense_api_call(endpoint: str, method: str = 'GET', data: dict = Non
     print(f"[OPNsense] Making {method} request to: {url}")
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.request(method, url, headers=headers, json=data, ssl=False, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                print(f"[OPNsense] Response status: {resp.status}, content-type: {resp.content_type}")
-
-                if resp.status == 200:
-                    if 'application/json' in resp.content_type:
-                        return await resp.json()
-                    else:
-                        text = await resp.text()
-                        print(f"[OPNsense] ERROR: Got HTML instead of JSON. First 500 chars: {text[:500]}")
-                        return None
+        async with upstream_pools.request('opnsense', method, url, headers=headers, json=data) as resp:
+            print(f"[OPNsense] Response status: {resp.status}, content-type: {resp.content_type}")
+
+            if resp.status == 200:
+                if 'application/json' in resp.content_type:
+                    return await resp.json()
                 else:
                     text = await resp.text()
-                    print(f"[OPNsense] ERROR: Status {resp.status}. Response: {text[:500]}")
+                    print(f"[OPNsense] ERROR: Got HTML instead of JSON. First 500 chars: {text[:500]}")
                     return None
+            else:
+                text = await resp.text()
+                print(f"[OPNsense] ERROR: Status {resp.status}. Response: {text[:500]}")
+                return None
     except Exception as e:
         print(f"[OPNsense] API error: {type(e).__name__}: {e}")
         return None
 
-async def adguard_api_call(endpoint: str):
-    """Make API call to AdGuard Home"""
+async def adguard_api_call(endpoint: str, cached: bool = True):
+    """Make API call to AdGuard Home (served through the response cache)"""
+    if cached:
+        return await response_cache.get_or_fetch(f"adguard:{endpoint}", lambda: _adguard_api_request(endpoint))
+    return await _adguard_api_request(endpoint)
+
+async def _adguard_api_request(endpoint: str):
+    """Make uncached API call to AdGuard Home"""
     settings = await get_settings()
     if not settings.adguard.enabled or not settings.adguard.url:
         return None
@@ -227,17 +1096,22 @@ async def adguard_api_call(endpoint: str):
         headers['Authorization'] = f'Bearer {settings.adguard.apiKey}'
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    return await resp.json()
-                return None
+        async with upstream_pools.request('adguard', 'GET', url, headers=headers) as resp:
+            if resp.status == 200:
+                return await resp.json()
+            return None
     except Exception as e:
         print(f"AdGuard API error: {e}")
         return None
 
-async def truenas_api_call(endpoint: str):
-    """Make API call to TrueNAS Scale"""
+async def truenas_api_call(endpoint: str, cached: bool = True):
+    """Make API call to TrueNAS Scale (served through the response cache)"""
+    if cached:
+        return await response_cache.get_or_fetch(f"truenas:{endpoint}", lambda: _truenas_api_request(endpoint))
+    return await _truenas_api_request(endpoint)
+
+async def _truenas_api_request(endpoint: str):
+    """Make uncached API call to TrueNAS Scale"""
     settings = await get_settings()
     if not settings.truenas.enabled or not settings.truenas.url:
         return None
@@ -249,70 +1123,184 @@ async def truenas_api_call(endpoint: str):
     }
 
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, headers=headers, ssl=False, timeout=aiohttp.ClientTimeout(total=10)) as resp:
-                if resp.status == 200:
-                    return await resp.json()
-                return None
+        async with upstream_pools.request('truenas', 'GET', url, headers=headers) as resp:
+            if resp.status == 200:
+                return await resp.json()
+            return None
     except Exception as e:
         print(f"TrueNAS API error: {e}")
         return None
 
 # OPNsense DuckDB SSH Helper Functions
-async def opnsense_ssh_query(query: str) -> List[Dict[str, Any]]:
-    """Execute DuckDB query on OPNsense via SSH and return results"""
-    try:
-        # OPNsense SSH configuration from environment variables
-        OPNSENSE_HOST = os.getenv('OPNSENSE_SSH_HOST', '10.10.1.1')
-        OPNSENSE_USER = os.getenv('OPNSENSE_SSH_USER', 'netsentry')
-        OPNSENSE_SSH_KEY = "/root/.ssh/id_rsa"  # SSH key path in backend container
-        DUCKDB_PATH = "/var/unbound/data/unbound.duckdb"
+class DuckDBResult:
+    """Column-oriented DuckDB query result (one list per column)"""
+
+    __slots__ = ('columns', 'data')
+
+    def __init__(self, columns: List[str] = None, data: Dict[str, list] = None):
+        self.columns = columns or []
+        self.data = data or {name: [] for name in self.columns}
+
+    def __len__(self) -> int:
+        return len(self.data[self.columns[0]]) if self.columns else 0
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def column(self, name: str, default: Any = None) -> list:
+        """Get a column as list (filled with default if the column is missing)"""
+        if name in self.data:
+            return self.data[name]
+        return [default] * len(self)
+
+    def first(self) -> Dict[str, Any]:
+        """Get the first row as dict (for single-row aggregate queries)"""
+        if not self:
+            return {}
+        return {name: self.data[name][0] for name in self.columns}
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """Get all rows as dicts"""
+        return [dict(zip(self.columns, values)) for values in zip(*(self.data[name] for name in self.columns))]
+
+def _coerce_csv_column(values: List[str]) -> list:
+    """Convert a CSV text column to int/float when every non-NULL value allows it"""
+    for cast in (int, float):
+        try:
+            return [cast(v) if v != '' else None for v in values]
+        except ValueError:
+            continue
+    return [v if v != '' else None for v in values]
 
-        # Create SSH client
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+def decode_duckdb_csv(lines) -> DuckDBResult:
+    """Incrementally decode `duckdb -csv` output into columns
 
+    Rows are appended to their column lists as they arrive from the SSH channel,
+    so no per-row dict or full text buffer is ever materialized.
+    """
+    reader = csv.reader(line.decode('utf-8') if isinstance(line, bytes) else line for line in lines)
+    header = next(reader, None)
+    if not header:
+        return DuckDBResult()
+
+    columns = [[] for _ in header]
+    appends = [column.append for column in columns]
+    width = len(header)
+    for row in reader:
+        if len(row) != width:
+            continue
+        for append, value in zip(appends, row):
+            append(value)
+
+    return DuckDBResult(header, {name: _coerce_csv_column(values) for name, values in zip(header, columns)})
+
+def decode_duckdb_parquet(payload: bytes) -> DuckDBResult:
+    """Decode a Parquet payload (written by DuckDB `COPY ... TO '/dev/stdout'`) into columns"""
+    import duckdb
+    import tempfile
+
+    if not payload:
+        return DuckDBResult()
+
+    with tempfile.NamedTemporaryFile(suffix='.parquet') as tmp:
+        tmp.write(payload)
+        tmp.flush()
+        con = duckdb.connect()
+        try:
+            # Arrow keeps the result columnar: no per-row tuples to build and pivot
+            table = con.execute("SELECT * FROM read_parquet(?)", [tmp.name]).fetch_arrow_table()
+        finally:
+            con.close()
+
+    return DuckDBResult(table.column_names, table.to_pydict())
+
+def encode_duckdb_result(result: DuckDBResult) -> Dict[str, Any]:
+    """Serialize a DuckDBResult for the shared response cache"""
+    return {'columns': result.columns, 'data': result.data}
+
+def decode_duckdb_result(payload: Dict[str, Any]) -> DuckDBResult:
+    """Deserialize a DuckDBResult from the shared response cache"""
+    return DuckDBResult(payload['columns'], payload['data'])
+
+def decode_duckdb_json(payload: str) -> DuckDBResult:
+    """Decode legacy `duckdb -json` output into columns"""
+    rows = json.loads(payload) if payload.strip() else []
+    if not isinstance(rows, list) or not rows:
+        return DuckDBResult()
+    header = list(rows[0].keys())
+    return DuckDBResult(header, {name: [row.get(name) for row in rows] for name in header})
+
+def build_duckdb_command(query: str, transfer_format: str) -> str:
+    """Build the remote duckdb CLI command for the given transfer format"""
+    query = ' '.join(query.split())
+    if transfer_format == 'parquet':
+        return f"duckdb '{DUCKDB_PATH}' -c \"COPY ({query}) TO '/dev/stdout' (FORMAT PARQUET, COMPRESSION ZSTD)\""
+    if transfer_format == 'json':
+        return f"duckdb '{DUCKDB_PATH}' -json -c \"{query}\""
+    return f"duckdb '{DUCKDB_PATH}' -csv -c \"{query}\""
+
+def _run_duckdb_ssh_query(query: str, transfer_format: str) -> Optional[DuckDBResult]:
+    """Blocking part of opnsense_ssh_query (runs in a worker thread)"""
+    # Create SSH client
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+    try:
         # Connect using SSH key
         ssh.connect(
-            hostname=OPNSENSE_HOST,
-            username=OPNSENSE_USER,
+            hostname=OPNSENSE_SSH_HOST,
+            username=OPNSENSE_SSH_USER,
             key_filename=OPNSENSE_SSH_KEY,
             timeout=10
         )
 
-        # Execute DuckDB query via SSH
-        # Using -json flag to get JSON output directly from duckdb CLI
-        duckdb_command = f"duckdb '{DUCKDB_PATH}' -json -c \"{query}\""
-        stdin, stdout, stderr = ssh.exec_command(duckdb_command)
+        stdin, stdout, stderr = ssh.exec_command(build_duckdb_command(query, transfer_format))
 
-        # Get output
-        output = stdout.read().decode('utf-8')
-        error_output = stderr.read().decode('utf-8')
+        # Decode while the output is still streaming in
+        if transfer_format == 'parquet':
+            result = decode_duckdb_parquet(stdout.read())
+        elif transfer_format == 'json':
+            result = decode_duckdb_json(stdout.read().decode('utf-8'))
+        else:
+            result = decode_duckdb_csv(stdout)
 
+        error_output = stderr.read().decode('utf-8')
+    finally:
         ssh.close()
 
-        # Check for errors
-        if error_output and "Error" in error_output:
-            print(f"[DuckDB] Query error: {error_output}")
-            return []
-
-        # Parse JSON output
-        if output.strip():
-            try:
-                results = json.loads(output)
-                return results if isinstance(results, list) else []
-            except json.JSONDecodeError as e:
-                print(f"[DuckDB] JSON parse error: {e}")
-                print(f"[DuckDB] Raw output: {output[:500]}")
-                return []
+    # Check for errors
+    if error_output and "Error" in error_output:
+        print(f"[DuckDB] Query error: {error_output}")
+        return None
 
-        return []
+    return result
 
+async def _opnsense_ssh_fetch(query: str) -> Optional[DuckDBResult]:
+    """Run a DuckDB query over SSH, returning None on failure"""
+    try:
+        return await asyncio.to_thread(_run_duckdb_ssh_query, query, DUCKDB_TRANSFER_FORMAT)
     except Exception as e:
         print(f"[DuckDB] SSH query error: {type(e).__name__}: {e}")
         import traceback
         traceback.print_exc()
-        return []
+        return None
+
+async def opnsense_ssh_query(query: str, strict: bool = False) -> Optional[DuckDBResult]:
+    """Execute DuckDB query on OPNsense via SSH and return columnar results (cached)
+
+    A failed query yields an empty result, or None with strict=True.
+    """
+    query = ' '.join(query.split())
+    cache_key = f"duckdb:{hashlib.sha1(query.encode()).hexdigest()}"
+    result = await response_cache.get_or_fetch(
+        cache_key,
+        lambda: _opnsense_ssh_fetch(query),
+        encode=encode_duckdb_result,
+        decode=decode_duckdb_result
+    )
+    if result is None and not strict:
+        return DuckDBResult()
+    return result
 
 async def get_dns_blocked_domains(limit: int = 20, time_range_hours: int = 24) -> List[Dict[str, Any]]:
     """Get top blocked domains from DuckDB"""
@@ -332,12 +1320,14 @@ async def get_dns_blocked_domains(limit: int = 20, time_range_hours: int = 24) -
     results = await opnsense_ssh_query(query)
     return [
         {
-            "domain": row["domain"],
-            "blocked": row["blocked_count"],
-            "blocklist": row["blocklist"],
+            "domain": domain,
+            "blocked": blocked_count,
+            "blocklist": blocklist,
             "color": "#dc3545"
         }
-        for row in results
+        for domain, blocked_count, blocklist in zip(
+            results.column("domain"), results.column("blocked_count"), results.column("blocklist")
+        )
     ]
 
 async def get_dns_query_stats(time_range_hours: int = 24) -> Dict[str, Any]:
@@ -360,9 +1350,9 @@ async def get_dns_query_stats(time_range_hours: int = 24) -> Dict[str, Any]:
         "cached": 0
     }
 
-    for row in results:
-        action = row.get("action", "").lower()
-        count = row.get("count", 0)
+    for action, count in zip(results.column("action", ""), results.column("count", 0)):
+        action = (action or "").lower()
+        count = count or 0
 
         if action == "resolved" or action == "ok":
             stats["resolved"] = count
@@ -392,11 +1382,11 @@ async def get_dns_query_types(time_range_hours: int = 24) -> List[Dict[str, Any]
 
     return [
         {
-            "type": row["type"],
-            "count": row["count"],
+            "type": query_type,
+            "count": count,
             "color": colors[i % len(colors)]
         }
-        for i, row in enumerate(results)
+        for i, (query_type, count) in enumerate(zip(results.column("type"), results.column("count")))
     ]
 
 async def get_dns_top_domains(limit: int = 20, time_range_hours: int = 24, allowed_only: bool = True) -> List[Dict[str, Any]]:
@@ -420,14 +1410,14 @@ async def get_dns_top_domains(limit: int = 20, time_range_hours: int = 24, allow
 
     return [
         {
-            "domain": row["domain"],
-            "queries": row["query_count"]
+            "domain": domain,
+            "queries": query_count
         }
-        for row in results
+        for domain, query_count in zip(results.column("domain"), results.column("query_count"))
     ]
 
-async def get_dns_client_stats(limit: int = 20, time_range_hours: int = 24) -> List[Dict[str, Any]]:
-    """Get per-client DNS query statistics"""
+async def get_dns_client_stats(limit: int = 20, time_range_hours: int = 24, strict: bool = False) -> Optional[List[Dict[str, Any]]]:
+    """Get per-client DNS query statistics (None on query failure with strict=True)"""
     query = f"""
         SELECT
             client,
@@ -442,17 +1432,24 @@ async def get_dns_client_stats(limit: int = 20, time_range_hours: int = 24) -> L
         LIMIT {limit}
     """
 
-    results = await opnsense_ssh_query(query)
+    results = await opnsense_ssh_query(query, strict=strict)
+    if results is None:
+        return None
 
     return [
         {
-            "client": row["client"],
-            "total_queries": row["total_queries"],
-            "blocked": row["blocked_queries"],
-            "allowed": row["allowed_queries"],
-            "block_rate": round((row["blocked_queries"] / row["total_queries"] * 100), 2) if row["total_queries"] > 0 else 0
+            "client": client,
+            "total_queries": total,
+            "blocked": blocked,
+            "allowed": allowed,
+            "block_rate": round((blocked / total * 100), 2) if total > 0 else 0
         }
-        for row in results
+        for client, total, blocked, allowed in zip(
+            results.column("client"),
+            results.column("total_queries"),
+            results.column("blocked_queries"),
+            results.column("allowed_queries")
+        )
     ]
 
 async def get_dns_blocklist_stats(time_range_hours: int = 24) -> List[Dict[str, Any]]:
@@ -477,13 +1474,18 @@ async def get_dns_blocklist_stats(time_range_hours: int = 24) -> List[Dict[str,
 
     return [
         {
-            "blocklist": row["blocklist"],
-            "blocked_count": row["blocked_count"],
-            "unique_domains": row["unique_domains"],
-            "unique_clients": row["unique_clients"],
+            "blocklist": blocklist,
+            "blocked_count": blocked_count,
+            "unique_domains": unique_domains,
+            "unique_clients": unique_clients,
             "color": colors[i % len(colors)]
         }
-        for i, row in enumerate(results)
+        for i, (blocklist, blocked_count, unique_domains, unique_clients) in enumerate(zip(
+            results.column("blocklist"),
+            results.column("blocked_count"),
+            results.column("unique_domains"),
+            results.column("unique_clients")
+        ))
     ]
 
 async def get_dns_performance_stats(time_range_hours: int = 24) -> Dict[str, Any]:
@@ -503,14 +1505,14 @@ async def get_dns_performance_stats(time_range_hours: int = 24) -> Dict[str, Any
 
     results = await opnsense_ssh_query(query)
 
-    if results and len(results) > 0:
-        row = results[0]
+    if results:
+        row = results.first()
         return {
-            "avg_ms": round(row.get("avg_resolve_time", 0), 2),
-            "min_ms": round(row.get("min_resolve_time", 0), 2),
-            "max_ms": round(row.get("max_resolve_time", 0), 2),
-            "median_ms": round(row.get("median_resolve_time", 0), 2),
-            "p95_ms": round(row.get("p95_resolve_time", 0), 2)
+            "avg_ms": round(row.get("avg_resolve_time") or 0, 2),
+            "min_ms": round(row.get("min_resolve_time") or 0, 2),
+            "max_ms": round(row.get("max_resolve_time") or 0, 2),
+            "median_ms": round(row.get("median_resolve_time") or 0, 2),
+            "p95_ms": round(row.get("p95_resolve_time") or 0, 2)
         }
 
     return {
@@ -535,49 +1537,998 @@ async def get_dns_time_series(time_range_hours: int = 24, interval_minutes: int
         ORDER BY time_bucket DESC
     """
 
-    results = await opnsense_ssh_query(query)
+    results = await opnsense_ssh_query(query)
+
+    return [
+        {
+            "time": time_bucket if isinstance(time_bucket, str) or time_bucket is None else time_bucket.isoformat(sep=' '),
+            "total": total,
+            "blocked": blocked,
+            "allowed": allowed
+        }
+        for time_bucket, total, blocked, allowed in zip(
+            results.column("time_bucket"),
+            results.column("total_queries"),
+            results.column("blocked_queries"),
+            results.column("allowed_queries")
+        )
+    ]
+
+async def get_dns_dnssec_stats(time_range_hours: int = 24) -> Dict[str, Any]:
+    """Get DNSSEC statistics"""
+    query = f"""
+        SELECT
+            dnssec_status,
+            COUNT(*) as count
+        FROM query
+        WHERE time >= (NOW() - INTERVAL '{time_range_hours} hours')
+            AND dnssec_status IS NOT NULL
+            AND dnssec_status != ''
+        GROUP BY dnssec_status
+    """
+
+    results = await opnsense_ssh_query(query)
+
+    return dict(zip(results.column("dnssec_status"), results.column("count")))
+
+# Integration Snapshot Collectors
+# Collectors return None when the upstream call failed, so the previous snapshot is kept
+async def collect_opnsense_devices(cached: bool = True):
+    """Fetch device list from OPNsense ARP table and DHCP leases"""
+    result = await opnsense_api_call('/diagnostics/interface/getArp', cached=cached)
+    if result is None:
+        return None
+
+    devices = []
+    arp_table = result.get('rows', []) if isinstance(result, dict) else result
+
+    for idx, entry in enumerate(arp_table):
+        if isinstance(entry, dict):
+            device = {
+                'id': f"opn-{idx}",
+                'ip_address': entry.get('ip', entry.get('address', '')),
+                'mac_address': entry.get('mac', entry.get('ether', '')),
+                'hostname': entry.get('hostname', entry.get('intf_description', '')),
+                'vlan_id': None,
+                'bytes_sent': 0,
+                'bytes_received': 0,
+                'bytes_sent_rate': 0,
+                'bytes_received_rate': 0,
+            }
+            devices.append(device)
+
+    return devices
+
+async def collect_opnsense_dhcp_leases(cached: bool = True):
+    """Fetch DHCPv4 leases from OPNsense (ISC DHCP, falling back to Kea)"""
+    result = await opnsense_api_call('/dhcpv4/leases/searchLease', cached=cached)
+    if not result:
+        result = await opnsense_api_call('/kea/leases4/search', cached=cached) or result
+    if result is None:
+        return None
+
+    rows = result.get('rows', []) if isinstance(result, dict) else result
+    return [
+        {
+            'ip_address': row.get('address', ''),
+            'mac_address': row.get('mac', row.get('hwaddr', '')),
+            'hostname': row.get('hostname', ''),
+            'state': row.get('state', ''),
+            'ends': row.get('ends', row.get('expire', '')),
+        }
+        for row in rows
+        if isinstance(row, dict) and row.get('address')
+    ]
+
+async def collect_opnsense_dns_clients(cached: bool = True):
+    """Per-client DNS statistics from Unbound's DuckDB (DuckDB results are always cached briefly)"""
+    return await get_dns_client_stats(limit=DEVICE_INDEX_DNS_CLIENTS, time_range_hours=24, strict=True)
+
+async def collect_opnsense_stats(cached: bool = True):
+    """Fetch OPNsense firewall statistics"""
+    # show_all=1 is required to see ALL rules, not just automation rules
+    result = await opnsense_api_call('/firewall/filter/searchRule?show_all=1', cached=cached)
+
+    print(f"[OPNsense] Stats API response type: {type(result)}")
+    if result:
+        print(f"[OPNsense] Stats API response keys: {result.keys() if isinstance(result, dict) else 'N/A'}")
+        print(f"[OPNsense] Stats API first 200 chars: {str(result)[:200]}")
+
+    if result and isinstance(result, dict):
+        total = result.get('total', result.get('rowCount', 0))
+        rows = result.get('rows', [])
+
+        # Count blocked/allowed rules (simplified)
+        blocked = sum(1 for r in rows if isinstance(r, dict) and r.get('action') == 'block')
+        allowed = sum(1 for r in rows if isinstance(r, dict) and r.get('action') == 'pass')
+
+        return {
+            "total_rules": total,
+            "blocked_connections": blocked,
+            "allowed_connections": allowed,
+            "active_connections": len(rows)
+        }
+
+    return None
+
+async def collect_adguard_stats(cached: bool = True):
+    """Fetch AdGuard Home statistics"""
+    result = await adguard_api_call('/control/stats', cached=cached)
+
+    if result:
+        return {
+            "total_queries": result.get('num_dns_queries', 0),
+            "blocked_queries": result.get('num_blocked_filtering', 0),
+            "allowed_queries": result.get('num_dns_queries', 0) - result.get('num_blocked_filtering', 0),
+            "blocking_percentage": (result.get('num_blocked_filtering', 0) / max(result.get('num_dns_queries', 1), 1)) * 100
+        }
+
+    return None
+
+async def collect_truenas_pools(cached: bool = True):
+    """Fetch TrueNAS storage pools"""
+    result = await truenas_api_call('/pool', cached=cached)
+
+    if result is None:
+        return None
+
+    pools = []
+    for pool in result:
+        if isinstance(pool, dict):
+            topology = pool.get('topology', {})
+            pools.append({
+                "name": pool.get('name', ''),
+                "status": pool.get('status', 'UNKNOWN'),
+                "size": pool.get('size', 0),
+                "allocated": pool.get('allocated', 0),
+                "free": pool.get('free', 0)
+            })
+
+    return pools
+
+async def collect_truenas_datasets(cached: bool = True):
+    """Fetch TrueNAS datasets"""
+    result = await truenas_api_call('/pool/dataset', cached=cached)
+
+    if result is None:
+        return None
+
+    datasets = []
+    for dataset in result:
+        if isinstance(dataset, dict):
+            datasets.append({
+                "name": dataset.get('name', ''),
+                "type": dataset.get('type', 'FILESYSTEM'),
+                "used": dataset.get('used', {}).get('parsed', 0),
+                "available": dataset.get('available', {}).get('parsed', 0),
+                "compression": dataset.get('compression', {}).get('value', 'off')
+            })
+
+    return datasets
+
+async def collect_truenas_services(cached: bool = True):
+    """Fetch TrueNAS services status"""
+    result = await truenas_api_call('/service', cached=cached)
+
+    if result is None:
+        return None
+
+    services = []
+    for service in result:
+        if isinstance(service, dict):
+            services.append({
+                "name": service.get('service', ''),
+                "state": service.get('state', 'STOPPED'),
+                "enable": service.get('enable', False)
+            })
+
+    return services
+
+async def collect_truenas_system(cached: bool = True):
+    """Fetch TrueNAS system information"""
+    result = await truenas_api_call('/system/info', cached=cached)
+
+    if result and isinstance(result, dict):
+        return {
+            "hostname": result.get('hostname', 'N/A'),
+            "version": result.get('version', 'N/A'),
+            "uptime": result.get('uptime_seconds', 0),
+            "loadavg": ', '.join(map(str, result.get('loadavg', [0, 0, 0])))
+        }
+
+    return None
+
+# Integration Snapshots
+# snapshot name -> (integration, collector)
+SNAPSHOT_SOURCES = {
+    'opnsense_devices': ('opnsense', collect_opnsense_devices),
+    'opnsense_dhcp': ('opnsense', collect_opnsense_dhcp_leases),
+    'opnsense_dns_clients': ('opnsense', collect_opnsense_dns_clients),
+    'opnsense_stats': ('opnsense', collect_opnsense_stats),
+    'adguard_stats': ('adguard', collect_adguard_stats),
+    'truenas_pools': ('truenas', collect_truenas_pools),
+    'truenas_datasets': ('truenas', collect_truenas_datasets),
+    'truenas_services': ('truenas', collect_truenas_services),
+    'truenas_system': ('truenas', collect_truenas_system),
+}
+# Served while an integration is disabled or has no URL (failures of a configured one are 503)
+SNAPSHOT_DEFAULTS = {
+    'opnsense_stats': {"total_rules": 0, "blocked_connections": 0, "allowed_connections": 0, "active_connections": 0},
+    'adguard_stats': {"total_queries": 0, "blocked_queries": 0, "allowed_queries": 0, "blocking_percentage": 0},
+    'truenas_system': {"hostname": "N/A", "version": "N/A", "uptime": "N/A", "loadavg": "N/A"},
+}
+
+class SnapshotStore:
+    """Latest normalized integration snapshots, in memory and shared through Redis"""
+
+    REDIS_PREFIX = "netsentry:snapshot:"
+
+    def __init__(self):
+        self.redis = None
+        self.snapshots: Dict[str, tuple] = {}
+
+    async def put(self, name: str, data: Any):
+        updated_at = time.time()
+        self.snapshots[name] = (data, updated_at)
+        if self.redis is None:
+            return
+        try:
+            await self.redis.set(self.REDIS_PREFIX + name, json.dumps({'t': updated_at, 'v': data}, default=str))
+        except Exception as e:
+            print(f"[Snapshot] Redis write error for {name}: {e}")
+
+    async def get(self, name: str, max_age: float = None) -> tuple:
+        """Return (data, age_seconds); (None, None) if no snapshot exists yet"""
+        entry = self.snapshots.get(name)
+        # Another worker may own the poller - pick up its newer snapshot from Redis
+        if self.redis is not None and (entry is None or (max_age and time.time() - entry[1] > max_age)):
+            try:
+                raw = await self.redis.get(self.REDIS_PREFIX + name)
+                if raw:
+                    cached = json.loads(raw)
+                    if entry is None or cached['t'] > entry[1]:
+                        entry = (cached['v'], cached['t'])
+                        self.snapshots[name] = entry
+            except Exception as e:
+                print(f"[Snapshot] Redis read error for {name}: {e}")
+        if entry is None:
+            return None, None
+        return entry[0], time.time() - entry[1]
+
+    async def clear(self, shared: bool = False):
+        """Drop snapshots (shared=True also removes them from Redis for all workers)"""
+        self.snapshots.clear()
+        if not shared or self.redis is None:
+            return
+        try:
+            await self.redis.delete(*[self.REDIS_PREFIX + name for name in SNAPSHOT_SOURCES])
+        except Exception as e:
+            print(f"[Snapshot] Redis clear error: {e}")
+
+snapshot_store = SnapshotStore()
+
+async def acquire_poll_lease(name: str, interval: float) -> bool:
+    """Make sure only one API worker polls a snapshot source per interval"""
+    if snapshot_store.redis is None:
+        return True
+    try:
+        return bool(await snapshot_store.redis.set(
+            f"netsentry:poller:{name}", settings_cache.instance_id, nx=True, px=max(int(interval * 1000) - 100, 100)
+        ))
+    except Exception:
+        return True
+
+async def refresh_snapshot(name: str):
+    """Poll one snapshot source and store the result (the previous snapshot is kept on failure)"""
+    integration, collector = SNAPSHOT_SOURCES[name]
+    started = time.monotonic()
+    try:
+        data = await collector(cached=False)
+        if data is None:
+            print(f"[Snapshot] {name}: upstream unavailable, keeping previous snapshot")
+            return None
+        await snapshot_store.put(name, data)
+        return data
+    except Exception as e:
+        print(f"[Snapshot] Error polling {name}: {type(e).__name__}: {e}")
+        return None
+    finally:
+        elapsed = time.monotonic() - started
+        if elapsed > SNAPSHOT_POLL_INTERVALS[integration]:
+            print(f"[Snapshot] Polling {name} took {elapsed:.1f}s (longer than its interval)")
+
+async def poll_integration_snapshots():
+    """Background task: poll every enabled integration at its configured interval"""
+    next_run = {name: 0.0 for name in SNAPSHOT_SOURCES}
+    running: Dict[str, asyncio.Task] = {}
+
+    while True:
+        try:
+            settings = await get_settings()
+            now = time.monotonic()
+
+            for name, (integration, _) in SNAPSHOT_SOURCES.items():
+                if not getattr(settings, integration).enabled:
+                    continue
+                if now < next_run[name] or name in running:
+                    continue
+                interval = SNAPSHOT_POLL_INTERVALS[integration]
+                next_run[name] = now + interval
+                if not await acquire_poll_lease(name, interval):
+                    continue
+                task = asyncio.create_task(refresh_snapshot(name))
+                running[name] = task
+                task.add_done_callback(lambda _, name=name: running.pop(name, None))
+        except asyncio.CancelledError:
+            for task in running.values():
+                task.cancel()
+            raise
+        except Exception as e:
+            print(f"[Snapshot] Poller error: {e}")
+
+        await asyncio.sleep(1)
+
+async def serve_snapshot(name: str, response: Response) -> Any:
+    """Serve the latest snapshot, reporting its age in the X-Snapshot-Age header
+
+    A disabled or unconfigured integration yields its empty default; 503 means
+    the upstream failed and no snapshot exists yet.
+    """
+    integration, _ = SNAPSHOT_SOURCES[name]
+    data, age = await snapshot_store.get(name, max_age=SNAPSHOT_POLL_INTERVALS[integration])
+    if data is None:
+        config = getattr(await get_settings(), integration)
+        if not config.enabled or not config.url:
+            return dict(SNAPSHOT_DEFAULTS[name]) if name in SNAPSHOT_DEFAULTS else []
+        # Nothing polled yet (startup or integration just enabled) - fetch once inline
+        data = await refresh_snapshot(name)
+        if data is None:
+            raise HTTPException(status_code=503, detail=f"{integration} is unavailable and no snapshot exists yet")
+        age = 0.0
+    response.headers['X-Snapshot-Age'] = f"{age:.1f}"
+    return data
+
+# Device Traffic Enrichment
+DEVICE_STAT_FIELDS = ('bytes_sent', 'bytes_received', 'bytes_sent_rate', 'bytes_received_rate')
+
+def ip_sort_key(value: str):
+    try:
+        address = ipaddress.ip_address(value)
+        return (address.version, int(address))
+    except ValueError:
+        return (9, 0)
+
+DEVICE_SORT_KEYS = {
+    'traffic': lambda d: d['bytes_sent'] + d['bytes_received'],
+    'rate': lambda d: d['bytes_sent_rate'] + d['bytes_received_rate'],
+    'bytes_sent': lambda d: d['bytes_sent'],
+    'bytes_received': lambda d: d['bytes_received'],
+    'ip_address': lambda d: ip_sort_key(d.get('ip_address') or ''),
+    'hostname': lambda d: (d.get('hostname') or '').lower(),
+    'dns_queries': lambda d: d.get('dns_queries', 0),
+}
+
+async def fetch_device_stats(ips: List[str]) -> Dict[str, Dict[str, int]]:
+    """Read the collector's device:{ip} counters for all IPs in one pipelined round-trip"""
+    unique_ips = list(dict.fromkeys(ip for ip in ips if ip))
+    if not unique_ips:
+        return {}
+
+    pipe = app.state.redis.pipeline(transaction=False)
+    for ip in unique_ips:
+        pipe.hmget(f"device:{ip}", *DEVICE_STAT_FIELDS)
+    rows = await pipe.execute()
+
+    return {
+        ip: {field: int(float(value or 0)) for field, value in zip(DEVICE_STAT_FIELDS, values)}
+        for ip, values in zip(unique_ips, rows)
+    }
+
+async def enrich_devices(devices: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Copies of the devices with live traffic counters merged in"""
+    try:
+        stats = await fetch_device_stats([device.get('ip_address') for device in devices])
+    except Exception as e:
+        print(f"[Devices] Redis enrichment failed: {e}")
+        stats = {}
+    empty = dict.fromkeys(DEVICE_STAT_FIELDS, 0)
+    return [{**device, **stats.get(device.get('ip_address'), empty)} for device in devices]
+
+# Device Index
+class DeviceIndex:
+    """Devices keyed by IP (plus a MAC -> IP map), merged from ARP, DHCP and DNS
+
+    Each source is a snapshot from the integration poller; when a snapshot is
+    newer than the one last merged, that source's fields are replaced and the
+    merged records are rebuilt. Traffic counters change every collector tick,
+    so they are read per request from Redis in one pipeline instead.
+    """
+
+    # snapshot name -> label listed in a device's `sources`
+    SOURCES = {'opnsense_devices': 'arp', 'opnsense_dhcp': 'dhcp', 'opnsense_dns_clients': 'dns'}
 
-    return [
-        {
-            "time": row["time_bucket"],
-            "total": row["total_queries"],
-            "blocked": row["blocked_queries"],
-            "allowed": row["allowed_queries"]
+    def __init__(self):
+        self.sources: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.versions: Dict[str, float] = {}
+        self.devices: Dict[str, Dict[str, Any]] = {}
+        self.by_mac: Dict[str, str] = {}
+        self.lock = asyncio.Lock()
+
+    @staticmethod
+    def normalize(name: str, data: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Per-IP fields contributed by one source"""
+        fields = {}
+        for entry in data or []:
+            if name == 'opnsense_dns_clients':
+                ip = entry.get('client')
+                values = {
+                    'dns_queries': entry.get('total_queries', 0),
+                    'dns_blocked': entry.get('blocked', 0),
+                    'dns_block_rate': entry.get('block_rate', 0),
+                }
+            else:
+                ip = entry.get('ip_address')
+                values = {
+                    'mac_address': (entry.get('mac_address') or '').lower() or None,
+                    'hostname': entry.get('hostname') or None,
+                }
+                if name == 'opnsense_dhcp':
+                    values['lease_state'] = entry.get('state') or None
+                    values['lease_ends'] = entry.get('ends') or None
+            if ip:
+                fields[ip] = values
+        return fields
+
+    @staticmethod
+    def new_device(ip: str) -> Dict[str, Any]:
+        return {
+            'ip_address': ip, 'mac_address': None, 'hostname': None, 'vlan_id': None,
+            'dns_queries': 0, 'dns_blocked': 0, 'dns_block_rate': 0, 'sources': [],
         }
-        for row in results
-    ]
 
-async def get_dns_dnssec_stats(time_range_hours: int = 24) -> Dict[str, Any]:
-    """Get DNSSEC statistics"""
-    query = f"""
-        SELECT
-            dnssec_status,
-            COUNT(*) as count
-        FROM query
-        WHERE time >= (NOW() - INTERVAL '{time_range_hours} hours')
-            AND dnssec_status IS NOT NULL
-            AND dnssec_status != ''
-        GROUP BY dnssec_status
+    def rebuild(self):
+        """Merge all sources; DHCP hostnames win over ARP interface descriptions"""
+        devices = {}
+        for name in ('opnsense_dns_clients', 'opnsense_devices', 'opnsense_dhcp'):
+            for ip, values in self.sources.get(name, {}).items():
+                device = devices.get(ip)
+                if device is None:
+                    device = devices[ip] = self.new_device(ip)
+                device.update({key: value for key, value in values.items() if value is not None})
+                device['sources'].append(self.SOURCES[name])
+        self.devices = devices
+        self.by_mac = {device['mac_address']: ip for ip, device in devices.items() if device['mac_address']}
+
+    async def refresh(self):
+        """Merge every source whose snapshot changed since the last merge"""
+        async with self.lock:
+            changed = False
+            for name in self.SOURCES:
+                integration, _ = SNAPSHOT_SOURCES[name]
+                data, _ = await snapshot_store.get(name, max_age=SNAPSHOT_POLL_INTERVALS[integration])
+                entry = snapshot_store.snapshots.get(name)
+                if data is None or entry is None or self.versions.get(name) == entry[1]:
+                    continue
+                self.sources[name] = self.normalize(name, data)
+                self.versions[name] = entry[1]
+                changed = True
+            if changed:
+                self.rebuild()
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """Find a device by IP or MAC address"""
+        ip = self.by_mac.get(key.lower(), key)
+        return self.devices.get(ip)
+
+    async def list_devices(self, include_active: bool = True) -> List[Dict[str, Any]]:
+        """All indexed devices (plus devices only seen in flows) with traffic counters"""
+        await self.refresh()
+        devices = dict(self.devices)
+        if include_active:
+            active = await app.state.redis.zrangebyscore(DEVICE_ACTIVE_KEY, time.time() - DEVICE_ACTIVE_WINDOW, "+inf")
+            for ip in active:
+                if ip not in devices:
+                    devices[ip] = {**self.new_device(ip), 'sources': ['flows']}
+        return await enrich_devices(list(devices.values()))
+
+device_index = DeviceIndex()
+
+# Realtime Ring Buffer
+class RealtimeRingReader:
+    """Reads the collector's memory-mapped ring of per-second counters
+
+    Layout must match RealtimeRingWriter in collector.py. Only completed seconds
+    are returned; slots whose stamp changes while being read are skipped.
     """
 
-    results = await opnsense_ssh_query(query)
+    MAGIC = b'NSRB'
+    HEADER_FORMAT = '<4sIIQ'
+    HEADER_SIZE = 32
+    SLOT_FORMAT = '<8Q'
+    SLOT_SIZE = 64
+    FIELDS = ('bytes', 'packets', 'inbound_bytes', 'outbound_bytes', 'internal_bytes', 'external_bytes', 'flows')
+
+    def __init__(self, path: str):
+        self.path = path
+        self.buffer = None
+        self.slots = 0
+        self.inode = None
+
+    def close(self):
+        if self.buffer is not None:
+            self.buffer.close()
+        self.buffer = None
+        self.slots = 0
+        self.inode = None
+
+    def open(self) -> bool:
+        """Map the ring file, remapping when the collector recreated or resized it"""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            self.close()
+            return False
+        if self.buffer is not None:
+            magic, _, slots, _ = struct.unpack_from(self.HEADER_FORMAT, self.buffer, 0)
+            if (stat.st_ino == self.inode and stat.st_size >= len(self.buffer)
+                    and magic == self.MAGIC and slots == self.slots):
+                return True
+            self.close()
 
-    stats = {}
-    for row in results:
-        stats[row["dnssec_status"]] = row["count"]
+        try:
+            with open(self.path, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+        if len(buffer) < self.HEADER_SIZE:
+            buffer.close()
+            return False
+        magic, version, slots, _ = struct.unpack_from(self.HEADER_FORMAT, buffer, 0)
+        if magic != self.MAGIC or not slots or len(buffer) < self.HEADER_SIZE + slots * self.SLOT_SIZE:
+            buffer.close()
+            return False
+        self.buffer = buffer
+        self.slots = slots
+        self.inode = stat.st_ino
+        return True
+
+    def last_second(self) -> int:
+        return struct.unpack_from('<Q', self.buffer, 12)[0]
+
+    def read_second(self, second: int) -> Dict[str, int]:
+        """Counters of one second (zeros if nothing was recorded for it)"""
+        offset = self.HEADER_SIZE + (second % self.slots) * self.SLOT_SIZE
+        values = struct.unpack_from(self.SLOT_FORMAT, self.buffer, offset)
+        stamp = struct.unpack_from('<Q', self.buffer, offset)[0]
+        if values[0] != second or stamp != second:
+            values = (second,) + (0,) * len(self.FIELDS)
+        return dict(zip(self.FIELDS, values[1:]))
+
+    def history(self, seconds: int) -> List[Dict[str, Any]]:
+        """Per-second counters for the last N completed seconds (oldest first)"""
+        if not self.open():
+            return []
+        last = self.last_second()
+        if not last:
+            return []
+        seconds = min(seconds, self.slots - 1)
+        return [
+            {"timestamp": datetime.utcfromtimestamp(second).isoformat(), **self.read_second(second)}
+            for second in range(last - seconds + 1, last + 1)
+        ]
+
+realtime_ring = RealtimeRingReader(REALTIME_RING_PATH) if REALTIME_RING_PATH else None
+# Set once the rollup buckets and downsampling tasks exist
+influx_rollups = {"ready": False, "since": {}}
+
+# Traffic History (rollups, automatic interval, cached windows)
+def parse_duration(value: str) -> int:
+    """Parse a duration like 30s, 5m, 1h, 1d or 1w into seconds"""
+    match = re.fullmatch(r'(\d+)([smhdw])', value.strip())
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid interval: {value}")
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+def format_duration(seconds: int) -> str:
+    """Format seconds as the largest exact Flux duration unit"""
+    for unit, size in sorted(DURATION_UNITS.items(), key=lambda item: -item[1]):
+        if seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
+
+def parse_history_time(value: str) -> datetime:
+    """Parse an ISO timestamp (UTC if no offset is given)"""
+    parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def select_history_interval(range_seconds: float, max_points: int, requested: Optional[int] = None) -> int:
+    """Smallest standard interval that keeps the range within max_points (never below the requested one)"""
+    needed = max(range_seconds / max_points, requested or 0)
+    for candidate in HISTORY_INTERVALS:
+        if candidate >= needed:
+            return candidate
+    return HISTORY_INTERVALS[-1]
+
+def select_history_bucket(interval_seconds: int, start_ts: float) -> str:
+    """Coarsest bucket whose resolution divides the interval and that covers the start time"""
+    if influx_rollups["ready"]:
+        for resolution in sorted(ROLLUP_BUCKETS, reverse=True):
+            bucket = ROLLUP_BUCKETS[resolution]
+            if interval_seconds % resolution == 0 and start_ts >= influx_rollups["since"].get(bucket, 0) + resolution:
+                return bucket
+    return INFLUXDB_BUCKET
+
+def flux_time(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def traffic_history_flux(bucket: str, start: datetime, stop: datetime, interval_seconds: int) -> str:
+    """Flux query returning one row per window with per-direction and total columns"""
+    directions = ('inbound', 'outbound', 'internal', 'external')
+    columns = ',\n            '.join(
+        f'{field}_{direction}: if exists r.{field}_{direction} then r.{field}_{direction} else 0'
+        for field in ('bytes', 'packets') for direction in directions
+    )
+    totals = ', '.join(
+        f"{field}: " + ' + '.join(f"r.{field}_{direction}" for direction in directions)
+        for field in ('bytes', 'packets')
+    )
+    return f'''
+    from(bucket: "{bucket}")
+      |> range(start: {flux_time(start)}, stop: {flux_time(stop)})
+      |> filter(fn: (r) => r["_measurement"] == "network_traffic")
+      |> filter(fn: (r) => r["_field"] == "bytes" or r["_field"] == "packets")
+      |> group(columns: ["_field", "direction"])
+      |> aggregateWindow(every: {format_duration(interval_seconds)}, fn: sum, createEmpty: false, timeSrc: "_start")
+      |> group()
+      |> pivot(rowKey: ["_time"], columnKey: ["_field", "direction"], valueColumn: "_value")
+      |> map(fn: (r) => ({{
+            _time: r._time,
+            {columns}
+        }}))
+      |> map(fn: (r) => ({{r with {totals}}}))
+      |> sort(columns: ["_time"])
+    '''
+
+async def fetch_traffic_history(bucket: str, start: datetime, stop: datetime, interval_seconds: int) -> List[Dict[str, Any]]:
+    """Run the aggregation query for one time range, streaming the result records"""
+    query = traffic_history_flux(bucket, start, stop, interval_seconds)
+    records = await app.state.influx.query_api().query_stream(query=query, org=INFLUXDB_ORG)
+
+    data = []
+    async for record in records:
+        row = {key: value for key, value in record.values.items() if key[0] != '_' and key not in ('result', 'table')}
+        row['time'] = record.get_time().isoformat()
+        data.append(row)
+    return data
+
+async def query_traffic_history(bucket: str, start: datetime, end: datetime, interval_seconds: int, now: datetime) -> List[Dict[str, Any]]:
+    """Aggregate traffic between start and end, caching completed chunks in Redis
+
+    The range is split into chunks of HISTORY_CHUNK_POINTS windows aligned to the
+    epoch. Chunks that ended before the settle time are immutable and cached;
+    missing ones are fetched with one query per contiguous run, and only the
+    still-open tail is always queried live.
+    """
+    step = interval_seconds
+    chunk_span = step * HISTORY_CHUNK_POINTS
+    start_ts = int(start.timestamp()) // step * step
+    end_ts = -(-int(end.timestamp()) // step) * step
+    # Rollup tasks write windows a little after they close
+    settled_ts = int(now.timestamp()) - max(step, HISTORY_SETTLE_SECONDS)
+
+    chunks = list(range(start_ts // chunk_span * chunk_span, end_ts, chunk_span))
+    cacheable = [c for c in chunks if c + chunk_span <= settled_ts]
+    redis_client = app.state.redis
 
-    return stats
+    def cache_key(chunk_start: int) -> str:
+        return f"netsentry:history:v{HISTORY_CACHE_VERSION}:{bucket}:{step}:{chunk_start}"
+
+    cached: Dict[int, list] = {}
+    if cacheable:
+        try:
+            values = await redis_client.mget([cache_key(c) for c in cacheable])
+            cached = {c: json.loads(v) for c, v in zip(cacheable, values) if v is not None}
+        except Exception as e:
+            print(f"[History] Redis cache read error: {e}")
+
+    rows = []
+    for chunk_rows in cached.values():
+        rows.extend(chunk_rows)
+
+    # Group missing cacheable chunks into contiguous runs -> one query each
+    missing = [c for c in cacheable if c not in cached]
+    runs = []
+    for chunk_start in missing:
+        if runs and runs[-1][1] == chunk_start:
+            runs[-1][1] = chunk_start + chunk_span
+        else:
+            runs.append([chunk_start, chunk_start + chunk_span])
+
+    for run_start, run_end in runs:
+        fetched = await fetch_traffic_history(
+            bucket, datetime.fromtimestamp(run_start, timezone.utc), datetime.fromtimestamp(run_end, timezone.utc), step
+        )
+        rows.extend(fetched)
+        by_chunk: Dict[int, list] = {c: [] for c in range(run_start, run_end, chunk_span)}
+        for row in fetched:
+            row_ts = int(parse_history_time(row['time']).timestamp())
+            by_chunk[row_ts // chunk_span * chunk_span].append(row)
+        try:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for chunk_start, chunk_rows in by_chunk.items():
+                    pipe.set(cache_key(chunk_start), json.dumps(chunk_rows), ex=HISTORY_CACHE_TTL)
+                await pipe.execute()
+        except Exception as e:
+            print(f"[History] Redis cache write error: {e}")
+
+    # Open tail (not cacheable yet)
+    tail_start = max(cacheable[-1] + chunk_span if cacheable else chunks[0], start_ts)
+    if tail_start < end_ts:
+        rows.extend(await fetch_traffic_history(
+            bucket, datetime.fromtimestamp(tail_start, timezone.utc), datetime.fromtimestamp(end_ts, timezone.utc), step
+        ))
+
+    start_iso = datetime.fromtimestamp(start_ts, timezone.utc)
+    end_iso = datetime.fromtimestamp(end_ts, timezone.utc)
+    rows = [row for row in rows if start_iso <= parse_history_time(row['time']) < end_iso]
+    rows.sort(key=lambda row: row['time'])
+    return rows
+
+def rollup_task_definitions() -> List[tuple]:
+    """(name, flux, every) for the downsampling tasks raw -> 1m -> 1h -> 1d"""
+    definitions = []
+    source = INFLUXDB_BUCKET
+    for resolution in sorted(ROLLUP_BUCKETS):
+        target = ROLLUP_BUCKETS[resolution]
+        every = format_duration(resolution)
+        # Re-aggregate the previous window as well, so late points are picked up
+        flux = f'''
+from(bucket: "{source}")
+  |> range(start: -{format_duration(resolution * 2)})
+  |> filter(fn: (r) => r["_measurement"] == "network_traffic")
+  |> filter(fn: (r) => r["_field"] == "bytes" or r["_field"] == "packets")
+  |> group(columns: ["_measurement", "_field", "direction"])
+  |> aggregateWindow(every: {every}, fn: sum, createEmpty: false, timeSrc: "_start")
+  |> to(bucket: "{target}", org: "{INFLUXDB_ORG}")
+'''
+        definitions.append((f"netsentry_rollup_{every}", flux, every))
+        source = target
+    return definitions
+
+def influx_created_at(value) -> float:
+    """Epoch seconds of an InfluxDB created_at attribute (datetime or RFC3339 string)"""
+    if isinstance(value, str):
+        value = parse_history_time(re.sub(r'(\.\d{6})\d+', r'\1', value))
+    if value is None:
+        return time.time()
+    return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+
+def _ensure_influx_rollups() -> Dict[str, float]:
+    """Create rollup buckets and downsampling tasks if missing (blocking client)
+
+    Returns, per rollup bucket, the time from which it holds complete data: the
+    later of the bucket's and its task's creation, and never earlier than the
+    bucket it is downsampled from. Derived from InfluxDB itself, so it survives
+    a Redis flush.
+    """
+    from influxdb_client import InfluxDBClient, BucketRetentionRules
+
+    with InfluxDBClient(url=INFLUXDB_URL, token=INFLUXDB_TOKEN, org=INFLUXDB_ORG) as client:
+        org = client.organizations_api().find_organizations(org=INFLUXDB_ORG)[0]
+
+        buckets_api = client.buckets_api()
+        bucket_created = {}
+        for resolution, bucket in ROLLUP_BUCKETS.items():
+            found = buckets_api.find_bucket_by_name(bucket)
+            if found is None:
+                retention = ROLLUP_RETENTION.get(resolution, 0)
+                rules = BucketRetentionRules(type="expire", every_seconds=retention) if retention else None
+                found = buckets_api.create_bucket(bucket_name=bucket, org_id=org.id, retention_rules=rules)
+                print(f"[History] Created rollup bucket {bucket}")
+            bucket_created[bucket] = influx_created_at(getattr(found, 'created_at', None))
+
+        tasks_api = client.tasks_api()
+        existing = {task.name: task for task in tasks_api.find_tasks(org_id=org.id)}
+        since = {}
+        upstream = 0.0
+        for (name, flux, every), resolution in zip(rollup_task_definitions(), sorted(ROLLUP_BUCKETS)):
+            task = existing.get(name)
+            if task is None:
+                task = tasks_api.create_task_every(name, flux, every, org)
+                print(f"[History] Created downsampling task {name}")
+            bucket = ROLLUP_BUCKETS[resolution]
+            upstream = max(upstream, bucket_created[bucket], influx_created_at(getattr(task, 'created_at', None)))
+            since[bucket] = upstream
+
+    return since
+
+async def ensure_influx_rollups():
+    """Background startup step: set up rollups, then let history queries use them"""
+    if not INFLUXDB_ROLLUPS_ENABLED:
+        return
+    try:
+        # Rollups only hold data from their creation on - older ranges stay on the raw bucket
+        since = await asyncio.to_thread(_ensure_influx_rollups)
+        influx_rollups["since"].update({bucket: int(ts) for bucket, ts in since.items()})
+        influx_rollups["ready"] = True
+    except Exception as e:
+        print(f"[History] Rollup setup failed, querying raw bucket only: {e}")
+
+# Flow Archive Queries
+flow_query_slots = asyncio.Semaphore(FLOW_QUERY_MAX_CONCURRENCY)
+
+def flow_archive_files(start: datetime, end: datetime) -> List[str]:
+    """Parquet files of the hourly partitions overlapping [start, end) - the partition pruning step"""
+    files = []
+    hour = start.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    while hour < end:
+        partition = os.path.join(FLOW_ARCHIVE_PATH, hour.strftime('date=%Y-%m-%d'), hour.strftime('hour=%H'))
+        files.extend(sorted(glob.glob(os.path.join(partition, '*.parquet'))))
+        hour += timedelta(hours=1)
+    return files
+
+def build_flow_query(files: List[str], start: datetime, end: datetime, filters: Dict[str, Any],
+                     group_by: List[str], order_by: str, limit: int, offset: int) -> tuple:
+    """Parameterized DuckDB query over the archive; returns (sql, params)
+
+    Only whitelisted column names end up in the SQL text, all values are bound.
+    Timestamps are selected as epoch milliseconds (no timezone support needed
+    in DuckDB) and rows are fully ordered so that paging is stable.
+    """
+    conditions = ["time >= ?", "time < ?"]
+    params: List[Any] = [files, start, end]
+    if filters.get('ip'):
+        conditions.append("(src_addr = ? OR dst_addr = ?)")
+        params += [filters['ip'], filters['ip']]
+    if filters.get('port') is not None:
+        conditions.append("(src_port = ? OR dst_port = ?)")
+        params += [filters['port'], filters['port']]
+    if filters.get('host'):
+        conditions.append("(src_hostname ILIKE ? OR dst_hostname ILIKE ?)")
+        params += [f"%{filters['host']}%", f"%{filters['host']}%"]
+    for column in ('src_addr', 'dst_addr', 'protocol', 'direction', 'source'):
+        if filters.get(column):
+            conditions.append(f"{column} = ?")
+            params.append(filters[column])
+    where = " AND ".join(conditions)
+
+    if group_by:
+        columns = ", ".join(group_by)
+        order = {'time': 'last_seen'}.get(order_by, order_by)
+        sql = (
+            f"SELECT {columns}, SUM(bytes) AS bytes, SUM(packets) AS packets, COUNT(*) AS flows, "
+            f"epoch_ms(MIN(time)) AS first_seen, epoch_ms(MAX(time)) AS last_seen "
+            f"FROM read_parquet(?) WHERE {where} GROUP BY {columns} "
+            f"ORDER BY {order} DESC, {columns} LIMIT ? OFFSET ?"
+        )
+    else:
+        order = f"{order_by} DESC, time DESC" if order_by in ('bytes', 'packets') else "time DESC"
+        sql = (
+            f"SELECT epoch_ms(time) AS time, {', '.join(FLOW_QUERY_COLUMNS)} "
+            f"FROM read_parquet(?) WHERE {where} "
+            f"ORDER BY {order}, src_addr, dst_addr, src_port, dst_port LIMIT ? OFFSET ?"
+        )
+    # One extra row tells whether another page exists
+    params += [limit + 1, offset]
+    return sql, params
+
+def _run_flow_query(sql: str, params: List[Any], handle: Dict[str, Any]) -> DuckDBResult:
+    """Execute an archive query on a private, resource-capped DuckDB connection"""
+    import duckdb
+
+    con = duckdb.connect(config={'threads': FLOW_QUERY_THREADS, 'memory_limit': FLOW_QUERY_MEMORY_LIMIT})
+    handle['connection'] = con
+    try:
+        cursor = con.execute(sql, params)
+        header = [col[0] for col in cursor.description]
+        rows = cursor.fetchall()
+    finally:
+        con.close()
+
+    columns = list(zip(*rows)) if rows else [() for _ in header]
+    return DuckDBResult(header, {name: list(values) for name, values in zip(header, columns)})
+
+async def run_flow_query(sql: str, params: List[Any]) -> DuckDBResult:
+    """Run an archive query with bounded concurrency, interrupting it after FLOW_QUERY_TIMEOUT"""
+    async with flow_query_slots:
+        handle: Dict[str, Any] = {}
+        task = asyncio.ensure_future(asyncio.to_thread(_run_flow_query, sql, params, handle))
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), FLOW_QUERY_TIMEOUT)
+        except asyncio.TimeoutError:
+            if handle.get('connection') is not None:
+                handle['connection'].interrupt()
+            # Keep the slot until the worker thread has actually stopped
+            try:
+                await task
+            except Exception:
+                pass
+            raise HTTPException(status_code=504, detail=f"Query exceeded {FLOW_QUERY_TIMEOUT:g}s, narrow the time range or filters")
 
 # Application lifecycle
 # Store previous values for rate calculation
 previous_stats = {"bytes": 0, "packets": 0, "timestamp": None}
+# Monotonic time of the last live frame relayed from the collector
+live_traffic = {"last_frame": 0.0}
+
+def live_traffic_message(frame: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a collector live frame into a traffic_update with per-second rates"""
+    interval = frame.get('interval') or 1
+    directions = {
+        direction: {"bytes": int(counters[0] / interval), "packets": int(counters[1] / interval)}
+        for direction, counters in frame.get('directions', {}).items()
+    }
+    return {
+        "type": "traffic_update",
+        "data": {
+            "timestamp": datetime.utcfromtimestamp(frame['ts']).isoformat(),
+            "bytes": sum(d["bytes"] for d in directions.values()),
+            "packets": sum(d["packets"] for d in directions.values()),
+            "flows": frame.get('flows', 0),
+            "directions": directions,
+            "top_flows": [
+                {
+                    "src_addr": src,
+                    "dst_addr": dst,
+                    "protocol": protocol,
+                    "dst_port": dst_port,
+                    "bytes": int(flow_bytes / interval),
+                    "packets": int(flow_packets / interval)
+                }
+                for src, dst, protocol, dst_port, flow_bytes, flow_packets in frame.get('top', [])
+            ]
+        }
+    }
+
+async def relay_live_traffic():
+    """Background task: subscribe once to the collector's live frames and relay them"""
+    while True:
+        pubsub = app.state.redis.pubsub()
+        try:
+            await pubsub.subscribe(LIVE_CHANNEL)
+            async for message in pubsub.listen():
+                if message['type'] != 'message':
+                    continue
+                try:
+                    frame = json.loads(message['data'])
+                except ValueError:
+                    # Older collectors published one Python repr per flow - ignore those
+                    continue
+                if not isinstance(frame, dict) or frame.get('v') != 1:
+                    continue
+                live_traffic["last_frame"] = time.monotonic()
+                await manager.broadcast(live_traffic_message(frame), topic='traffic')
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error relaying live traffic: {e}")
+            await asyncio.sleep(5)
+        finally:
+            await pubsub.close()
 
 async def broadcast_traffic_updates():
-    """Background task to broadcast traffic stats via WebSocket"""
+    """Background task to broadcast polled traffic stats while no live frames arrive"""
     global previous_stats
 
     while True:
         try:
+            # Exact per-second counters from the shared-memory ring (single-host mode)
+            if realtime_ring and realtime_ring.open():
+                await asyncio.sleep(1)
+                if time.monotonic() - live_traffic["last_frame"] < LIVE_FALLBACK_AFTER:
+                    continue
+                latest = realtime_ring.history(1)
+                if latest:
+                    await manager.broadcast({
+                        "type": "traffic_update",
+                        "data": {
+                            "timestamp": latest[0]["timestamp"],
+                            "bytes": latest[0]["bytes"],
+                            "packets": latest[0]["packets"]
+                        }
+                    }, topic='traffic')
+                continue
+
             await asyncio.sleep(3)  # Broadcast every 3 seconds
 
             # Fetch current stats from Redis
@@ -607,7 +2558,11 @@ async def broadcast_traffic_updates():
                 "timestamp": current_time
             }
 
-            # Broadcast to all connected clients
+            # Live frames from the collector take precedence
+            if time.monotonic() - live_traffic["last_frame"] < LIVE_FALLBACK_AFTER:
+                continue
+
+            # Broadcast to all subscribed clients
             await manager.broadcast({
                 "type": "traffic_update",
                 "data": {
@@ -615,7 +2570,7 @@ async def broadcast_traffic_updates():
                     "bytes": bytes_per_sec,
                     "packets": packets_per_sec
                 }
-            })
+            }, topic='traffic')
         except Exception as e:
             print(f"Error broadcasting traffic updates: {e}")
             await asyncio.sleep(5)
@@ -625,6 +2580,10 @@ async def lifespan(app: FastAPI):
     # Startup
     app.state.redis = await redis.from_url(REDIS_URL, decode_responses=True)
     app.state.influx = InfluxDBClientAsync(url=INFLUXDB_URL, token=INFLUXDB_TOKEN, org=INFLUXDB_ORG)
+    if CACHE_REDIS_ENABLED:
+        response_cache.redis = app.state.redis
+    upstream_pools.start(['opnsense', 'adguard', 'truenas', 'camera'])
+    snapshot_store.redis = app.state.redis
 
     # Initialize default settings if not exists
     if not await db.settings.find_one():
@@ -632,11 +2591,23 @@ async def lifespan(app: FastAPI):
 
     # Start background task for WebSocket broadcasts
     broadcast_task = asyncio.create_task(broadcast_traffic_updates())
+    live_relay_task = asyncio.create_task(relay_live_traffic())
+    settings_listener_task = asyncio.create_task(settings_cache.listen(app.state.redis))
+    snapshot_poller_task = asyncio.create_task(poll_integration_snapshots())
+    rollup_setup_task = asyncio.create_task(ensure_influx_rollups())
+    restream_reaper_task = asyncio.create_task(hls_restreamer.reap_idle())
 
     yield
 
     # Shutdown
     broadcast_task.cancel()
+    live_relay_task.cancel()
+    settings_listener_task.cancel()
+    snapshot_poller_task.cancel()
+    rollup_setup_task.cancel()
+    restream_reaper_task.cancel()
+    await hls_restreamer.stop_all()
+    await upstream_pools.close()
     await app.state.redis.close()
     await app.state.influx.close()
     mongo_client.close()
@@ -663,20 +2634,49 @@ app.add_middleware(
 async def root():
     return {"message": "NetSentry API", "version": "2.0.0"}
 
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Get integration response cache statistics"""
+    return response_cache.stats()
+
+@app.get("/api/upstreams/stats")
+async def get_upstream_stats():
+    """Get connection pool utilization per upstream integration"""
+    return upstream_pools.stats()
+
+@app.get("/api/ws/stats")
+async def get_websocket_stats():
+    """Get WebSocket fan-out statistics"""
+    return manager.stats()
+
+@app.get("/api/snapshots/status")
+async def get_snapshot_status():
+    """Get age of the latest snapshot per integration source"""
+    status = {}
+    for name, (integration, _) in SNAPSHOT_SOURCES.items():
+        data, age = await snapshot_store.get(name)
+        status[name] = {
+            "integration": integration,
+            "interval": SNAPSHOT_POLL_INTERVALS[integration],
+            "age": round(age, 1) if age is not None else None
+        }
+    return status
+
 @app.get("/api/settings")
 async def get_settings_endpoint():
     """Get application settings"""
-    settings = await db.settings.find_one()
-    if not settings:
-        settings = Settings().model_dump()
-    settings.pop('_id', None)
-    return settings
+    settings = await get_settings()
+    return settings.model_dump()
 
 @app.post("/api/settings")
 async def save_settings_endpoint(settings: Settings):
     """Save application settings"""
     await db.settings.delete_many({})
     await db.settings.insert_one(settings.model_dump())
+    settings_cache.set(settings)
+    await response_cache.clear()
+    await snapshot_store.clear(shared=True)
+    await settings_cache.notify_changed(app.state.redis)
     return {"message": "Settings saved successfully"}
 
 @app.get("/api/stats/current", response_model=TrafficStats)
@@ -690,7 +2690,7 @@ async def get_current_stats():
         inbound_bytes = int(await redis_client.get("stats:inbound_bytes") or 0)
         outbound_bytes = int(await redis_client.get("stats:outbound_bytes") or 0)
         internal_bytes = int(await redis_client.get("stats:internal_bytes") or 0)
-        devices_active = await redis_client.scard("devices") or 0
+        devices_active = await redis_client.zcount(DEVICE_ACTIVE_KEY, time.time() - DEVICE_ACTIVE_WINDOW, "+inf")
 
         return TrafficStats(
             timestamp=datetime.utcnow(),
@@ -704,106 +2704,263 @@ async def get_current_stats():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/stats/realtime")
+async def get_realtime_history(seconds: int = Query(300, ge=1, le=3600)):
+    """Get exact per-second traffic counters from the shared-memory ring"""
+    if not realtime_ring:
+        raise HTTPException(status_code=404, detail="Realtime ring buffer is not enabled (set REALTIME_RING_PATH)")
+    return {"source": "ring", "data": realtime_ring.history(seconds)}
+
 @app.get("/api/traffic/history")
 async def get_traffic_history(
-    start: Optional[str] = Query(None),
-    end: Optional[str] = Query(None),
-    interval: str = Query("1m")
+    start: Optional[str] = Query(None, description="Start time (ISO format, default: 1 hour ago)"),
+    end: Optional[str] = Query(None, description="End time (ISO format, default: now)"),
+    interval: Optional[str] = Query(None, description="Aggregation interval (e.g. 1m, 1h); chosen automatically if omitted"),
+    max_points: int = Query(HISTORY_MAX_POINTS, ge=10, le=5000),
+    format: str = Query("json", pattern="^(json|csv)$")
 ):
-    """Get historical traffic data from InfluxDB"""
+    """Get historical traffic data from InfluxDB
+
+    Returns one row per window with bytes/packets totals and per-direction
+    columns (bytes_inbound, packets_outbound, ...), all computed in Flux.
+    The interval is raised as needed to stay within max_points, and the query
+    reads from the coarsest rollup bucket that matches the interval.
+    format=csv streams InfluxDB's CSV response straight through (uncached).
+    """
     try:
-        query_api = app.state.influx.query_api()
-
-        if not start:
-            start = (datetime.utcnow() - timedelta(hours=1)).isoformat() + "Z"
-        if not end:
-            end = datetime.utcnow().isoformat() + "Z"
-
-        query = f'''
-        from(bucket: "{INFLUXDB_BUCKET}")
-          |> range(start: {start}, stop: {end})
-          |> filter(fn: (r) => r["_measurement"] == "network_traffic")
-          |> filter(fn: (r) => r["_field"] == "bytes" or r["_field"] == "packets")
-          |> aggregateWindow(every: {interval}, fn: sum, createEmpty: false)
-        '''
-
-        result = await query_api.query(query=query, org=INFLUXDB_ORG)
-
-        data = []
-        for table in result:
-            for record in table.records:
-                data.append({
-                    'time': record.get_time().isoformat(),
-                    'field': record.get_field(),
-                    'value': record.get_value(),
-                    'direction': record.values.get('direction', 'unknown')
-                })
-
-        return {'data': data}
+        now = datetime.now(timezone.utc)
+        end_dt = parse_history_time(end) if end else now
+        start_dt = parse_history_time(start) if start else end_dt - timedelta(hours=1)
+        if start_dt >= end_dt:
+            raise HTTPException(status_code=400, detail="start must be before end")
+
+        requested = parse_duration(interval) if interval else None
+        interval_seconds = select_history_interval((end_dt - start_dt).total_seconds(), max_points, requested)
+        bucket = select_history_bucket(interval_seconds, start_dt.timestamp())
 
+        if format == 'csv':
+            from influxdb_client import Dialect
+            query = traffic_history_flux(bucket, start_dt, end_dt, interval_seconds)
+            csv_text = await app.state.influx.query_api().query_raw(
+                query=query, org=INFLUXDB_ORG, dialect=Dialect(header=True, annotations=[])
+            )
+            return Response(content=csv_text, media_type="text/csv")
+
+        data = await query_traffic_history(bucket, start_dt, end_dt, interval_seconds, now)
+
+        return {'data': data, 'interval': format_duration(interval_seconds), 'bucket': bucket}
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-# OPNsense Endpoints
-@app.get("/api/opnsense/devices")
-async def get_opnsense_devices():
-    """Get device list from OPNsense ARP table and DHCP leases"""
-    result = await opnsense_api_call('/diagnostics/interface/getArp')
-    if not result:
-        return []
+@app.get("/api/flows/query")
+async def query_flow_archive(
+    start: str = Query(..., description="Start time (ISO format)"),
+    end: Optional[str] = Query(None, description="End time (ISO format, default: now)"),
+    ip: Optional[str] = Query(None, description="Source or destination address"),
+    src_addr: Optional[str] = None,
+    dst_addr: Optional[str] = None,
+    port: Optional[int] = Query(None, ge=0, le=65535, description="Source or destination port"),
+    host: Optional[str] = Query(None, description="Substring of the source or destination hostname"),
+    protocol: Optional[str] = None,
+    direction: Optional[str] = Query(None, pattern="^(inbound|outbound|internal|external)$"),
+    source: Optional[str] = Query(None, description="Exporter address"),
+    group_by: Optional[str] = Query(None, description="Comma-separated columns, e.g. src_addr,dst_addr"),
+    order_by: str = Query("time", pattern="^(time|bytes|packets|flows)$"),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0)
+):
+    """Ad-hoc queries over the collector's Parquet flow archive (embedded DuckDB)
+
+    Without group_by the matching flows are returned newest (or largest) first;
+    with group_by the flows are aggregated (bytes, packets, flows, first/last
+    seen) and ordered descending, which gives top-N lists. Only the hourly
+    partitions inside the time range are read. Results are paged with
+    limit/offset (next_offset is null on the last page); a query may page
+    through at most FLOW_QUERY_MAX_ROWS rows and is cancelled after
+    FLOW_QUERY_TIMEOUT seconds.
+    """
+    try:
+        end_dt = parse_history_time(end) if end else datetime.now(timezone.utc)
+        start_dt = parse_history_time(start)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if start_dt >= end_dt:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if end_dt - start_dt > timedelta(days=FLOW_QUERY_MAX_DAYS):
+        raise HTTPException(status_code=400, detail=f"Time range is limited to {FLOW_QUERY_MAX_DAYS} days")
+    if offset + limit > FLOW_QUERY_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"Paging is limited to the first {FLOW_QUERY_MAX_ROWS} rows, refine the query")
+
+    columns = [c.strip() for c in group_by.split(',') if c.strip()] if group_by else []
+    unknown = [c for c in columns if c not in FLOW_QUERY_GROUP_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Cannot group by {', '.join(unknown)}")
+    if order_by == 'flows' and not columns:
+        raise HTTPException(status_code=400, detail="order_by=flows requires group_by")
+
+    files = await asyncio.to_thread(flow_archive_files, start_dt, end_dt)
+    page = {"offset": offset, "limit": limit, "next_offset": None, "files_scanned": len(files)}
+    if not files:
+        return {"columns": [], "rows": [], **page}
+
+    filters = {
+        'ip': ip, 'src_addr': src_addr, 'dst_addr': dst_addr, 'port': port, 'host': host,
+        'protocol': protocol.upper() if protocol else None, 'direction': direction, 'source': source,
+    }
+    sql, params = build_flow_query(files, start_dt, end_dt, filters, columns, order_by, limit, offset)
+    try:
+        result = await run_flow_query(sql, params)
+    except HTTPException:
+        raise
+    except Exception as e:
+        # Typically a partition merged or expired by the collector while reading
+        raise HTTPException(status_code=503, detail=f"Flow archive query failed: {str(e)}")
+
+    for name in FLOW_QUERY_TIME_COLUMNS:
+        if name in result.data:
+            result.data[name] = [
+                datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat() if ms is not None else None
+                for ms in result.data[name]
+            ]
+    rows = result.rows()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        page["next_offset"] = offset + limit
+    return {"columns": result.columns, "rows": rows, **page}
+
+# Device Endpoints
+@app.get("/api/devices/active")
+async def get_active_devices(
+    minutes: int = Query(DEVICE_ACTIVE_WINDOW // 60, ge=1, le=1440),
+    limit: int = Query(500, ge=1, le=10000),
+    scope: str = Query("internal", pattern="^(internal|external)$")
+):
+    """Devices seen by the collector in the last N minutes, most recent first, with their rates
 
-    devices = []
-    arp_table = result.get('rows', []) if isinstance(result, dict) else result
+    scope=internal lists LAN (RFC 1918) devices, scope=external internet hosts.
+    """
+    now = time.time()
+    index = DEVICE_ACTIVE_KEY if scope == "internal" else DEVICE_EXTERNAL_KEY
+    entries = await app.state.redis.zrevrangebyscore(
+        index, "+inf", now - minutes * 60, start=0, num=limit, withscores=True
+    )
+    stats = await fetch_device_stats([ip for ip, _ in entries])
+    return [
+        {
+            "ip_address": ip,
+            "last_seen": datetime.fromtimestamp(score, timezone.utc).isoformat(),
+            "seconds_ago": round(now - score, 1),
+            **stats.get(ip, {}),
+        }
+        for ip, score in entries
+    ]
 
-    for idx, entry in enumerate(arp_table):
-        if isinstance(entry, dict):
-            device = {
-                'id': f"opn-{idx}",
-                'ip_address': entry.get('ip', entry.get('address', '')),
-                'mac_address': entry.get('mac', entry.get('ether', '')),
-                'hostname': entry.get('hostname', entry.get('intf_description', '')),
-                'vlan_id': None,
-                'bytes_sent': 0,
-                'bytes_received': 0,
-                'bytes_sent_rate': 0,
-                'bytes_received_rate': 0,
-            }
-            devices.append(device)
+@app.get("/api/devices/retention")
+async def get_device_retention():
+    """Redis memory used by device state and the collector's last compaction run"""
+    redis_client = app.state.redis
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zcard(DEVICE_ACTIVE_KEY)
+    pipe.zcard(DEVICE_EXTERNAL_KEY)
+    pipe.hgetall(DEVICE_RETENTION_KEY)
+    pipe.info("memory")
+    pipe.zrandmember(DEVICE_ACTIVE_KEY, DEVICE_MEMORY_SAMPLE)
+    pipe.zrandmember(DEVICE_EXTERNAL_KEY, DEVICE_MEMORY_SAMPLE)
+    internal, external, retention, memory, internal_sample, external_sample = await pipe.execute()
+
+    # Estimate hash memory from a random sample of each index
+    async def average_hash_size(ips):
+        if not ips:
+            return 0
+        pipe = redis_client.pipeline(transaction=False)
+        for ip in ips:
+            pipe.memory_usage(f"device:{ip}")
+        sizes = [size for size in await pipe.execute() if size]
+        return sum(sizes) / len(sizes) if sizes else 0
+
+    internal_avg = await average_hash_size(internal_sample)
+    external_avg = await average_hash_size(external_sample)
 
-    return devices
+    return {
+        "devices": {
+            "internal": internal,
+            "external": external,
+        },
+        "estimated_bytes": {
+            "internal": round(internal * internal_avg),
+            "external": round(external * external_avg),
+        },
+        "redis": {
+            "used_memory": memory.get("used_memory", 0),
+            "used_memory_human": memory.get("used_memory_human"),
+            "maxmemory": memory.get("maxmemory", 0),
+        },
+        "last_compaction": {key: int(value) for key, value in retention.items()},
+    }
 
-@app.get("/api/opnsense/stats")
-async def get_opnsense_stats():
-    """Get OPNsense firewall statistics"""
-    # show_all=1 is required to see ALL rules, not just automation rules
-    result = await opnsense_api_call('/firewall/filter/searchRule?show_all=1')
+@app.get("/api/devices")
+async def get_devices(
+    response: Response,
+    sort: str = Query("traffic", pattern="^(" + "|".join(DEVICE_SORT_KEYS) + ")$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    offset: int = Query(0, ge=0),
+    search: Optional[str] = Query(None, description="Substring of IP, MAC or hostname")
+):
+    """Device inventory: ARP, DHCP leases, DNS client stats and flow counters in one list
 
-    print(f"[OPNsense] Stats API response type: {type(result)}")
-    if result:
-        print(f"[OPNsense] Stats API response keys: {result.keys() if isinstance(result, dict) else 'N/A'}")
-        print(f"[OPNsense] Stats API first 200 chars: {str(result)[:200]}")
+    Sorted and paged server-side; the unpaged count is returned in X-Total-Count.
+    """
+    devices = await device_index.list_devices()
+    if search:
+        term = search.lower()
+        devices = [
+            device for device in devices
+            if any(term in (device.get(field) or '').lower() for field in ('ip_address', 'mac_address', 'hostname'))
+        ]
+    devices.sort(key=DEVICE_SORT_KEYS[sort], reverse=(order == 'desc'))
+
+    response.headers['X-Total-Count'] = str(len(devices))
+    return devices[offset:offset + limit if limit else None]
+
+@app.get("/api/devices/lookup/{key}")
+async def lookup_device(key: str):
+    """Look up one device by IP or MAC address"""
+    await device_index.refresh()
+    device = device_index.lookup(key)
+    if device is None:
+        raise HTTPException(status_code=404, detail="Device not found")
+    return (await enrich_devices([device]))[0]
 
-    if result and isinstance(result, dict):
-        total = result.get('total', result.get('rowCount', 0))
-        rows = result.get('rows', [])
+# OPNsense Endpoints
+@app.get("/api/opnsense/devices")
+async def get_opnsense_devices(
+    response: Response,
+    sort: str = Query("traffic", pattern="^(" + "|".join(DEVICE_SORT_KEYS) + ")$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    limit: Optional[int] = Query(None, ge=1, le=10000),
+    offset: int = Query(0, ge=0)
+):
+    """Get device list from OPNsense ARP table and DHCP leases, with traffic counters
 
-        # Count blocked/allowed rules (simplified)
-        blocked = sum(1 for r in rows if isinstance(r, dict) and r.get('action') == 'block')
-        allowed = sum(1 for r in rows if isinstance(r, dict) and r.get('action') == 'pass')
+    Counters for all devices are read from Redis in one pipeline. Sorted and
+    paged server-side; the unpaged count is returned in X-Total-Count.
+    """
+    devices = await enrich_devices(await serve_snapshot('opnsense_devices', response) or [])
+    devices.sort(key=DEVICE_SORT_KEYS[sort], reverse=(order == 'desc'))
 
-        return {
-            "total_rules": total,
-            "blocked_connections": blocked,
-            "allowed_connections": allowed,
-            "active_connections": len(rows)
-        }
+    response.headers['X-Total-Count'] = str(len(devices))
+    return devices[offset:offset + limit if limit else None]
 
-    return {
-        "total_rules": 0,
-        "blocked_connections": 0,
-        "allowed_connections": 0,
-        "active_connections": 0
-    }
+@app.get("/api/opnsense/stats")
+async def get_opnsense_stats(response: Response):
+    """Get OPNsense firewall statistics"""
+    return await serve_snapshot('opnsense_stats', response)
 
 @app.get("/api/opnsense/logs")
 async def get_opnsense_logs(group_by: str = "action"):
@@ -844,72 +3001,42 @@ async def get_opnsense_logs(group_by: str = "action"):
     print(f"[OPNsense] No firewall statistics found or endpoint not available")
     return []
 
+async def fetch_opnsense_traffic() -> Optional[List[Dict[str, Any]]]:
+    """Total bytes per completed 5-minute window over the last hour"""
+    resolution = 300
+    end_ts = int(time.time()) // resolution * resolution
+    start_ts = end_ts - 12 * resolution
+    # Reads 12 pre-aggregated points from the 5m rollup once it covers the hour
+    bucket = select_history_bucket(resolution, start_ts)
+
+    query = f'''
+    from(bucket: "{bucket}")
+        |> range(start: {start_ts}, stop: {end_ts})
+        |> filter(fn: (r) => r["_measurement"] == "network_traffic")
+        |> filter(fn: (r) => r["_field"] == "bytes")
+        |> group()
+        |> aggregateWindow(every: 5m, fn: sum, createEmpty: true, timeSrc: "_start")
+        |> fill(value: 0)
+    '''
+
+    try:
+        records = await app.state.influx.query_api().query_stream(query=query, org=INFLUXDB_ORG)
+        return [
+            {
+                "time": record.get_time().strftime("%H:%M"),
+                "traffic_mb": round((record.get_value() or 0) / (1024 * 1024), 2)
+            }
+            async for record in records
+        ]
+    except Exception as e:
+        print(f"[OPNsense] Error fetching traffic data from InfluxDB ({bucket}): {e}")
+        return None
+
 @app.get("/api/opnsense/traffic")
 async def get_opnsense_traffic():
     """Get network traffic data from InfluxDB"""
-    try:
-        query_api = app.state.influx.query_api()
-
-        # Query traffic data for the last hour in 5-minute intervals
-        query = f'''
-        from(bucket: "netflow")
-            |> range(start: -1h)
-            |> filter(fn: (r) => r["_measurement"] == "network_traffic")
-            |> filter(fn: (r) => r["_field"] == "bytes")
-            |> aggregateWindow(every: 5m, fn: sum, createEmpty: true)
-            |> fill(value: 0)
-        '''
-
-        result = await query_api.query(query=query, org="netsentry")
-
-        # Process results into time series data
-        traffic_by_time = {}
-
-        for table in result:
-            for record in table.records:
-                time_str = record.get_time().strftime("%H:%M")
-                bytes_value = record.get_value() or 0
-
-                if time_str not in traffic_by_time:
-                    traffic_by_time[time_str] = {"time": time_str, "total": 0}
-
-                traffic_by_time[time_str]["total"] += bytes_value
-
-        # Convert to list and sort by time
-        traffic_data = list(traffic_by_time.values())
-        traffic_data.sort(key=lambda x: x["time"])
-
-        # Convert bytes to MB and format for chart
-        for item in traffic_data:
-            item["traffic_mb"] = round(item["total"] / (1024 * 1024), 2)
-            item.pop("total", None)
-
-        # If no data, generate empty data points for the last hour
-        if not traffic_data:
-            traffic_data = []
-            now = datetime.utcnow()
-            for i in range(12):  # 12 data points (1 hour at 5-minute intervals)
-                timestamp = (now - timedelta(minutes=i*5)).strftime("%H:%M")
-                traffic_data.insert(0, {
-                    "time": timestamp,
-                    "traffic_mb": 0
-                })
-
-        print(f"[OPNsense] Returning {len(traffic_data)} traffic data points from InfluxDB")
-        return traffic_data
-
-    except Exception as e:
-        print(f"[OPNsense] Error fetching traffic data from InfluxDB: {e}")
-        # Return empty data on error
-        traffic_data = []
-        now = datetime.utcnow()
-        for i in range(12):
-            timestamp = (now - timedelta(minutes=i*5)).strftime("%H:%M")
-            traffic_data.insert(0, {
-                "time": timestamp,
-                "traffic_mb": 0
-            })
-        return traffic_data
+    traffic_data = await response_cache.get_or_fetch("influx:opnsense_traffic", fetch_opnsense_traffic)
+    return traffic_data or []
 
 @app.get("/api/opnsense/unbound/stats")
 async def get_opnsense_unbound_stats(hours: int = Query(24, ge=1, le=168)):
@@ -1053,8 +3180,8 @@ async def test_opnsense_connection():
             "error": "OPNsense URL, API Key, or API Secret is missing."
         }
 
-    # Try a simple API call to test connectivity
-    result = await opnsense_api_call('/diagnostics/interface/getArp')
+    # Try a simple API call to test connectivity (bypass the cache)
+    result = await opnsense_api_call('/diagnostics/interface/getArp', cached=False)
 
     if result is not None:
         return {
@@ -1072,24 +3199,9 @@ async def test_opnsense_connection():
 
 # AdGuard Endpoints
 @app.get("/api/adguard/stats")
-async def get_adguard_stats():
+async def get_adguard_stats(response: Response):
     """Get AdGuard Home statistics"""
-    result = await adguard_api_call('/control/stats')
-
-    if result:
-        return {
-            "total_queries": result.get('num_dns_queries', 0),
-            "blocked_queries": result.get('num_blocked_filtering', 0),
-            "allowed_queries": result.get('num_dns_queries', 0) - result.get('num_blocked_filtering', 0),
-            "blocking_percentage": (result.get('num_blocked_filtering', 0) / max(result.get('num_dns_queries', 1), 1)) * 100
-        }
-
-    return {
-        "total_queries": 0,
-        "blocked_queries": 0,
-        "allowed_queries": 0,
-        "blocking_percentage": 0
-    }
+    return await serve_snapshot('adguard_stats', response)
 
 @app.get("/api/adguard/queries")
 async def get_adguard_queries():
@@ -1115,86 +3227,24 @@ async def get_adguard_queries():
 
 # TrueNAS Endpoints
 @app.get("/api/truenas/pools")
-async def get_truenas_pools():
+async def get_truenas_pools(response: Response):
     """Get TrueNAS storage pools"""
-    result = await truenas_api_call('/pool')
-
-    if not result:
-        return []
-
-    pools = []
-    for pool in result:
-        if isinstance(pool, dict):
-            topology = pool.get('topology', {})
-            pools.append({
-                "name": pool.get('name', ''),
-                "status": pool.get('status', 'UNKNOWN'),
-                "size": pool.get('size', 0),
-                "allocated": pool.get('allocated', 0),
-                "free": pool.get('free', 0)
-            })
-
-    return pools
+    return await serve_snapshot('truenas_pools', response)
 
 @app.get("/api/truenas/datasets")
-async def get_truenas_datasets():
+async def get_truenas_datasets(response: Response):
     """Get TrueNAS datasets"""
-    result = await truenas_api_call('/pool/dataset')
-
-    if not result:
-        return []
-
-    datasets = []
-    for dataset in result:
-        if isinstance(dataset, dict):
-            datasets.append({
-                "name": dataset.get('name', ''),
-                "type": dataset.get('type', 'FILESYSTEM'),
-                "used": dataset.get('used', {}).get('parsed', 0),
-                "available": dataset.get('available', {}).get('parsed', 0),
-                "compression": dataset.get('compression', {}).get('value', 'off')
-            })
-
-    return datasets
+    return await serve_snapshot('truenas_datasets', response)
 
 @app.get("/api/truenas/services")
-async def get_truenas_services():
+async def get_truenas_services(response: Response):
     """Get TrueNAS services status"""
-    result = await truenas_api_call('/service')
-
-    if not result:
-        return []
-
-    services = []
-    for service in result:
-        if isinstance(service, dict):
-            services.append({
-                "name": service.get('service', ''),
-                "state": service.get('state', 'STOPPED'),
-                "enable": service.get('enable', False)
-            })
-
-    return services
+    return await serve_snapshot('truenas_services', response)
 
 @app.get("/api/truenas/system")
-async def get_truenas_system():
+async def get_truenas_system(response: Response):
     """Get TrueNAS system information"""
-    result = await truenas_api_call('/system/info')
-
-    if result and isinstance(result, dict):
-        return {
-            "hostname": result.get('hostname', 'N/A'),
-            "version": result.get('version', 'N/A'),
-            "uptime": result.get('uptime_seconds', 0),
-            "loadavg": ', '.join(map(str, result.get('loadavg', [0, 0, 0])))
-        }
-
-    return {
-        "hostname": "N/A",
-        "version": "N/A",
-        "uptime": "N/A",
-        "loadavg": "N/A"
-    }
+    return await serve_snapshot('truenas_system', response)
 
 # ==================== Camera Endpoints ====================
 
@@ -1225,6 +3275,11 @@ async def create_camera(camera: CameraCreate):
         print(f"Error creating camera: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Failed to create camera: {str(e)}")
 
+@app.get("/api/cameras/stats")
+async def get_camera_stats():
+    """Snapshot cache and MJPEG relay statistics"""
+    return camera_snapshots.stats()
+
 @app.get("/api/cameras/{camera_id}")
 async def get_camera(camera_id: str):
     """Get a specific camera by ID"""
@@ -1258,6 +3313,8 @@ async def update_camera(camera_id: str, camera_update: CameraUpdate):
 
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Camera not found")
+        camera_snapshots.forget(camera_id)
+        await hls_restreamer.stop_camera(camera_id)
 
         camera = await db.cameras.find_one({"_id": ObjectId(camera_id)})
         camera['id'] = str(camera['_id'])
@@ -1278,82 +3335,138 @@ async def delete_camera(camera_id: str):
 
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Camera not found")
+        camera_snapshots.forget(camera_id)
+        await hls_restreamer.stop_camera(camera_id)
 
         return {"message": "Camera deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Delete failed: {str(e)}")
 
 @app.get("/api/cameras/{camera_id}/snapshot")
-async def get_camera_snapshot(camera_id: str):
-    """Get a snapshot from the camera (for Reolink cameras)"""
-    try:
-        camera = await db.cameras.find_one({"_id": ObjectId(camera_id)})
-        if not camera:
-            raise HTTPException(status_code=404, detail="Camera not found")
-
-        # Reolink uses HTTPS and redirects from HTTP
-        # Use HTTPS directly and disable SSL verification (self-signed cert)
-        snapshot_url = f"https://{camera['host']}/cgi-bin/api.cgi?cmd=Snap&channel=0&rs=snapshot&user={camera['username']}&password={camera['password']}"
+async def get_camera_snapshot(camera_id: str, request: Request):
+    """Get a snapshot from the camera (for Reolink cameras)
 
-        print(f"[Camera] Fetching snapshot from: {snapshot_url.replace(camera['password'], '***')}")
-
-        # Create SSL context that accepts all certificates and protocols (for older cameras)
-        ssl_context = ssl.create_default_context()
-        ssl_context.check_hostname = False
-        ssl_context.verify_mode = ssl.CERT_NONE
-        # Allow older SSL/TLS versions for compatibility with older Reolink cameras
-        ssl_context.minimum_version = ssl.TLSVersion.MINIMUM_SUPPORTED
-        ssl_context.set_ciphers('DEFAULT@SECLEVEL=1')
-
-        # Create connector with permissive SSL context
-        connector = aiohttp.TCPConnector(ssl=ssl_context)
-        async with aiohttp.ClientSession(connector=connector) as session:
-            async with session.get(snapshot_url, timeout=aiohttp.ClientTimeout(total=10)) as response:
-                print(f"[Camera] Snapshot response status: {response.status}")
-                if response.status == 200:
-                    image_data = await response.read()
-                    print(f"[Camera] Snapshot received: {len(image_data)} bytes")
-                    return Response(content=image_data, media_type="image/jpeg")
-                else:
-                    error_body = await response.text()
-                    print(f"[Camera] Snapshot failed: {response.status} - {error_body}")
-                    raise HTTPException(status_code=500, detail=f"Camera returned {response.status}: {error_body[:100]}")
+    Served from the shared frame cache; supports If-None-Match/If-Modified-Since.
+    """
+    try:
+        frame = await camera_snapshots.get(camera_id)
     except HTTPException:
         raise
     except Exception as e:
         print(f"[Camera] Snapshot exception: {str(e)}")
-        import traceback
-        traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Snapshot failed: {str(e)}")
 
+    headers = {
+        "ETag": frame['etag'],
+        "Last-Modified": frame['last_modified'],
+        "Cache-Control": f"private, max-age={int(CAMERA_SNAPSHOT_INTERVAL)}",
+    }
+    if request.headers.get("if-none-match") == frame['etag'] or (
+        "if-none-match" not in request.headers and request.headers.get("if-modified-since") == frame['last_modified']
+    ):
+        return Response(status_code=304, headers=headers)
+    return Response(content=frame['data'], media_type="image/jpeg", headers=headers)
+
+@app.get("/api/cameras/{camera_id}/mjpeg")
+async def get_camera_mjpeg(camera_id: str):
+    """Live MJPEG stream (multipart/x-mixed-replace), fed by one shared upstream pull per camera"""
+    try:
+        camera = await db.cameras.find_one({"_id": ObjectId(camera_id)})
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid camera ID: {str(e)}")
+    if not camera:
+        raise HTTPException(status_code=404, detail="Camera not found")
+
+    async def parts():
+        async for frame in camera_snapshots.stream(camera_id):
+            yield (
+                b"--frame\r\nContent-Type: image/jpeg\r\nContent-Length: "
+                + str(len(frame['data'])).encode()
+                + b"\r\n\r\n" + frame['data'] + b"\r\n"
+            )
+
+    return StreamingResponse(
+        parts(),
+        media_type="multipart/x-mixed-replace; boundary=frame",
+        headers={"Cache-Control": "no-cache, private"}
+    )
+
 @app.get("/api/cameras/{camera_id}/stream")
 async def get_camera_stream_url(camera_id: str, quality: str = Query("main", pattern="^(main|sub)$")):
-    """Get the RTSP stream URL for a camera"""
+    """Get the stream URL for a camera (HLS, restreamed by the backend)
+
+    Viewers no longer connect to the camera directly, so the camera serves one
+    RTSP session per quality regardless of the number of viewers.
+    """
     try:
         camera = await db.cameras.find_one({"_id": ObjectId(camera_id)})
         if not camera:
             raise HTTPException(status_code=404, detail="Camera not found")
 
-        # Build RTSP URL
-        path = camera.get('rtsp_path', '/h264Preview_01_main') if quality == "main" else camera.get('sub_stream_path', '/h264Preview_01_sub')
-        rtsp_url = f"rtsp://{camera['username']}:{camera['password']}@{camera['host']}:{camera.get('port', 554)}{path}"
-
         return {
-            "stream_url": rtsp_url,
+            "stream_url": f"/api/cameras/{camera_id}/hls/{quality}/index.m3u8",
+            "protocol": "hls",
             "quality": quality,
             "camera_name": camera.get('name', 'Unknown')
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to get stream URL: {str(e)}")
 
+@app.get("/api/cameras/{camera_id}/hls/{quality}/index.m3u8")
+async def get_camera_hls_playlist(camera_id: str, quality: str):
+    """HLS playlist; starts the restream on first request"""
+    if quality not in ("main", "sub"):
+        raise HTTPException(status_code=404, detail="Unknown stream quality")
+    try:
+        camera = await db.cameras.find_one({"_id": ObjectId(camera_id)})
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid camera ID: {str(e)}")
+    if not camera or not camera.get('enabled', True):
+        raise HTTPException(status_code=404, detail="Camera not found")
+
+    directory = await hls_restreamer.ensure(camera, quality)
+    return FileResponse(
+        os.path.join(directory, 'index.m3u8'),
+        media_type="application/vnd.apple.mpegurl",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+@app.get("/api/cameras/{camera_id}/hls/{quality}/{segment}")
+async def get_camera_hls_segment(camera_id: str, quality: str, segment: str):
+    """HLS media segment of a running restream"""
+    if not re.fullmatch(r'seg_\d+\.ts', segment):
+        raise HTTPException(status_code=404, detail="Segment not found")
+    path = hls_restreamer.segment_path(camera_id, quality, segment)
+    if not path:
+        raise HTTPException(status_code=404, detail="Segment not found")
+    return FileResponse(path, media_type="video/mp2t")
+
+@app.get("/api/restream/stats")
+async def get_restream_stats():
+    """Running camera restreams with viewer activity and ffmpeg resource usage"""
+    return hls_restreamer.stats()
+
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time updates"""
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, topics: Optional[str] = Query(None)):
+    """WebSocket endpoint for real-time updates
+
+    Optional ?topics=traffic,dns limits the streams (unknown topics are
+    rejected with close code 1008); clients can also send
+    {"action": "subscribe" | "unsubscribe", "topics": [...]} at any time.
+    """
+    requested = {topic.strip() for topic in topics.split(',') if topic.strip()} if topics else set()
+    if topics is not None and (not requested or requested - manager.TOPICS):
+        await websocket.close(code=1008)
+        return
+    await manager.connect(websocket, requested or None)
     try:
         while True:
-            await websocket.receive_text()
+            await manager.handle_message(websocket, await websocket.receive_text())
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
 
 if __name__ == "__main__":
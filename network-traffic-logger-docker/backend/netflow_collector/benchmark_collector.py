@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+NetSentry - Collector throughput benchmark
+Generates synthetic NetFlow v5, NetFlow v9 (with templates) and sFlow v5
+datagrams, replays them over UDP against a NetFlowCollector running in a child
+process and reports sustained flows/s, loss, CPU and memory. Redis and InfluxDB
+are replaced by in-process stand-ins that count calls (InfluxDB points are still
+serialized to line protocol), so the numbers show the collector's own cost.
+Also runs microbenchmarks of the parsing and enrichment hot paths.
+
+Usage (inside the collector container):
+    python benchmark_collector.py --duration 10 --rate 20000 --mix v5=50,v9=40,sflow=10
+    python benchmark_collector.py --micro-only
+"""
+
+import os
+import time
+import socket
+import struct
+import random
+import asyncio
+import argparse
+import resource
+import multiprocessing
+from collections import Counter, defaultdict
+from typing import Dict, List, Any
+
+# Imported for its classes only: no archive, no shared-memory ring
+os.environ['FLOW_ARCHIVE_PATH'] = ''
+os.environ['REALTIME_RING_PATH'] = ''
+
+import collector
+from collector import NetFlowCollector, NetFlowV5Parser, NetFlowV9Parser
+
+V9_TEMPLATE_ID = 256
+# (field type, length): src/dst address, src/dst port, protocol, bytes, packets, first/last switched
+V9_TEMPLATE = [(8, 4), (12, 4), (7, 2), (11, 2), (4, 1), (1, 4), (2, 4), (22, 4), (21, 4)]
+PROTOCOLS = [6] * 6 + [17] * 3 + [1]
+
+
+class RedisStandIn:
+    """In-process replacement for the collector's Redis client
+
+    String keys (hostname cache) are kept, everything else is only counted and
+    answered with an empty result.
+    """
+
+    EMPTY = {'zrangebyscore': [], 'zmscore': [], 'zcard': 0, 'info': {}, 'scan': (0, []), 'ttl': -2}
+
+    def __init__(self):
+        self.values: Dict[str, str] = {}
+        self.calls = Counter()
+
+    def get(self, key):
+        self.calls['get'] += 1
+        return self.values.get(key)
+
+    def setex(self, key, ttl, value):
+        self.calls['setex'] += 1
+        self.values[key] = value
+
+    def pipeline(self, transaction=True):
+        return RedisPipelineStandIn(self)
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls[name] += 1
+            return self.EMPTY.get(name)
+        return call
+
+
+class RedisPipelineStandIn:
+    def __init__(self, redis_stand_in: RedisStandIn):
+        self.redis = redis_stand_in
+        self.commands = 0
+
+    def execute(self):
+        self.redis.calls['pipeline'] += 1
+        self.redis.calls['pipeline_commands'] += self.commands
+        return [None] * self.commands
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands += 1
+            return self
+        return queue
+
+
+class InfluxWriteStandIn:
+    """In-process replacement for the collector's write API (serializes, then drops)"""
+
+    def __init__(self):
+        self.points = Counter()
+        self.writes = 0
+
+    def write(self, bucket, record, **kwargs):
+        self.writes += 1
+        for point in record if isinstance(record, list) else [record]:
+            self.points[point.to_line_protocol().split(',', 1)[0]] += 1
+
+
+class StageTimers:
+    """Accumulated time, calls and items per wrapped collector function"""
+
+    def __init__(self):
+        self.stages = defaultdict(lambda: {'calls': 0, 'seconds': 0.0, 'items': 0})
+
+    def record(self, stage: str, elapsed: float, items: int = 0):
+        entry = self.stages[stage]
+        entry['calls'] += 1
+        entry['seconds'] += elapsed
+        entry['items'] += items
+
+    def wrap(self, fn, stage: str):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            result = fn(*args, **kwargs)
+            flows = len(result['flows']) if isinstance(result, dict) and result.get('flows') else 0
+            self.record(stage, time.perf_counter() - started, flows)
+            return result
+        return timed
+
+    def wrap_async(self, fn, stage: str):
+        async def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+        return timed
+
+
+def install_stand_ins() -> tuple:
+    redis_stand_in, influx_stand_in = RedisStandIn(), InfluxWriteStandIn()
+    collector.redis_client = redis_stand_in
+    collector.write_api = influx_stand_in
+    return redis_stand_in, influx_stand_in
+
+
+# Synthetic traffic
+class FlowGenerator:
+    """Random flows between a set of LAN hosts and internet peers"""
+
+    def __init__(self, seed: int, hosts: int, peers: int):
+        self.rng = random.Random(seed)
+        self.hosts = [f"10.10.{i // 250}.{i % 250 + 1}" for i in range(hosts)]
+        self.peers = [socket.inet_ntoa(struct.pack('!I', self.rng.randint(0x01000000, 0xDF000000))) for _ in range(peers)]
+
+    def flow(self) -> tuple:
+        """(src, dst, src_port, dst_port, protocol, bytes, packets)"""
+        host = self.rng.choice(self.hosts)
+        roll = self.rng.random()
+        if roll < 0.1:
+            src, dst = host, self.rng.choice(self.hosts)
+        elif roll < 0.55:
+            src, dst = host, self.rng.choice(self.peers)
+        else:
+            src, dst = self.rng.choice(self.peers), host
+        packets = self.rng.randint(1, 2000)
+        return (
+            src, dst, self.rng.randint(1024, 65535), self.rng.choice((53, 80, 443, 443, 443, 8080, 22)),
+            self.rng.choice(PROTOCOLS), packets * self.rng.randint(60, 1500), packets
+        )
+
+    def netflow_v5(self, count: int, sequence: int) -> bytes:
+        now = int(time.time())
+        data = struct.pack(NetFlowV5Parser.HEADER_FORMAT, 5, count, 3600000, now, 0, sequence, 0, 0, 0)
+        for _ in range(count):
+            src, dst, sport, dport, proto, nbytes, packets = self.flow()
+            data += struct.pack(
+                NetFlowV5Parser.FLOW_FORMAT,
+                struct.unpack('!I', socket.inet_aton(src))[0], struct.unpack('!I', socket.inet_aton(dst))[0], 0,
+                1, 2, packets, nbytes, 3590000, 3599000, sport, dport, 0x18, proto, 0, 0, 0, 24, 0
+            )
+        return data
+
+    def netflow_v9(self, count: int, sequence: int, with_template: bool) -> bytes:
+        flowsets = b''
+        if with_template:
+            fields = b''.join(struct.pack('!HH', t, length) for t, length in V9_TEMPLATE)
+            body = struct.pack('!HH', V9_TEMPLATE_ID, len(V9_TEMPLATE)) + fields
+            flowsets += struct.pack('!HH', 0, 4 + len(body)) + body
+        records = self.v9_records(count)
+        flowsets += struct.pack('!HH', V9_TEMPLATE_ID, 4 + len(records)) + records
+        header = struct.pack(NetFlowV9Parser.HEADER_FORMAT, 9, count + with_template, 3600000, int(time.time()), sequence, 1)
+        return header + flowsets
+
+    def v9_records(self, count: int) -> bytes:
+        records = b''
+        for _ in range(count):
+            src, dst, sport, dport, proto, nbytes, packets = self.flow()
+            records += socket.inet_aton(src) + socket.inet_aton(dst) + struct.pack(
+                '!HHBIIII', sport, dport, proto, nbytes, packets, 3590000, 3599000
+            )
+        return records
+
+    def sflow_v5(self, count: int, sequence: int) -> bytes:
+        """sFlow v5 datagram with `count` flow samples carrying raw Ethernet/IPv4 headers"""
+        samples = b''
+        for i in range(count):
+            src, dst, sport, dport, proto, nbytes, packets = self.flow()
+            ip = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 40, 0, 0, 64, proto, 0, socket.inet_aton(src), socket.inet_aton(dst))
+            header = b'\x00' * 12 + b'\x08\x00' + ip + struct.pack('!HHI', sport, dport, 0) + b'\x00' * 8
+            record = struct.pack('!IIII', 1, nbytes // packets, 4, len(header)) + header + b'\x00' * (-len(header) % 4)
+            record = struct.pack('!II', 1, len(record)) + record
+            sample = struct.pack('!IIIIIIII', sequence * count + i, 1, 512, 512 * (i + 1), 0, 1, 2, 1) + record
+            samples += struct.pack('!II', 1, len(sample)) + sample
+        return struct.pack('!II4sIIII', 5, 1, socket.inet_aton('10.10.1.1'), 0, sequence, 3600000, count) + samples
+
+
+def build_datagrams(args) -> List[tuple]:
+    """Pool of (payload, flows, kind) in send order, following the configured mix"""
+    generator = FlowGenerator(args.seed, args.hosts, args.peers)
+    mix = {kind: float(weight) for kind, weight in (part.split('=') for part in args.mix.split(','))}
+    kinds = random.Random(args.seed).choices(list(mix), weights=list(mix.values()), k=args.pool)
+    datagrams = []
+    v9_sent = 0
+    for sequence, kind in enumerate(kinds):
+        if kind == 'v5':
+            datagrams.append((generator.netflow_v5(args.v5_flows, sequence), args.v5_flows, kind))
+        elif kind == 'v9':
+            with_template = v9_sent % args.template_every == 0
+            datagrams.append((generator.netflow_v9(args.v9_flows, sequence, with_template), args.v9_flows, kind))
+            v9_sent += 1
+        elif kind == 'sflow':
+            datagrams.append((generator.sflow_v5(args.sflow_samples, sequence), args.sflow_samples, kind))
+        else:
+            raise SystemExit(f"Unknown datagram kind in --mix: {kind}")
+    return datagrams
+
+
+# Replay against a collector process
+def rss_bytes() -> int:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def failing_lookup(ip):
+    raise socket.herror(1, 'Unknown host')
+
+
+def collector_process(args, ready, stop, results):
+    """Child: run the real collector on args.port (sFlow on port + 1) against the stand-ins"""
+    collector.logger.setLevel(args.log_level)
+    collector.NETFLOW_PORT, collector.SFLOW_PORT = args.port, args.port + 1
+    redis_stand_in, influx_stand_in = install_stand_ins()
+
+    # Reverse DNS: warm cache, fast NXDOMAIN through the executor, or the real resolver
+    if args.dns == 'cached':
+        generator = FlowGenerator(args.seed, args.hosts, args.peers)
+        for ip in generator.hosts + generator.peers:
+            redis_stand_in.values[f"hostname:{ip}"] = f"host-{ip.replace('.', '-')}.example"
+    elif args.dns == 'miss':
+        socket.gethostbyaddr = failing_lookup
+
+    timers = StageTimers()
+    NetFlowV5Parser.parse = staticmethod(timers.wrap(NetFlowV5Parser.parse, 'parse v5'))
+    NetFlowV9Parser.parse = timers.wrap(NetFlowV9Parser.parse, 'parse v9')
+    NetFlowCollector.handle_netflow = timers.wrap_async(NetFlowCollector.handle_netflow, 'handle datagram')
+    NetFlowCollector.write_flow_to_influx = timers.wrap_async(NetFlowCollector.write_flow_to_influx, 'enrich + write flow')
+    NetFlowCollector.resolve_hostname = timers.wrap_async(NetFlowCollector.resolve_hostname, 'resolve hostname')
+
+    async def main():
+        task = asyncio.create_task(NetFlowCollector().run())
+        await asyncio.sleep(0.5)
+        measured = (time.perf_counter(), time.process_time(), rss_bytes())
+        ready.set()
+        while not stop.is_set():
+            await asyncio.sleep(0.05)
+        task.cancel()
+        return measured
+
+    wall_start, cpu_start, rss_start = asyncio.run(main())
+    results.put({
+        'wall': time.perf_counter() - wall_start,
+        'cpu': time.process_time() - cpu_start,
+        'rss_start': rss_start,
+        'rss_end': rss_bytes(),
+        'rss_peak': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'stages': dict(timers.stages),
+        'redis_calls': dict(redis_stand_in.calls),
+        'influx_points': dict(influx_stand_in.points),
+        'influx_writes': influx_stand_in.writes,
+    })
+
+
+def replay(datagrams: List[tuple], port: int, rate: float, duration: float) -> Dict[str, Any]:
+    """Send the pool round-robin for `duration` seconds at `rate` flows/s (0 = as fast as possible)"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4 * 1024 * 1024)
+    sent = Counter()
+    flows = Counter()
+    started = time.perf_counter()
+    i = 0
+    while True:
+        elapsed = time.perf_counter() - started
+        if elapsed >= duration:
+            break
+        payload, count, kind = datagrams[i % len(datagrams)]
+        sock.sendto(payload, ('127.0.0.1', port + 1 if kind == 'sflow' else port))
+        sent[kind] += 1
+        flows[kind] += count
+        i += 1
+        if rate and i % 16 == 0:
+            ahead = sum(flows.values()) / rate - elapsed
+            if ahead > 0:
+                time.sleep(ahead)
+    sock.close()
+    return {'seconds': time.perf_counter() - started, 'datagrams': sent, 'flows': flows}
+
+
+def run_replay(args):
+    datagrams = build_datagrams(args)
+    ctx = multiprocessing.get_context('spawn')
+    ready, stop, results = ctx.Event(), ctx.Event(), ctx.Queue()
+    child = ctx.Process(target=collector_process, args=(args, ready, stop, results))
+    child.start()
+    if not ready.wait(30):
+        child.terminate()
+        raise SystemExit("Collector process did not start")
+
+    mode = f"{args.rate:g} flows/s" if args.rate else "max rate"
+    print(f"Replaying {len(datagrams)} datagrams ({args.mix}) for {args.duration:g}s at {mode}, DNS {args.dns}")
+    sent = replay(datagrams, args.port, args.rate, args.duration)
+    time.sleep(args.drain)
+    stop.set()
+    report = results.get(timeout=30)
+    child.join(10)
+
+    stages = report['stages']
+    netflow_sent = sent['flows']['v5'] + sent['flows']['v9']
+    parsed = stages.get('parse v5', {}).get('items', 0) + stages.get('parse v9', {}).get('items', 0)
+    handled = stages.get('handle datagram', {}).get('calls', 0)
+    written = report['influx_points'].get('network_traffic', 0)
+    total_datagrams = sum(sent['datagrams'].values())
+
+    print(f"\nSent       {total_datagrams} datagrams, {sum(sent['flows'].values())} flows in {sent['seconds']:.2f}s "
+          f"({', '.join(f'{k}: {v}' for k, v in sorted(sent['datagrams'].items()))})")
+    print(f"Received   {handled} datagrams ({100 * (1 - handled / max(total_datagrams, 1)):.2f}% datagram loss)")
+    print(f"Parsed     {parsed} NetFlow flows of {netflow_sent} sent ({100 * (1 - parsed / max(netflow_sent, 1)):.2f}% flow loss)")
+    if sent['flows']['sflow']:
+        print(f"sFlow      {sent['flows']['sflow']} samples sent (no sFlow decoder in the collector, counted separately)")
+    print(f"Written    {written} flows enriched and written ({100 * (1 - written / max(netflow_sent, 1)):.2f}% not completed)")
+    print(f"Throughput {written / sent['seconds']:.0f} flows/s sustained over the send window")
+    print(f"CPU        {report['cpu']:.2f}s over {report['wall']:.2f}s ({100 * report['cpu'] / report['wall']:.0f}% of one core)")
+    print(f"Memory     RSS {report['rss_start'] / 2**20:.1f} MB -> {report['rss_end'] / 2**20:.1f} MB, peak {report['rss_peak'] / 2**20:.1f} MB")
+
+    print(f"\n  {'stage':<22} {'calls':>10} {'total':>10} {'per call':>12}")
+    for stage, entry in stages.items():
+        per_call = entry['seconds'] / entry['calls'] * 1e6 if entry['calls'] else 0
+        print(f"  {stage:<22} {entry['calls']:>10} {entry['seconds']:>9.2f}s {per_call:>9.1f} us")
+    print(f"\n  Redis calls:   {', '.join(f'{k}={v}' for k, v in sorted(report['redis_calls'].items()))}")
+    print(f"  Influx writes: {report['influx_writes']} ({', '.join(f'{k}={v}' for k, v in sorted(report['influx_points'].items()))})")
+
+
+# Microbenchmarks
+def time_call(fn, number: int, repeat: int) -> float:
+    """Best-of-N time per call in microseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, time.perf_counter() - started)
+    return best / number * 1e6
+
+
+def time_coroutine(factory, number: int, repeat: int) -> float:
+    """Best-of-N time per awaited call in microseconds"""
+    async def batch():
+        started = time.perf_counter()
+        for _ in range(number):
+            await factory()
+        return time.perf_counter() - started
+
+    return min(asyncio.run(batch()) for _ in range(repeat)) / number * 1e6
+
+
+def run_micro(args):
+    collector.logger.setLevel(args.log_level)
+    redis_stand_in, _ = install_stand_ins()
+    generator = FlowGenerator(args.seed, args.hosts, args.peers)
+    instance = NetFlowCollector()
+
+    v5_datagram = generator.netflow_v5(30, 1)
+    v9_parser = NetFlowV9Parser()
+    v9_parser.parse(generator.netflow_v9(1, 1, True), 'bench')
+    v9_records = generator.v9_records(args.v9_flows)
+    pairs = [generator.flow()[:2] for _ in range(1000)]
+    cached_ip = pairs[0][0]
+    redis_stand_in.values[f"hostname:{cached_ip}"] = 'cached.example.lan'
+
+    socket.gethostbyaddr = failing_lookup
+
+    n = args.micro_number
+    results = [
+        ("NetFlowV5Parser.parse (30 flows)", time_call(lambda: NetFlowV5Parser.parse(v5_datagram), n, args.repeat), 30),
+        (f"parse_data_flowset ({args.v9_flows} flows)",
+         time_call(lambda: v9_parser.parse_data_flowset(v9_records, V9_TEMPLATE_ID, 'bench'), n, args.repeat), args.v9_flows),
+        ("determine_direction (1000 pairs)",
+         time_call(lambda: [instance.determine_direction(s, d) for s, d in pairs], max(n // 10, 1), args.repeat), 1000),
+        ("resolve_hostname (cache hit)", time_coroutine(lambda: instance.resolve_hostname(cached_ip), n, args.repeat), 1),
+        ("resolve_hostname (miss, no PTR)",
+         time_coroutine(lambda: instance.resolve_hostname('203.0.113.7'), max(n // 10, 1), args.repeat), 1),
+    ]
+
+    print(f"\n  {'function':<36} {'per call':>12} {'per flow':>12} {'flows/s':>12}")
+    for label, micros, items in results:
+        print(f"  {label:<36} {micros:>9.1f} us {micros / items:>9.2f} us {items / micros * 1e6:>12.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NetFlow/sFlow collector")
+    parser.add_argument('--duration', type=float, default=10, help="Replay duration in seconds")
+    parser.add_argument('--rate', type=float, default=0, help="Target flows/s (0 = as fast as possible)")
+    parser.add_argument('--mix', default='v5=50,v9=40,sflow=10', help="Datagram mix by weight (v5, v9, sflow)")
+    parser.add_argument('--pool', type=int, default=2000, help="Distinct datagrams generated and replayed round-robin")
+    parser.add_argument('--v5-flows', type=int, default=30, help="Flows per NetFlow v5 datagram (max 30)")
+    parser.add_argument('--v9-flows', type=int, default=40, help="Flows per NetFlow v9 data flowset")
+    parser.add_argument('--sflow-samples', type=int, default=8, help="Flow samples per sFlow datagram")
+    parser.add_argument('--template-every', type=int, default=20, help="Resend the v9 template every N v9 datagrams")
+    parser.add_argument('--hosts', type=int, default=500, help="Distinct LAN hosts")
+    parser.add_argument('--peers', type=int, default=20000, help="Distinct internet peers")
+    parser.add_argument('--port', type=int, default=12055, help="UDP port for the benchmark collector (sFlow: port + 1)")
+    parser.add_argument('--dns', choices=('cached', 'miss', 'real'), default='cached',
+                        help="Hostname resolution during replay: pre-warmed cache, failing lookups or the real resolver")
+    parser.add_argument('--drain', type=float, default=2, help="Seconds to let the collector drain after sending")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=5, help="Microbenchmark repetitions (best-of)")
+    parser.add_argument('--micro-number', type=int, default=2000, help="Calls per microbenchmark repetition")
+    parser.add_argument('--log-level', default='ERROR', help="Collector log level (INFO logs every datagram)")
+    parser.add_argument('--micro-only', action='store_true', help="Skip the UDP replay")
+    args = parser.parse_args()
+
+    if not args.micro_only:
+        run_replay(args)
+    print("\nMicrobenchmarks")
+    run_micro(args)
+
+
+if __name__ == "__main__":
+    main()
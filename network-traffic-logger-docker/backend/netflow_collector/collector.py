@@ -5,13 +5,24 @@ Collects NetFlow v5/v9 and sFlow data from OPNsense and other network devices
 """
 
 import os
+import csv
+import argparse
+import subprocess
+import math
+import mmap
 import socket
 import struct
+import time
+import json
+import heapq
+import shutil
 import asyncio
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Any
 import redis
+import pyarrow as pa
+import pyarrow.parquet as pq
 from influxdb_client import InfluxDBClient, Point
 from influxdb_client.client.write_api import SYNCHRONOUS
 
@@ -24,6 +35,60 @@ INFLUXDB_ORG = os.getenv('INFLUXDB_ORG', 'network-monitoring')
 INFLUXDB_BUCKET = os.getenv('INFLUXDB_BUCKET', 'traffic')
 REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379')
 
+# Live traffic stream (one aggregated frame per tick on the realtime_traffic channel)
+LIVE_CHANNEL = 'realtime_traffic'
+LIVE_TICK = float(os.getenv('LIVE_TICK', 0.5))
+LIVE_TOP_FLOWS = int(os.getenv('LIVE_TOP_FLOWS', 10))
+
+# Shared-memory ring of per-second counters for single-host deployments
+# (file on a tmpfs volume shared with the API; empty = disabled, Redis only)
+REALTIME_RING_PATH = os.getenv('REALTIME_RING_PATH', '')
+REALTIME_RING_SECONDS = int(os.getenv('REALTIME_RING_SECONDS', 900))
+
+# Per-device counters, moving-average rates and the active-devices index
+DEVICE_TICK = float(os.getenv('DEVICE_TICK', 2))
+DEVICE_RATE_WINDOWS = (10, 60, 300)
+DEVICE_ACTIVE_KEY = 'devices:active'
+
+# Device state retention: LAN devices are kept long, internet hosts only briefly.
+# Hashes idle longer than the limit are summarized into InfluxDB and removed.
+DEVICE_EXTERNAL_KEY = 'devices:external'
+DEVICE_RETENTION_KEY = 'devices:retention'
+DEVICE_INTERNAL_IDLE = int(os.getenv('DEVICE_INTERNAL_IDLE', 30 * 86400))
+DEVICE_EXTERNAL_IDLE = int(os.getenv('DEVICE_EXTERNAL_IDLE', 3600))
+DEVICE_COMPACT_INTERVAL = int(os.getenv('DEVICE_COMPACT_INTERVAL', 300))
+DEVICE_COMPACT_BATCH = 1000
+
+# Long-term flow archive: hourly-partitioned Parquet files on the data volume
+# (/data/flows/date=YYYY-MM-DD/hour=HH/*.parquet, empty path = disabled)
+FLOW_ARCHIVE_PATH = os.getenv('FLOW_ARCHIVE_PATH', '/data/flows')
+FLOW_ARCHIVE_FLUSH_ROWS = int(os.getenv('FLOW_ARCHIVE_FLUSH_ROWS', 250000))
+FLOW_ARCHIVE_FLUSH_INTERVAL = int(os.getenv('FLOW_ARCHIVE_FLUSH_INTERVAL', 300))
+FLOW_ARCHIVE_ROW_GROUP = int(os.getenv('FLOW_ARCHIVE_ROW_GROUP', 1000000))
+FLOW_ARCHIVE_ZSTD_LEVEL = int(os.getenv('FLOW_ARCHIVE_ZSTD_LEVEL', 9))
+FLOW_ARCHIVE_RETENTION_DAYS = int(os.getenv('FLOW_ARCHIVE_RETENTION_DAYS', 180))
+FLOW_ARCHIVE_MAX_GB = float(os.getenv('FLOW_ARCHIVE_MAX_GB', 0))
+FLOW_ARCHIVE_STATS_KEY = 'flows:archive'
+
+# Offline import of pcap / nfcapd files (`python collector.py import FILE...`)
+IMPORT_BATCH = int(os.getenv('IMPORT_BATCH', 5000))
+IMPORT_PORTS = {NETFLOW_PORT, SFLOW_PORT, 4739}
+NFDUMP_PATH = os.getenv('NFDUMP_PATH', 'nfdump')
+# Rollup buckets of the API's downsampling tasks and its history cache; an
+# import re-aggregates the imported range and drops the cached history
+INFLUXDB_ROLLUPS_ENABLED = os.getenv('INFLUXDB_ROLLUPS_ENABLED', 'true').lower() == 'true'
+ROLLUP_BUCKETS = {
+    60: f"{INFLUXDB_BUCKET}_1m",
+    300: f"{INFLUXDB_BUCKET}_5m",
+    3600: f"{INFLUXDB_BUCKET}_1h",
+    86400: f"{INFLUXDB_BUCKET}_1d",
+}
+# Windows re-aggregated per query
+IMPORT_ROLLUP_WINDOWS = 1440
+HISTORY_CACHE_PATTERN = 'netsentry:history:*'
+# Timestamps remembered for de-duplicating point times (import order is roughly chronological)
+IMPORT_SEQUENCE_KEYS = 100000
+
 # Logging setup
 logging.basicConfig(
     level=logging.INFO,
@@ -31,6 +96,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+
+def is_private_ip(ip: str) -> bool:
+    """RFC 1918 private address check"""
+    parts = ip.split('.')
+    return (
+        parts[0] == '10' or
+        (parts[0] == '172' and 16 <= int(parts[1]) <= 31) or
+        (parts[0] == '192' and parts[1] == '168')
+    )
+
+
 # Initialize InfluxDB client
 influx_client = InfluxDBClient(url=INFLUXDB_URL, token=INFLUXDB_TOKEN, org=INFLUXDB_ORG)
 write_api = influx_client.write_api(write_options=SYNCHRONOUS)
@@ -44,7 +121,7 @@ class NetFlowV5Parser:
 
     HEADER_FORMAT = '!HHIIIIBBH'
     HEADER_SIZE = 24
-    FLOW_FORMAT = '!IIIHHIIHHBBxBBBBHHIIHHHHII'
+    FLOW_FORMAT = '!IIIHHIIIIHHxBBBHHBBxx'
     FLOW_SIZE = 48
 
     @staticmethod
@@ -276,11 +353,605 @@ class NetFlowV9Parser:
         return flows
 
 
+class LiveTrafficStream:
+    """Aggregates flows per tick and publishes one compact JSON frame to Redis
+
+    Frame layout:
+        {"v": 1, "ts": <epoch>, "interval": <seconds>, "flows": <count>,
+         "directions": {"inbound": [bytes, packets], ...},
+         "top": [[src, dst, protocol, dst_port, bytes, packets], ...]}
+    """
+
+    def __init__(self, tick: float = LIVE_TICK, top_n: int = LIVE_TOP_FLOWS):
+        self.tick = tick
+        self.top_n = top_n
+        self.reset()
+
+    def reset(self):
+        self.directions: Dict[str, List[int]] = {}
+        self.flows: Dict[tuple, List[int]] = {}
+        self.flow_count = 0
+
+    def add(self, flow: Dict[str, Any], direction: str):
+        """Account a flow in the current tick (no I/O)"""
+        totals = self.directions.get(direction)
+        if totals is None:
+            totals = self.directions[direction] = [0, 0]
+        totals[0] += flow['bytes']
+        totals[1] += flow['packets']
+
+        key = (flow['src_addr'], flow['dst_addr'], flow['protocol'], flow['dst_port'])
+        counters = self.flows.get(key)
+        if counters is None:
+            self.flows[key] = [flow['bytes'], flow['packets']]
+        else:
+            counters[0] += flow['bytes']
+            counters[1] += flow['packets']
+        self.flow_count += 1
+
+    def frame(self, interval: float) -> Dict[str, Any]:
+        """Build the frame for the elapsed tick and start a new one"""
+        top = heapq.nlargest(self.top_n, self.flows.items(), key=lambda item: item[1][0])
+        frame = {
+            'v': 1,
+            'ts': round(time.time(), 3),
+            'interval': round(interval, 3),
+            'flows': self.flow_count,
+            'directions': self.directions,
+            'top': [[src, dst, proto, dst_port, counters[0], counters[1]] for (src, dst, proto, dst_port), counters in top],
+        }
+        self.reset()
+        return frame
+
+    async def run(self):
+        """Publish one frame per tick (also when idle, so consumers see zero rates)"""
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(self.tick)
+            now = time.monotonic()
+            frame = self.frame(now - last)
+            last = now
+            try:
+                redis_client.publish(LIVE_CHANNEL, json.dumps(frame, separators=(',', ':')))
+            except Exception as e:
+                logger.error(f"Error publishing live traffic frame: {e}")
+
+
+class RealtimeRingWriter:
+    """Per-second traffic counters in a memory-mapped ring buffer
+
+    Layout (little endian, must match RealtimeRingReader in the API):
+        header (32 bytes): magic 'NSRB', version u32, slots u32, last complete second u64
+        slot   (64 bytes): second u64, total_bytes, total_packets, inbound_bytes,
+                           outbound_bytes, internal_bytes, external_bytes, flows (u64 each)
+
+    The slot for second S lives at index S % slots. A slot is invalidated (second=0)
+    before its counters are written and stamped with its second afterwards, so a
+    reader can detect torn or stale slots by reading the stamp before and after.
+    """
+
+    MAGIC = b'NSRB'
+    VERSION = 1
+    HEADER_FORMAT = '<4sIIQ'
+    HEADER_SIZE = 32
+    SLOT_FORMAT = '<8Q'
+    SLOT_SIZE = 64
+    DIRECTIONS = ('inbound', 'outbound', 'internal', 'external')
+
+    def __init__(self, path: str, slots: int = REALTIME_RING_SECONDS):
+        self.slots = slots
+        size = self.HEADER_SIZE + slots * self.SLOT_SIZE
+        # Never truncate: the API may have the file mapped, and shrinking it under
+        # a reader raises SIGBUS there. The file is only grown when too small.
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self.buffer = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        magic, _, existing_slots, last = struct.unpack_from(self.HEADER_FORMAT, self.buffer, 0)
+        if magic != self.MAGIC or existing_slots != slots:
+            last = 0
+        struct.pack_into(self.HEADER_FORMAT, self.buffer, 0, self.MAGIC, self.VERSION, slots, last)
+        self.second = int(time.time())
+        self.counters = [0] * 7
+        logger.info(f"Realtime ring buffer at {path} ({slots} seconds)")
+
+    def add(self, flow: Dict[str, Any], direction: str):
+        """Account a flow in the current second"""
+        self.roll(int(time.time()))
+        counters = self.counters
+        counters[0] += flow['bytes']
+        counters[1] += flow['packets']
+        if direction in self.DIRECTIONS:
+            counters[2 + self.DIRECTIONS.index(direction)] += flow['bytes']
+        counters[6] += 1
+
+    def roll(self, now: int):
+        """Write out the current second once the clock moved past it"""
+        if now <= self.second:
+            return
+        offset = self.HEADER_SIZE + (self.second % self.slots) * self.SLOT_SIZE
+        struct.pack_into(self.SLOT_FORMAT, self.buffer, offset, 0, *self.counters)
+        struct.pack_into('<Q', self.buffer, offset, self.second)
+        struct.pack_into('<Q', self.buffer, 12, self.second)
+        self.second = now
+        self.counters = [0] * 7
+
+    async def run(self):
+        """Close seconds without traffic too, so readers see exact zeros"""
+        while True:
+            await asyncio.sleep(0.2)
+            self.roll(int(time.time()))
+
+
+class DeviceActivityTracker:
+    """Per-device byte counters, moving-average rates and last-seen index
+
+    Flows are accumulated per IP in memory and written once per tick with a
+    single pipeline:
+        device:{ip}     bytes_sent / bytes_received (cumulative, HINCRBY)
+                        bytes_sent_rate / bytes_received_rate (10s average, B/s)
+                        rates "sent_10s,sent_1m,sent_5m,recv_10s,recv_1m,recv_5m"
+                        last_seen (ISO timestamp)
+        devices:active  sorted set of internal (RFC 1918) IPs scored by last-seen epoch
+        devices:external  same for internet hosts, whose hashes expire much sooner
+
+    Rates are exponential moving averages over DEVICE_RATE_WINDOWS. A device is
+    kept in memory until all of its averages have decayed below 1 B/s, at which
+    point zero rates are written once and it is dropped.
+    """
+
+    def __init__(self, tick: float = DEVICE_TICK, windows: tuple = DEVICE_RATE_WINDOWS):
+        self.tick = tick
+        self.windows = windows
+        self.pending: Dict[str, List[int]] = {}
+        self.rates: Dict[str, List[float]] = {}
+
+    def add(self, flow: Dict[str, Any]):
+        """Account a flow for its source (sent) and destination (received)"""
+        for ip, index in ((flow['src_addr'], 0), (flow['dst_addr'], 1)):
+            counters = self.pending.get(ip)
+            if counters is None:
+                counters = self.pending[ip] = [0, 0]
+            counters[index] += flow['bytes']
+
+    def update(self, interval: float) -> Dict[str, List[float]]:
+        """Fold the pending byte counts into the averages; returns the rates to write"""
+        n = len(self.windows)
+        alphas = [1 - math.exp(-interval / window) for window in self.windows]
+        updates = {}
+
+        for ip in self.rates.keys() | self.pending.keys():
+            sent, received = self.pending.get(ip, (0, 0))
+            current = (sent / interval, received / interval)
+            averages = self.rates.get(ip) or [0.0] * (2 * n)
+            for i, alpha in enumerate(alphas):
+                averages[i] += alpha * (current[0] - averages[i])
+                averages[n + i] += alpha * (current[1] - averages[n + i])
+
+            if ip not in self.pending and max(averages) < 1:
+                self.rates.pop(ip, None)
+                averages = [0.0] * (2 * n)
+            else:
+                self.rates[ip] = averages
+            updates[ip] = averages
+
+        return updates
+
+    def flush(self, interval: float):
+        """Write counters, rates and last-seen scores for the elapsed tick"""
+        pending = self.pending
+        updates = self.update(interval)
+        self.pending = {}
+        if not updates:
+            return
+
+        n = len(self.windows)
+        now = time.time()
+        timestamp = datetime.utcnow().isoformat()
+        pipe = redis_client.pipeline(transaction=False)
+
+        for ip, averages in updates.items():
+            mapping = {
+                'bytes_sent_rate': round(averages[0]),
+                'bytes_received_rate': round(averages[n]),
+                'rates': ','.join(str(round(value)) for value in averages),
+            }
+            counters = pending.get(ip)
+            if counters:
+                mapping['last_seen'] = timestamp
+                if counters[0]:
+                    pipe.hincrby(f"device:{ip}", "bytes_sent", counters[0])
+                if counters[1]:
+                    pipe.hincrby(f"device:{ip}", "bytes_received", counters[1])
+            pipe.hset(f"device:{ip}", mapping=mapping)
+            # Safety net if compaction does not run; also covers the final decay write,
+            # which may recreate a hash that compaction already removed
+            pipe.expire(f"device:{ip}", 2 * DeviceRetention.idle_limit(ip))
+
+        internal = [ip for ip in pending if is_private_ip(ip)]
+        external = [ip for ip in pending if not is_private_ip(ip)]
+        if internal:
+            pipe.zadd(DEVICE_ACTIVE_KEY, dict.fromkeys(internal, now))
+        if external:
+            pipe.zadd(DEVICE_EXTERNAL_KEY, dict.fromkeys(external, now))
+        pipe.execute()
+
+    async def run(self):
+        """Flush once per tick"""
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(self.tick)
+            now = time.monotonic()
+            try:
+                self.flush(now - last)
+            except Exception as e:
+                logger.error(f"Error writing device activity: {e}")
+            last = now
+
+
+class DeviceRetention:
+    """Evicts idle device state from Redis, keeping a summary in InfluxDB
+
+    Every DEVICE_COMPACT_INTERVAL the IPs whose last-seen score is older than
+    their idle limit (internal vs external) are compacted in batches: the
+    cumulative counters of LAN devices are written as one `device_summary` point
+    each, then the hash and index entry of every batch member are removed.
+    Hashes left without a TTL by older versions are found with an incremental
+    SCAN and given one. Run statistics and Redis memory usage are kept in the
+    devices:retention hash for the API.
+    """
+
+    INDEXES = ((DEVICE_ACTIVE_KEY, 'internal', DEVICE_INTERNAL_IDLE), (DEVICE_EXTERNAL_KEY, 'external', DEVICE_EXTERNAL_IDLE))
+
+    def __init__(self, interval: int = DEVICE_COMPACT_INTERVAL, batch: int = DEVICE_COMPACT_BATCH):
+        self.interval = interval
+        self.batch = batch
+        self.scan_cursor = 0
+
+    @staticmethod
+    def idle_limit(ip: str) -> int:
+        return DEVICE_INTERNAL_IDLE if is_private_ip(ip) else DEVICE_EXTERNAL_IDLE
+
+    def compact_index(self, index: str, scope: str, idle: int) -> int:
+        """Summarize and delete devices idle for longer than `idle` seconds"""
+        compacted = 0
+        cutoff = time.time() - idle
+        while True:
+            ips = redis_client.zrangebyscore(index, '-inf', cutoff, start=0, num=self.batch)
+            if not ips:
+                return compacted
+
+            pipe = redis_client.pipeline(transaction=False)
+            for ip in ips:
+                pipe.hmget(f"device:{ip}", "bytes_sent", "bytes_received", "last_seen")
+            rows = pipe.execute()
+
+            # Only LAN devices are summarized: one series per internet host would
+            # blow up the series cardinality in InfluxDB
+            points = [] if scope != 'internal' else [
+                Point("device_summary")
+                .tag("ip", ip)
+                .tag("scope", scope)
+                .field("bytes_sent", int(sent or 0))
+                .field("bytes_received", int(received or 0))
+                .field("last_seen", last_seen or '')
+                .time(datetime.utcnow())
+                for ip, (sent, received, last_seen) in zip(ips, rows)
+                if sent or received
+            ]
+            if points:
+                write_api.write(bucket=INFLUXDB_BUCKET, record=points)
+
+            # Only drop devices that were not seen again meanwhile
+            scores = redis_client.zmscore(index, ips)
+            idle = [ip for ip, score in zip(ips, scores) if score is None or score <= cutoff]
+            if idle:
+                # Remove only this batch from the index; the next batch is summarized in the next loop
+                pipe = redis_client.pipeline(transaction=False)
+                for ip in idle:
+                    pipe.delete(f"device:{ip}")
+                pipe.zrem(index, *idle)
+                pipe.execute()
+            # Re-seen devices now score above the cutoff and drop out of the next range
+            compacted += len(idle)
+
+    def sweep_untracked(self) -> int:
+        """Give device hashes without a TTL (pre-retention data) one, a slice per run"""
+        self.scan_cursor, keys = redis_client.scan(self.scan_cursor, match="device:*", count=self.batch)
+        if not keys:
+            return 0
+
+        pipe = redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.ttl(key)
+        ttls = pipe.execute()
+
+        pipe = redis_client.pipeline(transaction=False)
+        fixed = 0
+        for key, ttl in zip(keys, ttls):
+            if ttl == -1:
+                pipe.expire(key, 2 * self.idle_limit(key.split(':', 1)[1]))
+                fixed += 1
+        pipe.execute()
+        return fixed
+
+    def compact(self) -> Dict[str, Any]:
+        """One retention pass; returns the statistics stored for the API"""
+        started = time.time()
+        report = {'last_run': int(started)}
+        for index, scope, idle in self.INDEXES:
+            report[f'compacted_{scope}'] = self.compact_index(index, scope, idle)
+            report[f'tracked_{scope}'] = redis_client.zcard(index)
+        report['ttl_assigned'] = self.sweep_untracked()
+        # Legacy unbounded set replaced by the sorted-set indexes
+        redis_client.delete("devices")
+
+        memory = redis_client.info('memory')
+        report['redis_used_memory'] = memory.get('used_memory', 0)
+        report['redis_maxmemory'] = memory.get('maxmemory', 0)
+        report['duration_ms'] = round((time.time() - started) * 1000)
+
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hset(DEVICE_RETENTION_KEY, mapping=report)
+        pipe.hincrby(DEVICE_RETENTION_KEY, 'compacted_total', report['compacted_internal'] + report['compacted_external'])
+        pipe.execute()
+        return report
+
+    async def run(self):
+        """Compact periodically without blocking packet reception"""
+        while True:
+            try:
+                report = await asyncio.to_thread(self.compact)
+                if report['compacted_internal'] or report['compacted_external']:
+                    logger.info(
+                        f"Device retention: compacted {report['compacted_internal']} internal / "
+                        f"{report['compacted_external']} external devices"
+                    )
+            except Exception as e:
+                logger.error(f"Error compacting device state: {e}")
+            await asyncio.sleep(self.interval)
+
+
+class FlowArchive:
+    """Appends decoded flows to an hourly-partitioned Parquet archive
+
+    Flows are buffered column-wise in memory and written as one part file per
+    flush (FLOW_ARCHIVE_FLUSH_ROWS rows or FLOW_ARCHIVE_FLUSH_INTERVAL seconds).
+    Once an hour is complete its parts are merged into a single flows.parquet
+    with large row groups. Addresses, hostnames and other repetitive strings are
+    dictionary-encoded and everything is zstd-compressed, so a flow costs a few
+    bytes on disk. Partitions older than FLOW_ARCHIVE_RETENTION_DAYS (or beyond
+    FLOW_ARCHIVE_MAX_GB) are removed. Files are written to a temporary name and
+    renamed, so readers never see partial files.
+    """
+
+    SCHEMA = pa.schema([
+        ('time', pa.timestamp('ms', tz='UTC')),
+        ('source', pa.string()),
+        ('src_addr', pa.string()),
+        ('dst_addr', pa.string()),
+        ('src_hostname', pa.string()),
+        ('dst_hostname', pa.string()),
+        ('src_port', pa.int32()),
+        ('dst_port', pa.int32()),
+        ('protocol', pa.string()),
+        ('direction', pa.string()),
+        ('bytes', pa.int64()),
+        ('packets', pa.int64()),
+    ])
+    DICTIONARY_COLUMNS = ['source', 'src_addr', 'dst_addr', 'src_hostname', 'dst_hostname', 'protocol', 'direction']
+
+    def __init__(self, path: str = FLOW_ARCHIVE_PATH):
+        self.path = path
+        self.buffers: Dict[str, Dict[str, list]] = {}
+        self.buffered = 0
+        self.last_flush = time.monotonic()
+        self.sequence = 0
+
+    @staticmethod
+    def partition(ts: float) -> str:
+        return datetime.fromtimestamp(ts, timezone.utc).strftime('date=%Y-%m-%d/hour=%H')
+
+    def add(self, flow: Dict[str, Any], source: str, direction: str, protocol: str, src_hostname: str, dst_hostname: str,
+            ts: float = None):
+        now = ts or time.time()
+        columns = self.buffers.get(self.partition(now))
+        if columns is None:
+            columns = self.buffers[self.partition(now)] = {name: [] for name in self.SCHEMA.names}
+        columns['time'].append(int(now * 1000))
+        columns['source'].append(source)
+        columns['src_addr'].append(flow['src_addr'])
+        columns['dst_addr'].append(flow['dst_addr'])
+        columns['src_hostname'].append(src_hostname)
+        columns['dst_hostname'].append(dst_hostname)
+        columns['src_port'].append(flow['src_port'])
+        columns['dst_port'].append(flow['dst_port'])
+        columns['protocol'].append(protocol)
+        columns['direction'].append(direction)
+        columns['bytes'].append(flow['bytes'])
+        columns['packets'].append(flow['packets'])
+        self.buffered += 1
+
+    def write_table(self, table: pa.Table, directory: str, name: str):
+        os.makedirs(directory, exist_ok=True)
+        target = os.path.join(directory, name)
+        pq.write_table(
+            table, target + '.tmp',
+            row_group_size=FLOW_ARCHIVE_ROW_GROUP,
+            compression='zstd',
+            compression_level=FLOW_ARCHIVE_ZSTD_LEVEL,
+            use_dictionary=self.DICTIONARY_COLUMNS,
+        )
+        os.replace(target + '.tmp', target)
+
+    def write_parts(self, buffers: Dict[str, Dict[str, list]]) -> tuple:
+        """Write detached buffers as part files (runs in a worker thread)
+
+        Returns (rows written, buffers of the partitions that failed to write).
+        """
+        written = 0
+        failed = {}
+        for partition, columns in buffers.items():
+            try:
+                table = pa.Table.from_pydict(columns, schema=self.SCHEMA)
+                self.sequence += 1
+                self.write_table(table, os.path.join(self.path, partition), f"part-{int(time.time())}-{os.getpid()}-{self.sequence}.parquet")
+                written += table.num_rows
+            except Exception as e:
+                logger.error(f"Error writing flow archive partition {partition}: {e}")
+                failed[partition] = columns
+        return written, failed
+
+    def merge_completed_hours(self) -> int:
+        """Merge the part files of finished hours into one flows.parquet each"""
+        current = self.partition(time.time())
+        merged = 0
+        for directory, _, files in os.walk(self.path):
+            parts = sorted(f for f in files if f.startswith('part-') and f.endswith('.parquet'))
+            if not parts or os.path.relpath(directory, self.path) == current:
+                continue
+            if 'flows.parquet' in files:
+                parts.insert(0, 'flows.parquet')
+            table = pa.concat_tables(pq.read_table(os.path.join(directory, f), schema=self.SCHEMA) for f in parts)
+            self.write_table(table, directory, 'flows.parquet')
+            for f in parts:
+                if f != 'flows.parquet':
+                    os.remove(os.path.join(directory, f))
+            merged += 1
+        return merged
+
+    def partitions(self) -> List[tuple]:
+        """(day, hour directory, size in bytes) of all archived hours, oldest first"""
+        result = []
+        for day in sorted(os.listdir(self.path)):
+            day_path = os.path.join(self.path, day)
+            if not day.startswith('date=') or not os.path.isdir(day_path):
+                continue
+            for hour in sorted(os.listdir(day_path)):
+                hour_path = os.path.join(day_path, hour)
+                size = sum(entry.stat().st_size for entry in os.scandir(hour_path) if entry.is_file())
+                result.append((day, hour_path, size))
+        return result
+
+    def apply_retention(self) -> Dict[str, Any]:
+        """Drop partitions past the age limit, then the oldest ones above the size limit"""
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=FLOW_ARCHIVE_RETENTION_DAYS)).strftime('date=%Y-%m-%d')
+        partitions = []
+        removed = 0
+        for day, hour_path, size in self.partitions():
+            if FLOW_ARCHIVE_RETENTION_DAYS and day < cutoff:
+                shutil.rmtree(hour_path, ignore_errors=True)
+                removed += 1
+            else:
+                partitions.append((day, hour_path, size))
+
+        total = sum(size for _, _, size in partitions)
+        limit = FLOW_ARCHIVE_MAX_GB * 1024 ** 3
+        # The newest partition (currently written) is never removed
+        while limit and total > limit and len(partitions) > 1:
+            _, hour_path, size = partitions.pop(0)
+            shutil.rmtree(hour_path, ignore_errors=True)
+            total -= size
+            removed += 1
+
+        for day in os.listdir(self.path):
+            day_path = os.path.join(self.path, day)
+            if os.path.isdir(day_path) and not os.listdir(day_path):
+                os.rmdir(day_path)
+
+        return {
+            'partitions': len(partitions),
+            'size_bytes': total,
+            'oldest_partition': partitions[0][1][len(self.path) + 1:] if partitions else '',
+            'removed_partitions': removed,
+        }
+
+    def maintain(self) -> Dict[str, Any]:
+        report = {'merged_partitions': self.merge_completed_hours()}
+        report.update(self.apply_retention())
+        return report
+
+    def detach(self) -> Dict[str, Dict[str, list]]:
+        """Take the buffered rows; must run on the thread that calls add()"""
+        buffers, self.buffers, self.buffered = self.buffers, {}, 0
+        self.last_flush = time.monotonic()
+        return buffers
+
+    def requeue(self, failed: Dict[str, Dict[str, list]]) -> int:
+        """Put rows of failed writes back for the next flush; returns the rows given up on"""
+        rows = sum(len(columns['time']) for columns in failed.values())
+        if self.buffered + rows > 4 * FLOW_ARCHIVE_FLUSH_ROWS:
+            logger.error(f"Flow archive: dropping {rows} rows after repeated write failures")
+            return rows
+        for partition, columns in failed.items():
+            current = self.buffers.get(partition)
+            if current is None:
+                self.buffers[partition] = columns
+            else:
+                for name, values in columns.items():
+                    current[name][:0] = values
+        self.buffered += rows
+        return 0
+
+    def flush(self) -> int:
+        """Synchronous flush (offline import); raises if a partition could not be written"""
+        written, failed = self.write_parts(self.detach())
+        if failed:
+            raise RuntimeError(f"Flow archive write failed for {', '.join(failed)}")
+        return written
+
+    async def run(self):
+        """Flush on size or age, merge and expire partitions once per hour turn"""
+        os.makedirs(self.path, exist_ok=True)
+        last_partition = None
+        while True:
+            await asyncio.sleep(1)
+            partition = self.partition(time.time())
+            if self.buffered < FLOW_ARCHIVE_FLUSH_ROWS and time.monotonic() - self.last_flush < FLOW_ARCHIVE_FLUSH_INTERVAL and partition == last_partition:
+                continue
+            try:
+                # Detach on the event loop (add() runs here too), write in a worker thread
+                written, failed = await asyncio.to_thread(self.write_parts, self.detach())
+                lost = self.requeue(failed) if failed else 0
+                pipe = redis_client.pipeline(transaction=False)
+                pipe.hincrby(FLOW_ARCHIVE_STATS_KEY, 'rows_written', written)
+                if lost:
+                    pipe.hincrby(FLOW_ARCHIVE_STATS_KEY, 'rows_lost', lost)
+                pipe.hset(FLOW_ARCHIVE_STATS_KEY, 'last_flush', int(time.time()))
+                if partition != last_partition:
+                    report = await asyncio.to_thread(self.maintain)
+                    pipe.hset(FLOW_ARCHIVE_STATS_KEY, mapping=report)
+                    if report['removed_partitions']:
+                        logger.info(f"Flow archive: removed {report['removed_partitions']} expired partitions")
+                pipe.execute()
+                last_partition = partition
+            except Exception as e:
+                logger.error(f"Error writing flow archive: {e}")
+
+
 class NetFlowCollector:
     """NetFlow/sFlow Collector"""
 
+    PROTOCOLS = {
+        1: "ICMP",
+        6: "TCP",
+        17: "UDP",
+        47: "GRE",
+        50: "ESP",
+        51: "AH",
+        58: "ICMPv6"
+    }
+
     def __init__(self):
         self.running = False
+        self.live_stream = LiveTrafficStream()
+        self.realtime_ring = RealtimeRingWriter(REALTIME_RING_PATH) if REALTIME_RING_PATH else None
+        self.device_activity = DeviceActivityTracker()
+        self.device_retention = DeviceRetention()
+        self.flow_archive = FlowArchive() if FLOW_ARCHIVE_PATH else None
         self.netflow_v9_parser = NetFlowV9Parser()
 
     async def handle_netflow(self, data: bytes, addr: tuple):
@@ -324,31 +995,39 @@ class NetFlowCollector:
 
             # Determine direction
             direction = self.determine_direction(flow['src_addr'], flow['dst_addr'])
+            protocol = self.protocol_name(flow['protocol'])
 
-            point = (
-                Point("network_traffic")
-                .tag("source", source)
-                .tag("src_addr", flow['src_addr'])
-                .tag("dst_addr", flow['dst_addr'])
-                .tag("src_hostname", src_hostname)
-                .tag("dst_hostname", dst_hostname)
-                .tag("protocol", self.protocol_name(flow['protocol']))
-                .tag("direction", direction)
-                .field("bytes", flow['bytes'])
-                .field("packets", flow['packets'])
-                .field("src_port", flow['src_port'])
-                .field("dst_port", flow['dst_port'])
-                .time(datetime.utcnow())
-            )
-
+            point = self.flow_point(flow, source, direction, protocol, src_hostname, dst_hostname, datetime.utcnow())
             write_api.write(bucket=INFLUXDB_BUCKET, record=point)
 
+            if self.flow_archive:
+                self.flow_archive.add(flow, source, direction, protocol, src_hostname, dst_hostname)
+
             # Update real-time stats in Redis
             await self.update_realtime_stats(flow, direction)
 
         except Exception as e:
             logger.error(f"Error writing to InfluxDB: {e}")
 
+    @staticmethod
+    def flow_point(flow: Dict[str, Any], source: str, direction: str, protocol: str,
+                   src_hostname: str, dst_hostname: str, timestamp: datetime) -> Point:
+        return (
+            Point("network_traffic")
+            .tag("source", source)
+            .tag("src_addr", flow['src_addr'])
+            .tag("dst_addr", flow['dst_addr'])
+            .tag("src_hostname", src_hostname)
+            .tag("dst_hostname", dst_hostname)
+            .tag("protocol", protocol)
+            .tag("direction", direction)
+            .field("bytes", flow['bytes'])
+            .field("packets", flow['packets'])
+            .field("src_port", flow['src_port'])
+            .field("dst_port", flow['dst_port'])
+            .time(timestamp)
+        )
+
     async def resolve_hostname(self, ip: str) -> str:
         """Resolve IP to hostname with caching"""
         try:
@@ -369,24 +1048,11 @@ class NetFlowCollector:
         except Exception:
             return ip
 
-    def determine_direction(self, src_ip: str, dst_ip: str) -> str:
+    @staticmethod
+    def determine_direction(src_ip: str, dst_ip: str) -> str:
         """Determine traffic direction based on IP addresses"""
-        # Check if source is internal
-        src_parts = src_ip.split('.')
-        dst_parts = dst_ip.split('.')
-
-        # RFC 1918 private address spaces
-        is_src_private = (
-            src_parts[0] == '10' or
-            (src_parts[0] == '172' and 16 <= int(src_parts[1]) <= 31) or
-            (src_parts[0] == '192' and src_parts[1] == '168')
-        )
-
-        is_dst_private = (
-            dst_parts[0] == '10' or
-            (dst_parts[0] == '172' and 16 <= int(dst_parts[1]) <= 31) or
-            (dst_parts[0] == '192' and dst_parts[1] == '168')
-        )
+        is_src_private = is_private_ip(src_ip)
+        is_dst_private = is_private_ip(dst_ip)
 
         if is_src_private and not is_dst_private:
             return "outbound"
@@ -397,18 +1063,10 @@ class NetFlowCollector:
         else:
             return "external"
 
-    def protocol_name(self, protocol: int) -> str:
+    @staticmethod
+    def protocol_name(protocol: int) -> str:
         """Convert protocol number to name"""
-        protocols = {
-            1: "ICMP",
-            6: "TCP",
-            17: "UDP",
-            47: "GRE",
-            50: "ESP",
-            51: "AH",
-            58: "ICMPv6"
-        }
-        return protocols.get(protocol, f"Protocol-{protocol}")
+        return NetFlowCollector.PROTOCOLS.get(protocol, f"Protocol-{protocol}")
 
     async def update_realtime_stats(self, flow: Dict[str, Any], direction: str):
         """Update real-time statistics in Redis"""
@@ -421,37 +1079,17 @@ class NetFlowCollector:
             redis_client.incrby(f"stats:{direction}_bytes", flow['bytes'])
             redis_client.incrby(f"stats:{direction}_packets", flow['packets'])
 
-            # Update per-device stats
-            redis_client.hincrby(f"device:{flow['src_addr']}", "bytes_sent", flow['bytes'])
-            redis_client.hincrby(f"device:{flow['dst_addr']}", "bytes_received", flow['bytes'])
-
-            # Publish to WebSocket channel for real-time updates
-            stats = {
-                'timestamp': datetime.utcnow().isoformat(),
-                'bytes': flow['bytes'],
-                'packets': flow['packets'],
-                'direction': direction,
-                'src_addr': flow['src_addr'],
-                'dst_addr': flow['dst_addr']
-            }
-            redis_client.publish('realtime_traffic', str(stats))
+            # Account for the live stream (published once per tick, not per flow)
+            self.live_stream.add(flow, direction)
+            if self.realtime_ring:
+                self.realtime_ring.add(flow, direction)
 
         except Exception as e:
             logger.error(f"Error updating realtime stats: {e}")
 
     async def update_device_cache(self, flow: Dict[str, Any]):
-        """Update device information in cache"""
-        try:
-            # Update device last seen timestamp
-            timestamp = datetime.utcnow().isoformat()
-            redis_client.hset(f"device:{flow['src_addr']}", "last_seen", timestamp)
-            redis_client.hset(f"device:{flow['dst_addr']}", "last_seen", timestamp)
-
-            # Add to device set
-            redis_client.sadd("devices", flow['src_addr'], flow['dst_addr'])
-
-        except Exception as e:
-            logger.error(f"Error updating device cache: {e}")
+        """Update per-device counters, rates and last seen (written once per tick)"""
+        self.device_activity.add(flow)
 
     async def start_udp_server(self, port: int, handler):
         """Start UDP server for NetFlow/sFlow collection"""
@@ -486,13 +1124,320 @@ class NetFlowCollector:
             self.start_udp_server(SFLOW_PORT, self.handle_netflow)
         )
 
+        # Publish aggregated live traffic frames
+        live_task = asyncio.create_task(self.live_stream.run())
+
+        # Per-device counters, rates and active-devices index
+        device_task = asyncio.create_task(self.device_activity.run())
+        retention_task = asyncio.create_task(self.device_retention.run())
+        tasks = [netflow_task, sflow_task, live_task, device_task, retention_task]
+
+        # Per-second counters for the API (single-host mode)
+        if self.realtime_ring:
+            tasks.append(asyncio.create_task(self.realtime_ring.run()))
+
+        # Long-term Parquet flow archive
+        if self.flow_archive:
+            tasks.append(asyncio.create_task(self.flow_archive.run()))
+
         try:
-            await asyncio.gather(netflow_task, sflow_task)
+            await asyncio.gather(*tasks)
         except KeyboardInterrupt:
             logger.info("Shutting down collector")
             self.running = False
 
 
+class OfflineImporter:
+    """Batch import of captured NetFlow datagrams (pcap) and nfdump files (nfcapd)
+
+    pcap files are memory-mapped and walked record by record; UDP payloads sent
+    to a collector port go through the same NetFlowV5Parser/NetFlowV9Parser as
+    live traffic (v9 templates keyed by exporter address). nfcapd files hold
+    already decoded flows and are streamed through `nfdump -o csv`. Flows keep
+    their capture time and are bulk-written to InfluxDB in batches of
+    IMPORT_BATCH points and to the flow archive. No event loop, no reverse DNS
+    (hostnames only from the Redis cache), no live counters and none of the
+    collector's state (realtime ring, device indexes) are involved, so
+    imports run at parser speed - for backfills after outages and for
+    reproducible performance runs (--dry-run skips all writes).
+
+    The rollup tasks only aggregate their latest windows, so after an import
+    the imported time range is re-aggregated through the rollup chain and the
+    API's cached history is dropped.
+    """
+
+    PCAP_MAGIC = {
+        b'\xd4\xc3\xb2\xa1': ('<', 1e-6), b'\xa1\xb2\xc3\xd4': ('>', 1e-6),
+        b'\x4d\x3c\xb2\xa1': ('<', 1e-9), b'\xa1\xb2\x3c\x4d': ('>', 1e-9),
+    }
+    NFDUMP_PROTOCOLS = {'ICMP': 1, 'TCP': 6, 'UDP': 17, 'GRE': 47, 'ESP': 50, 'AH': 51, 'ICMP6': 58, 'ICMPV6': 58}
+
+    def __init__(self, dry_run: bool = False):
+        self.dry_run = dry_run
+        self.v9_parser = NetFlowV9Parser()
+        self.archive = FlowArchive() if FLOW_ARCHIVE_PATH and not dry_run else None
+        self.hostnames: Dict[str, str] = {}
+        self.points: List[Point] = []
+        self.first_ts = self.last_ts = None
+        # Points sent in the same datagram / second share series and time; the
+        # next free nanosecond per timestamp keeps InfluxDB from merging them
+        self.sequence: Dict[int, int] = {}
+        self.stats = {'datagrams': 0, 'flows': 0, 'unsupported': 0, 'skipped_packets': 0}
+
+    @staticmethod
+    def udp_payload(frame: bytes, linktype: int) -> tuple:
+        """(exporter address, destination port, payload) of a UDP frame, None for anything else"""
+        if linktype == 1:  # Ethernet (with optional 802.1Q tags)
+            offset, ethertype = 14, struct.unpack_from('!H', frame, 12)[0]
+            while ethertype in (0x8100, 0x88a8):
+                ethertype = struct.unpack_from('!H', frame, offset + 2)[0]
+                offset += 4
+        elif linktype == 113:  # Linux cooked capture
+            offset, ethertype = 16, struct.unpack_from('!H', frame, 14)[0]
+        elif linktype in (101, 12, 14):  # Raw IP
+            offset, ethertype = 0, 0x0800 if frame[0] >> 4 == 4 else 0x86dd
+        else:
+            return None
+
+        if ethertype == 0x0800:
+            ihl = (frame[offset] & 0x0f) * 4
+            # UDP only, first fragment only
+            if frame[offset + 9] != 17 or struct.unpack_from('!H', frame, offset + 6)[0] & 0x1fff:
+                return None
+            exporter = socket.inet_ntoa(frame[offset + 12:offset + 16])
+            offset += ihl
+        elif ethertype == 0x86dd:
+            if frame[offset + 6] != 17:
+                return None
+            exporter = socket.inet_ntop(socket.AF_INET6, frame[offset + 8:offset + 24])
+            offset += 40
+        else:
+            return None
+
+        dst_port, length = struct.unpack_from('!HH', frame, offset + 2)
+        return exporter, dst_port, frame[offset + 8:offset + length]
+
+    def read_pcap(self, path: str, ports: set):
+        """Yield (capture time, exporter, payload) for UDP datagrams to `ports` in a pcap file"""
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[:4] not in self.PCAP_MAGIC:
+                raise ValueError(f"{path} is not a pcap file (pcapng is not supported, convert with editcap -F pcap)")
+            endian, resolution = self.PCAP_MAGIC[data[:4]]
+            linktype = struct.unpack_from(endian + 'I', data, 20)[0] & 0x0fffffff
+            record = struct.Struct(endian + 'IIII')
+
+            offset = 24
+            while offset + record.size <= len(data):
+                seconds, fraction, captured, _ = record.unpack_from(data, offset)
+                offset += record.size
+                frame = data[offset:offset + captured]
+                offset += captured
+                try:
+                    udp = self.udp_payload(frame, linktype)
+                except (IndexError, struct.error, ValueError):
+                    udp = None
+                if udp is None or (ports and udp[1] not in ports):
+                    self.stats['skipped_packets'] += 1
+                    continue
+                yield seconds + fraction * resolution, udp[0], udp[2]
+
+    def read_nfcapd(self, path: str, source: str):
+        """Yield (flow start time, exporter, flow) from an nfcapd file via `nfdump -o csv`"""
+        process = subprocess.Popen(
+            [NFDUMP_PATH, '-r', path, '-o', 'csv'],
+            stdout=subprocess.PIPE, text=True, bufsize=1 << 20,
+            # nfdump prints timestamps in local time; make that UTC
+            env={**os.environ, 'TZ': 'UTC'}
+        )
+        try:
+            rows = csv.reader(process.stdout)
+            header = next(rows, None)
+            if not header:
+                raise ValueError(f"nfdump could not read {path}")
+            column = {name: i for i, name in enumerate(header)}
+            for row in rows:
+                # nfdump appends a summary block after the records
+                if not row or row[0] == 'Summary':
+                    break
+                protocol = row[column['pr']].strip()
+                started = row[column['ts']].strip()
+                started = datetime.strptime(started, '%Y-%m-%d %H:%M:%S.%f' if '.' in started else '%Y-%m-%d %H:%M:%S')
+                flow = {
+                    'src_addr': row[column['sa']],
+                    'dst_addr': row[column['da']],
+                    'src_port': int(float(row[column['sp']])),
+                    'dst_port': int(float(row[column['dp']])),
+                    'protocol': int(protocol) if protocol.isdigit() else self.NFDUMP_PROTOCOLS.get(protocol.upper(), 0),
+                    'bytes': int(row[column['ibyt']]),
+                    'packets': int(row[column['ipkt']]),
+                }
+                exporter = row[column['ra']] if 'ra' in column and row[column['ra']] not in ('', '0.0.0.0') else source
+                yield started.replace(tzinfo=timezone.utc).timestamp(), exporter, flow
+        finally:
+            process.stdout.close()
+            if process.wait() != 0:
+                logger.warning(f"nfdump exited with status {process.returncode} for {path}")
+
+    def parse_datagram(self, payload: bytes, exporter: str) -> List[Dict[str, Any]]:
+        if len(payload) < 4:
+            return []
+        version = struct.unpack_from('!H', payload)[0]
+        if version == 5:
+            parsed = NetFlowV5Parser.parse(payload)
+        elif version == 9:
+            parsed = self.v9_parser.parse(payload, exporter)
+        else:
+            # IPFIX (10) and sFlow (first word 5) have no decoder in the collector
+            self.stats['unsupported'] += 1
+            return []
+        return parsed['flows'] if parsed else []
+
+    def hostname(self, ip: str) -> str:
+        if ip not in self.hostnames:
+            self.hostnames[ip] = redis_client.get(f"hostname:{ip}") or ip
+        return self.hostnames[ip]
+
+    def add(self, flow: Dict[str, Any], exporter: str, ts: float):
+        self.stats['flows'] += 1
+        if self.dry_run:
+            NetFlowCollector.determine_direction(flow['src_addr'], flow['dst_addr'])
+            return
+        if self.first_ts is None or ts < self.first_ts:
+            self.first_ts = ts
+        if self.last_ts is None or ts > self.last_ts:
+            self.last_ts = ts
+
+        direction = NetFlowCollector.determine_direction(flow['src_addr'], flow['dst_addr'])
+        protocol = NetFlowCollector.protocol_name(flow['protocol'])
+        src_hostname, dst_hostname = self.hostname(flow['src_addr']), self.hostname(flow['dst_addr'])
+        self.points.append(NetFlowCollector.flow_point(
+            flow, exporter, direction, protocol, src_hostname, dst_hostname, self.point_time(ts)
+        ))
+        if self.archive:
+            self.archive.add(flow, exporter, direction, protocol, src_hostname, dst_hostname, ts)
+            if self.archive.buffered >= FLOW_ARCHIVE_FLUSH_ROWS:
+                self.archive.flush()
+        if len(self.points) >= IMPORT_BATCH:
+            self.flush()
+
+    def point_time(self, ts: float) -> int:
+        """Unique nanosecond timestamp for a point captured at ts (microsecond precision)"""
+        base = round(ts * 1e6) * 1000
+        offset = self.sequence.pop(base, 0)
+        self.sequence[base] = offset + 1
+        if len(self.sequence) > IMPORT_SEQUENCE_KEYS:
+            del self.sequence[next(iter(self.sequence))]
+        return base + offset
+
+    def flush(self):
+        if self.points:
+            write_api.write(bucket=INFLUXDB_BUCKET, record=self.points)
+            self.points = []
+
+    @staticmethod
+    def refresh_rollups(start: float, end: float) -> int:
+        """Re-run the downsampling chain raw -> 1m -> 5m -> 1h -> 1d over [start, end]
+
+        Same pipeline as the API's rollup tasks; every window touched by the
+        import is re-aggregated from its source bucket and overwrites the old
+        rollup point. Returns the number of rollup buckets refreshed.
+        """
+        if not INFLUXDB_ROLLUPS_ENABLED:
+            return 0
+        query_api = influx_client.query_api()
+        refreshed = 0
+        source = INFLUXDB_BUCKET
+        for resolution in sorted(ROLLUP_BUCKETS):
+            target = ROLLUP_BUCKETS[resolution]
+            window = int(start) // resolution * resolution
+            stop = (int(end) // resolution + 1) * resolution
+            try:
+                while window < stop:
+                    window_stop = min(window + resolution * IMPORT_ROLLUP_WINDOWS, stop)
+                    flux = f'''
+from(bucket: "{source}")
+  |> range(start: {datetime.fromtimestamp(window, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}, stop: {datetime.fromtimestamp(window_stop, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')})
+  |> filter(fn: (r) => r["_measurement"] == "network_traffic")
+  |> filter(fn: (r) => r["_field"] == "bytes" or r["_field"] == "packets")
+  |> group(columns: ["_measurement", "_field", "direction"])
+  |> aggregateWindow(every: {resolution}s, fn: sum, createEmpty: false, timeSrc: "_start")
+  |> to(bucket: "{target}", org: "{INFLUXDB_ORG}")
+'''
+                    query_api.query(flux, org=INFLUXDB_ORG)
+                    window = window_stop
+            except Exception as e:
+                # Coarser rollups are built from this one, so stop here
+                logger.error(f"Error refreshing rollup bucket {target}: {e}")
+                break
+            refreshed += 1
+            source = target
+        return refreshed
+
+    @staticmethod
+    def clear_history_cache() -> int:
+        """Delete the API's cached history windows (they may predate the import)"""
+        deleted = 0
+        keys = []
+        for key in redis_client.scan_iter(HISTORY_CACHE_PATTERN, count=1000):
+            keys.append(key)
+            if len(keys) >= 1000:
+                deleted += redis_client.delete(*keys)
+                keys = []
+        if keys:
+            deleted += redis_client.delete(*keys)
+        return deleted
+
+    def import_file(self, path: str, file_format: str = 'auto', source: str = '0.0.0.0', ports: set = IMPORT_PORTS):
+        if file_format == 'auto':
+            with open(path, 'rb') as f:
+                file_format = 'pcap' if f.read(4) in self.PCAP_MAGIC else 'nfcapd'
+
+        if file_format == 'pcap':
+            for ts, exporter, payload in self.read_pcap(path, ports):
+                self.stats['datagrams'] += 1
+                for flow in self.parse_datagram(payload, exporter):
+                    self.add(flow, exporter, ts)
+        else:
+            for ts, exporter, flow in self.read_nfcapd(path, source):
+                self.add(flow, exporter, ts)
+
+    def run(self, paths: List[str], file_format: str = 'auto', source: str = '0.0.0.0', any_port: bool = False) -> Dict[str, Any]:
+        started = time.perf_counter()
+        for path in paths:
+            file_started = time.perf_counter()
+            flows_before = self.stats['flows']
+            self.import_file(path, file_format, source, set() if any_port else IMPORT_PORTS)
+            logger.info(f"Imported {self.stats['flows'] - flows_before} flows from {path} in {time.perf_counter() - file_started:.2f}s")
+        self.flush()
+        if self.archive:
+            self.archive.flush()
+        if self.first_ts is not None:
+            self.stats['rollups_refreshed'] = self.refresh_rollups(self.first_ts, self.last_ts)
+            self.stats['history_cache_cleared'] = self.clear_history_cache()
+
+        elapsed = time.perf_counter() - started
+        self.stats['seconds'] = round(elapsed, 3)
+        self.stats['flows_per_second'] = round(self.stats['flows'] / elapsed) if elapsed else 0
+        logger.info(f"Import finished: {self.stats}")
+        return self.stats
+
+
 if __name__ == "__main__":
-    collector = NetFlowCollector()
-    asyncio.run(collector.run())
+    parser = argparse.ArgumentParser(description="NetFlow/sFlow collector")
+    commands = parser.add_subparsers(dest='command')
+    importer = commands.add_parser('import', help="Import pcap or nfcapd files (offline backfill)")
+    importer.add_argument('files', nargs='+', help="pcap files with exporter traffic or nfcapd files")
+    importer.add_argument('--format', choices=('auto', 'pcap', 'nfcapd'), default='auto')
+    importer.add_argument('--source', default='0.0.0.0', help="Exporter address for nfcapd records without router IP")
+    importer.add_argument('--any-port', action='store_true', help="Accept UDP datagrams to any port (pcap)")
+    importer.add_argument('--dry-run', action='store_true', help="Parse only, write nothing (performance runs)")
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        # Per-datagram INFO logging would dominate a bulk import
+        logger.setLevel(logging.WARNING)
+        stats = OfflineImporter(dry_run=args.dry_run).run(args.files, args.format, args.source, args.any_port)
+        print(json.dumps(stats))
+    else:
+        collector = NetFlowCollector()
+        asyncio.run(collector.run())
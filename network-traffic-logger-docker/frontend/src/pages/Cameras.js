@@ -209,16 +209,19 @@ function CameraCard({ camera, onClick, refreshKey }) {
 }
 
 // Camera Stream Component
-// TODO: Implement true RTSP stream using HLS/WebRTC conversion or JSMpeg
-// For now, using snapshot refresh as interim solution
+// The enlarged view shows the MJPEG stream relayed by the backend (one upstream
+// pull per camera, shared by all viewers). Grid tiles poll the cached snapshot:
+// an open MJPEG connection per tile would use up the browser's connections per host.
 function CameraStream({ camera, large = false, refreshKey }) {
   const [imageKey, setImageKey] = useState(0);
   const [error, setError] = useState(false);
   const intervalRef = useRef(null);
 
   useEffect(() => {
+    if (large) {
+      return undefined;
+    }
     // Refresh snapshot every 1 second for live effect
-    // TODO: Replace with actual RTSP stream when backend supports HLS/WebRTC
     intervalRef.current = setInterval(() => {
       setImageKey(prev => prev + 1);
     }, 1000);
@@ -228,14 +231,17 @@ function CameraStream({ camera, large = false, refreshKey }) {
         clearInterval(intervalRef.current);
       }
     };
-  }, []);
+  }, [large]);
 
   useEffect(() => {
-    // Force refresh when parent triggers
+    // Force refresh / reconnect when parent triggers
     setImageKey(prev => prev + 1);
+    setError(false);
   }, [refreshKey]);
 
-  const snapshotUrl = `${API_URL}/cameras/${camera.id}/snapshot?t=${imageKey}`;
+  const streamUrl = large
+    ? `${API_URL}/cameras/${camera.id}/mjpeg?k=${refreshKey}`
+    : `${API_URL}/cameras/${camera.id}/snapshot?t=${imageKey}`;
 
   return (
     <Box
@@ -259,7 +265,7 @@ function CameraStream({ camera, large = false, refreshKey }) {
         </Box>
       ) : (
         <img
-          src={snapshotUrl}
+          src={streamUrl}
           alt={camera.name}
           style={{
             width: '100%',
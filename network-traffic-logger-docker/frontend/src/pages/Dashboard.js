@@ -124,19 +124,13 @@ export default function Dashboard() {
         }
       });
 
-      // Process data for chart
-      const processedData = {};
-      response.data.data.forEach(item => {
-        const time = new Date(item.time).toLocaleTimeString();
-        if (!processedData[time]) {
-          processedData[time] = { time, inbound: 0, outbound: 0, internal: 0 };
-        }
-        if (item.field === 'bytes') {
-          processedData[time][item.direction] = (processedData[time][item.direction] || 0) + item.value;
-        }
-      });
-
-      setTrafficData(Object.values(processedData));
+      // One row per interval with per-direction columns
+      setTrafficData(response.data.data.map(row => ({
+        time: new Date(row.time).toLocaleTimeString(),
+        inbound: row.bytes_inbound,
+        outbound: row.bytes_outbound,
+        internal: row.bytes_internal
+      })));
     } catch (error) {
       console.error('Error fetching traffic history:', error);
     }
@@ -162,6 +156,8 @@ export default function Dashboard() {
 
     websocket.onopen = () => {
       console.log('WebSocket connected');
+      // Only the traffic stream is shown on the dashboard
+      websocket.send(JSON.stringify({ action: 'subscribe', topics: ['traffic'] }));
       setWs(websocket);
     };
 
@@ -177,12 +173,9 @@ export default function Dashboard() {
               bytes: data.data.bytes,
               packets: data.data.packets
             }];
-            // Keep last 60 data points
-            return newData.slice(-60);
+            // Keep last 120 data points (live frames arrive every ~0.5s)
+            return newData.slice(-120);
           });
-
-          // Refresh stats
-          fetchStats();
         }
       } catch (error) {
         console.error('Error processing WebSocket message:', error);
@@ -206,7 +199,7 @@ export default function Dashboard() {
         websocket.close();
       }
     };
-  }, [fetchStats]);
+  }, []);
 
   if (loading) {
     return (
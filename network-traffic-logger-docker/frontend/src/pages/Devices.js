@@ -108,8 +108,8 @@ export default function Devices() {
     setLoading(true);
     setError(null);
     try {
-      // Fetch devices from OPNsense
-      const response = await axios.get(`${API_URL}/opnsense/devices`);
+      // Device inventory (ARP, DHCP, DNS and traffic counters merged by the backend)
+      const response = await axios.get(`${API_URL}/devices`);
       setDevices(response.data || []);
       setFilteredDevices(response.data || []);
     } catch (error) {
@@ -71,21 +71,12 @@ export default function History() {
         }
       });
 
-      // Process data for chart
-      const processedData = {};
-      response.data.data.forEach(item => {
-        const time = new Date(item.time).toLocaleString('de-DE');
-        if (!processedData[time]) {
-          processedData[time] = { time, bytes: 0, packets: 0 };
-        }
-        if (item.field === 'bytes') {
-          processedData[time].bytes += item.value;
-        } else if (item.field === 'packets') {
-          processedData[time].packets += item.value;
-        }
-      });
-
-      setData(Object.values(processedData));
+      // Totals per interval are computed by the backend
+      setData(response.data.data.map(row => ({
+        time: new Date(row.time).toLocaleString('de-DE'),
+        bytes: row.bytes,
+        packets: row.packets
+      })));
     } catch (error) {
       console.error('Error fetching history:', error);
     } finally {
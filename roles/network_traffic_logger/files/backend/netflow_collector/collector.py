@@ -7,6 +7,9 @@ Collects NetFlow v5/v9 and sFlow data from OPNsense and other network devices
 import os
 import socket
 import struct
+import time
+import json
+import heapq
 import asyncio
 import logging
 from datetime import datetime
@@ -24,6 +27,24 @@ INFLUXDB_ORG = os.getenv('INFLUXDB_ORG', 'network-monitoring')
 INFLUXDB_BUCKET = os.getenv('INFLUXDB_BUCKET', 'traffic')
 REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379')
 
+# Live traffic stream (one aggregated frame per tick on the realtime_traffic channel)
+LIVE_CHANNEL = 'realtime_traffic'
+LIVE_TICK = float(os.getenv('LIVE_TICK', 0.5))
+LIVE_TOP_FLOWS = int(os.getenv('LIVE_TOP_FLOWS', 10))
+
+# Device indexes: sorted sets of IPs scored by last-seen epoch, LAN devices in
+# devices:active (persisted to PostgreSQL by the API), internet hosts in devices:external
+DEVICE_ACTIVE_KEY = 'devices:active'
+DEVICE_EXTERNAL_KEY = 'devices:external'
+
+# Device state retention: LAN devices are kept long, internet hosts only briefly.
+# Hashes idle longer than the limit are summarized into InfluxDB and removed.
+DEVICE_RETENTION_KEY = 'devices:retention'
+DEVICE_INTERNAL_IDLE = int(os.getenv('DEVICE_INTERNAL_IDLE', 30 * 86400))
+DEVICE_EXTERNAL_IDLE = int(os.getenv('DEVICE_EXTERNAL_IDLE', 3600))
+DEVICE_COMPACT_INTERVAL = int(os.getenv('DEVICE_COMPACT_INTERVAL', 300))
+DEVICE_COMPACT_BATCH = 1000
+
 # Logging setup
 logging.basicConfig(
     level=logging.INFO,
@@ -31,6 +52,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+def is_private_ip(ip: str) -> bool:
+    """RFC 1918 private address check"""
+    parts = ip.split('.')
+    return (
+        parts[0] == '10' or
+        (parts[0] == '172' and 16 <= int(parts[1]) <= 31) or
+        (parts[0] == '192' and parts[1] == '168')
+    )
+
+
 # Initialize InfluxDB client
 influx_client = InfluxDBClient(url=INFLUXDB_URL, token=INFLUXDB_TOKEN, org=INFLUXDB_ORG)
 write_api = influx_client.write_api(write_options=SYNCHRONOUS)
@@ -44,7 +76,7 @@ class NetFlowV5Parser:
 
     HEADER_FORMAT = '!HHIIIIBBH'
     HEADER_SIZE = 24
-    FLOW_FORMAT = '!IIIHHIIHHBBxBBBBHHIIHHHHII'
+    FLOW_FORMAT = '!IIIHHIIIIHHxBBBHHBBxx'
     FLOW_SIZE = 48
 
     @staticmethod
@@ -106,11 +138,200 @@ class NetFlowV5Parser:
             return None
 
 
+class LiveTrafficStream:
+    """Aggregates flows per tick and publishes one compact JSON frame to Redis
+
+    Frame layout:
+        {"v": 1, "ts": <epoch>, "interval": <seconds>, "flows": <count>,
+         "directions": {"inbound": [bytes, packets], ...},
+         "top": [[src, dst, protocol, dst_port, bytes, packets], ...]}
+    """
+
+    def __init__(self, tick: float = LIVE_TICK, top_n: int = LIVE_TOP_FLOWS):
+        self.tick = tick
+        self.top_n = top_n
+        self.reset()
+
+    def reset(self):
+        self.directions: Dict[str, List[int]] = {}
+        self.flows: Dict[tuple, List[int]] = {}
+        self.flow_count = 0
+
+    def add(self, flow: Dict[str, Any], direction: str):
+        """Account a flow in the current tick (no I/O)"""
+        totals = self.directions.get(direction)
+        if totals is None:
+            totals = self.directions[direction] = [0, 0]
+        totals[0] += flow['bytes']
+        totals[1] += flow['packets']
+
+        key = (flow['src_addr'], flow['dst_addr'], flow['protocol'], flow['dst_port'])
+        counters = self.flows.get(key)
+        if counters is None:
+            self.flows[key] = [flow['bytes'], flow['packets']]
+        else:
+            counters[0] += flow['bytes']
+            counters[1] += flow['packets']
+        self.flow_count += 1
+
+    def frame(self, interval: float) -> Dict[str, Any]:
+        """Build the frame for the elapsed tick and start a new one"""
+        top = heapq.nlargest(self.top_n, self.flows.items(), key=lambda item: item[1][0])
+        frame = {
+            'v': 1,
+            'ts': round(time.time(), 3),
+            'interval': round(interval, 3),
+            'flows': self.flow_count,
+            'directions': self.directions,
+            'top': [[src, dst, proto, dst_port, counters[0], counters[1]] for (src, dst, proto, dst_port), counters in top],
+        }
+        self.reset()
+        return frame
+
+    async def run(self):
+        """Publish one frame per tick (also when idle, so consumers see zero rates)"""
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(self.tick)
+            now = time.monotonic()
+            frame = self.frame(now - last)
+            last = now
+            try:
+                redis_client.publish(LIVE_CHANNEL, json.dumps(frame, separators=(',', ':')))
+            except Exception as e:
+                logger.error(f"Error publishing live traffic frame: {e}")
+
+
+class DeviceRetention:
+    """Evicts idle device state from Redis, keeping a summary in InfluxDB
+
+    Every DEVICE_COMPACT_INTERVAL the IPs whose last-seen score is older than
+    their idle limit (internal vs external) are compacted in batches: the
+    cumulative counters of LAN devices are written as one `device_summary` point
+    each, then the hash and index entry of every batch member are removed.
+    Hashes left without a TTL by older versions are found with an incremental
+    SCAN and given one. Run statistics and Redis memory usage are kept in the
+    devices:retention hash for the API.
+    """
+
+    INDEXES = ((DEVICE_ACTIVE_KEY, 'internal', DEVICE_INTERNAL_IDLE), (DEVICE_EXTERNAL_KEY, 'external', DEVICE_EXTERNAL_IDLE))
+
+    def __init__(self, interval: int = DEVICE_COMPACT_INTERVAL, batch: int = DEVICE_COMPACT_BATCH):
+        self.interval = interval
+        self.batch = batch
+        self.scan_cursor = 0
+
+    @staticmethod
+    def idle_limit(ip: str) -> int:
+        return DEVICE_INTERNAL_IDLE if is_private_ip(ip) else DEVICE_EXTERNAL_IDLE
+
+    def compact_index(self, index: str, scope: str, idle: int) -> int:
+        """Summarize and delete devices idle for longer than `idle` seconds"""
+        compacted = 0
+        cutoff = time.time() - idle
+        while True:
+            ips = redis_client.zrangebyscore(index, '-inf', cutoff, start=0, num=self.batch)
+            if not ips:
+                return compacted
+
+            pipe = redis_client.pipeline(transaction=False)
+            for ip in ips:
+                pipe.hmget(f"device:{ip}", "bytes_sent", "bytes_received", "last_seen")
+            rows = pipe.execute()
+
+            # Only LAN devices are summarized: one series per internet host would
+            # blow up the series cardinality in InfluxDB
+            points = [] if scope != 'internal' else [
+                Point("device_summary")
+                .tag("ip", ip)
+                .tag("scope", scope)
+                .field("bytes_sent", int(sent or 0))
+                .field("bytes_received", int(received or 0))
+                .field("last_seen", last_seen or '')
+                .time(datetime.utcnow())
+                for ip, (sent, received, last_seen) in zip(ips, rows)
+                if sent or received
+            ]
+            if points:
+                write_api.write(bucket=INFLUXDB_BUCKET, record=points)
+
+            # Only drop devices that were not seen again meanwhile
+            scores = redis_client.zmscore(index, ips)
+            idle = [ip for ip, score in zip(ips, scores) if score is None or score <= cutoff]
+            if idle:
+                # Remove only this batch from the index; the next batch is summarized in the next loop
+                pipe = redis_client.pipeline(transaction=False)
+                for ip in idle:
+                    pipe.delete(f"device:{ip}")
+                pipe.zrem(index, *idle)
+                pipe.execute()
+            # Re-seen devices now score above the cutoff and drop out of the next range
+            compacted += len(idle)
+
+    def sweep_untracked(self) -> int:
+        """Give device hashes without a TTL (pre-retention data) one, a slice per run"""
+        self.scan_cursor, keys = redis_client.scan(self.scan_cursor, match="device:*", count=self.batch)
+        if not keys:
+            return 0
+
+        pipe = redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipe.ttl(key)
+        ttls = pipe.execute()
+
+        pipe = redis_client.pipeline(transaction=False)
+        fixed = 0
+        for key, ttl in zip(keys, ttls):
+            if ttl == -1:
+                pipe.expire(key, 2 * self.idle_limit(key.split(':', 1)[1]))
+                fixed += 1
+        pipe.execute()
+        return fixed
+
+    def compact(self) -> Dict[str, Any]:
+        """One retention pass; returns the statistics stored for the API"""
+        started = time.time()
+        report = {'last_run': int(started)}
+        for index, scope, idle in self.INDEXES:
+            report[f'compacted_{scope}'] = self.compact_index(index, scope, idle)
+            report[f'tracked_{scope}'] = redis_client.zcard(index)
+        report['ttl_assigned'] = self.sweep_untracked()
+        # Legacy unbounded set replaced by the sorted-set indexes
+        redis_client.delete("devices")
+
+        memory = redis_client.info('memory')
+        report['redis_used_memory'] = memory.get('used_memory', 0)
+        report['redis_maxmemory'] = memory.get('maxmemory', 0)
+        report['duration_ms'] = round((time.time() - started) * 1000)
+
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.hset(DEVICE_RETENTION_KEY, mapping=report)
+        pipe.hincrby(DEVICE_RETENTION_KEY, 'compacted_total', report['compacted_internal'] + report['compacted_external'])
+        pipe.execute()
+        return report
+
+    async def run(self):
+        """Compact periodically without blocking packet reception"""
+        while True:
+            try:
+                report = await asyncio.to_thread(self.compact)
+                if report['compacted_internal'] or report['compacted_external']:
+                    logger.info(
+                        f"Device retention: compacted {report['compacted_internal']} internal / "
+                        f"{report['compacted_external']} external devices"
+                    )
+            except Exception as e:
+                logger.error(f"Error compacting device state: {e}")
+            await asyncio.sleep(self.interval)
+
+
 class NetFlowCollector:
     """NetFlow/sFlow Collector"""
 
     def __init__(self):
         self.running = False
+        self.live_stream = LiveTrafficStream()
+        self.device_retention = DeviceRetention()
 
     async def handle_netflow(self, data: bytes, addr: tuple):
         """Handle incoming NetFlow packet"""
@@ -185,22 +406,8 @@ class NetFlowCollector:
 
     def determine_direction(self, src_ip: str, dst_ip: str) -> str:
         """Determine traffic direction based on IP addresses"""
-        # Check if source is internal
-        src_parts = src_ip.split('.')
-        dst_parts = dst_ip.split('.')
-
-        # RFC 1918 private address spaces
-        is_src_private = (
-            src_parts[0] == '10' or
-            (src_parts[0] == '172' and 16 <= int(src_parts[1]) <= 31) or
-            (src_parts[0] == '192' and src_parts[1] == '168')
-        )
-
-        is_dst_private = (
-            dst_parts[0] == '10' or
-            (dst_parts[0] == '172' and 16 <= int(dst_parts[1]) <= 31) or
-            (dst_parts[0] == '192' and dst_parts[1] == '168')
-        )
+        is_src_private = is_private_ip(src_ip)
+        is_dst_private = is_private_ip(dst_ip)
 
         if is_src_private and not is_dst_private:
             return "outbound"
@@ -239,16 +446,8 @@ class NetFlowCollector:
             redis_client.hincrby(f"device:{flow['src_addr']}", "bytes_sent", flow['bytes'])
             redis_client.hincrby(f"device:{flow['dst_addr']}", "bytes_received", flow['bytes'])
 
-            # Publish to WebSocket channel for real-time updates
-            stats = {
-                'timestamp': datetime.utcnow().isoformat(),
-                'bytes': flow['bytes'],
-                'packets': flow['packets'],
-                'direction': direction,
-                'src_addr': flow['src_addr'],
-                'dst_addr': flow['dst_addr']
-            }
-            redis_client.publish('realtime_traffic', str(stats))
+            # Account for the live stream (published once per tick, not per flow)
+            self.live_stream.add(flow, direction)
 
         except Exception as e:
             logger.error(f"Error updating realtime stats: {e}")
@@ -258,11 +457,15 @@ class NetFlowCollector:
         try:
             # Update device last seen timestamp
             timestamp = datetime.utcnow().isoformat()
-            redis_client.hset(f"device:{flow['src_addr']}", "last_seen", timestamp)
-            redis_client.hset(f"device:{flow['dst_addr']}", "last_seen", timestamp)
-
-            # Add to device set
-            redis_client.sadd("devices", flow['src_addr'], flow['dst_addr'])
+            now = time.time()
+            pipe = redis_client.pipeline(transaction=False)
+            for ip in (flow['src_addr'], flow['dst_addr']):
+                pipe.hset(f"device:{ip}", "last_seen", timestamp)
+                # Safety net if compaction does not run; refreshed while the device is seen
+                pipe.expire(f"device:{ip}", 2 * DeviceRetention.idle_limit(ip))
+                # Score by last-seen epoch in the index of its scope
+                pipe.zadd(DEVICE_ACTIVE_KEY if is_private_ip(ip) else DEVICE_EXTERNAL_KEY, {ip: now})
+            pipe.execute()
 
         except Exception as e:
             logger.error(f"Error updating device cache: {e}")
@@ -300,8 +503,14 @@ class NetFlowCollector:
             self.start_udp_server(SFLOW_PORT, self.handle_netflow)
         )
 
+        # Publish aggregated live traffic frames
+        live_task = asyncio.create_task(self.live_stream.run())
+
+        # Evict idle device state
+        retention_task = asyncio.create_task(self.device_retention.run())
+
         try:
-            await asyncio.gather(netflow_task, sflow_task)
+            await asyncio.gather(netflow_task, sflow_task, live_task, retention_task)
         except KeyboardInterrupt:
             logger.info("Shutting down collector")
             self.running = False
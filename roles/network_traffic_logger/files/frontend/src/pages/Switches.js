@@ -44,6 +44,15 @@ const formatBytes = (bytes) => {
   return parseFloat((bytes / Math.pow(k, i)).toFixed(2)) + ' ' + sizes[i];
 };
 
+const formatBits = (bps) => {
+  if (bps === null || bps === undefined) return '-';
+  if (bps === 0) return '0 bit/s';
+  const k = 1000;
+  const sizes = ['bit/s', 'kbit/s', 'Mbit/s', 'Gbit/s'];
+  const i = Math.min(Math.floor(Math.log(bps) / Math.log(k)), sizes.length - 1);
+  return parseFloat((bps / Math.pow(k, i)).toFixed(1)) + ' ' + sizes[i];
+};
+
 const getStatusColor = (status) => {
   switch (status) {
     case 'up':
@@ -82,10 +91,11 @@ export default function Switches() {
     is_enabled: true
   });
 
-  const fetchPorts = async () => {
+  const fetchPorts = async (refresh = false) => {
     setLoading(true);
     try {
-      const response = await axios.get(`${API_URL}/api/switches/ports`);
+      // Served from the poller cache; refresh asks for a fresh walk of the switches
+      const response = await axios.get(`${API_URL}/api/switches/ports`, { params: { refresh } });
       setPorts(response.data);
     } catch (error) {
       console.error('Error fetching switch ports:', error);
@@ -96,7 +106,7 @@ export default function Switches() {
 
   useEffect(() => {
     fetchPorts();
-    const interval = setInterval(fetchPorts, 10000); // Refresh every 10 seconds
+    const interval = setInterval(() => fetchPorts(), 10000); // Refresh every 10 seconds
     return () => clearInterval(interval);
   }, []);
 
@@ -195,7 +205,7 @@ export default function Switches() {
         </Typography>
         <Box>
           <Tooltip title="Aktualisieren">
-            <IconButton onClick={fetchPorts} color="primary" sx={{ mr: 1 }}>
+            <IconButton onClick={() => fetchPorts(true)} color="primary" sx={{ mr: 1 }}>
               <RefreshIcon />
             </IconButton>
           </Tooltip>
@@ -315,11 +325,17 @@ export default function Switches() {
                               <Typography variant="body2" sx={{ fontFamily: 'monospace' }}>
                                 {formatBytes(port.bytes_in)}
                               </Typography>
+                              <Typography variant="caption" color="text.secondary" sx={{ fontFamily: 'monospace' }}>
+                                {formatBits(port.in_bps)}
+                              </Typography>
                             </TableCell>
                             <TableCell align="right">
                               <Typography variant="body2" sx={{ fontFamily: 'monospace' }}>
                                 {formatBytes(port.bytes_out)}
                               </Typography>
+                              <Typography variant="caption" color="text.secondary" sx={{ fontFamily: 'monospace' }}>
+                                {formatBits(port.out_bps)}
+                              </Typography>
                             </TableCell>
                             <TableCell>
                               <Typography